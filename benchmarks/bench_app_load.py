@@ -0,0 +1,483 @@
+"""整个 FastAPI 应用的压测：启动 main.app，写入模拟数据后并发发送混合请求
+
+默认使用 SQLite 和进程内的 MongoDB / Redis 替身（见 benchmarks/stand_ins.py），
+也可以通过 --database-url / --mongodb-url / --redis-url 指向本地的真实服务（请使用专门的测试库）。
+请求经 httpx 的 ASGI transport 直接调用应用，不经过网络，测到的是应用本身的处理能力。
+每个虚拟用户先登录，然后按权重随机访问：登录、病例列表、医疗信息、医生笔记、图片信息、单张预测，
+报告中给出每个路由的 RPS、延迟分位数和状态码分布，以及各推理阶段的耗时分位数。
+
+运行方式（在仓库根目录）:
+    python -m benchmarks.bench_app_load --users 32 --duration 60 --output load-$(git rev-parse --short HEAD).json
+    python -m benchmarks.bench_app_load --quick
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import make_random_checkpoint, make_xray_images, percentiles, write_report
+from benchmarks.stand_ins import FakeMongoDatabase, FakeRedis, create_sql_session_factory
+from fastapi_classification.core.config import settings
+from fastapi_classification.core.database import Base, get_db, get_mongodb, get_postgres_db
+from fastapi_classification.core.metrics import metrics
+from fastapi_classification.core.redis import redis_manager
+from fastapi_classification.core.security import get_password_hash
+from fastapi_classification.main import app
+from fastapi_classification.models.case import Case, CaseStatus
+from fastapi_classification.models.diagnosis import Diagnosis, DiagnosisPriority, DiagnosisStatus
+from fastapi_classification.models.doctor_note import DoctorNote, NoteType
+from fastapi_classification.models.medical_info import MedicalInfo
+from fastapi_classification.models.user import User, UserRole
+from fastapi_classification.services.inference_executor import inference_executor
+from fastapi_classification.services.model_registry import model_registry
+from fastapi_classification.services.prediction_cache import prediction_cache
+
+PASSWORD = "loadtest123"
+API = settings.API_V1_STR
+
+# 各路由被选中的权重，doctor_notes 只有医生会访问
+ROUTE_MIX = {
+    "login": 1,
+    "list_cases": 4,
+    "medical_info": 3,
+    "doctor_notes": 2,
+    "image_metadata": 3,
+    "predict": 2,
+}
+DOCTOR_ONLY_ROUTES = {"doctor_notes"}
+
+DEPARTMENTS = ["呼吸内科", "放射科", "感染科", "急诊科"]
+TITLES = ["住院医师", "主治医师", "副主任医师", "主任医师"]
+SYMPTOMS = ["咳嗽", "发热", "胸闷", "气短", "乏力", "咽痛", "肌肉酸痛"]
+HISTORIES = ["高血压病史 5 年", "2 型糖尿病", "慢性支气管炎", "无特殊病史"]
+ALLERGIES = ["青霉素过敏", "无已知药物过敏", "磺胺类药物过敏"]
+NOTES = [
+    "患者体温 37.8℃，咳嗽伴少量白痰，双肺可闻及散在湿啰音，建议复查胸片。",
+    "胸片示右下肺斑片状阴影，考虑感染性病变，予抗感染治疗，三天后复诊。",
+    "症状较前好转，体温正常，继续原方案治疗，注意休息。",
+    "影像学提示双肺磨玻璃影，建议完善核酸检测并隔离观察。",
+]
+
+
+@dataclass
+class Account:
+    user_id: int
+    username: str
+    role: UserRole
+
+
+@dataclass
+class Dataset:
+    doctors: List[Account] = field(default_factory=list)
+    patients: List[Account] = field(default_factory=list)
+    images_by_user: Dict[int, List[str]] = field(default_factory=dict)
+    image_ids: List[str] = field(default_factory=list)
+    counts: dict = field(default_factory=dict)
+
+
+def seed_sql(session_factory, args, rng: random.Random, tag: str) -> Dataset:
+    """写入用户、病例、诊断、医疗信息和医生笔记，所有账号使用同一个密码"""
+    db = session_factory()
+    try:
+        hashed_password = get_password_hash(PASSWORD)
+        doctors = [
+            User(
+                username=f"lt{tag}_doctor{i}",
+                email=f"lt{tag}_doctor{i}@example.com",
+                hashed_password=hashed_password,
+                full_name=f"医生{i}",
+                role=UserRole.DOCTOR,
+                department=rng.choice(DEPARTMENTS),
+                title=rng.choice(TITLES),
+                license_number=f"{tag}{i:08d}",
+            )
+            for i in range(args.doctors)
+        ]
+        patients = [
+            User(
+                username=f"lt{tag}_patient{i}",
+                email=f"lt{tag}_patient{i}@example.com",
+                hashed_password=hashed_password,
+                full_name=f"患者{i}",
+                role=UserRole.PATIENT,
+            )
+            for i in range(args.patients)
+        ]
+        db.add_all(doctors + patients)
+        db.flush()
+
+        medical_infos = [
+            MedicalInfo(
+                user_id=patient.id,
+                medical_history=rng.choice(HISTORIES),
+                allergy_history=rng.choice(ALLERGIES),
+                family_history="父亲有高血压病史",
+                surgery_history=[{"name": "阑尾切除术", "year": rng.randint(1990, 2020)}],
+                medication_history=[{"name": "阿莫西林", "dosage": "0.5g", "frequency": "每日三次"}],
+                physical_exam_records=[],
+            )
+            for patient in patients
+        ]
+        cases = [
+            Case(
+                id_number=f"{tag}{patient.id:08d}{k:02d}",
+                patient_name=patient.full_name,
+                age=rng.randint(18, 90),
+                gender=rng.choice(["男", "女"]),
+                created_by=patient.id,
+                status=rng.choice(list(CaseStatus)),
+            )
+            for patient in patients
+            for k in range(args.cases_per_patient)
+        ]
+        db.add_all(medical_infos + cases)
+        db.flush()
+
+        diagnoses = [
+            Diagnosis(
+                case_id=case.id,
+                doctor_id=rng.choice(doctors).id,
+                diagnosis_type="影像诊断",
+                diagnosis_result=rng.choice(settings.MODEL_CLASS_LABELS),
+                confidence_score=round(rng.uniform(0.6, 0.99), 4),
+                symptoms=rng.sample(SYMPTOMS, 3),
+                treatment_plan="对症治疗，定期复查胸片",
+                priority=rng.choice(list(DiagnosisPriority)),
+                status=rng.choice(list(DiagnosisStatus)),
+            )
+            for case in cases
+        ]
+        notes = [
+            DoctorNote(
+                medical_info_id=medical_info.id,
+                doctor_id=doctor.id,
+                case_id=rng.choice(cases).id,
+                note_type=rng.choice(list(NoteType)),
+                note_content=rng.choice(NOTES),
+                is_important=rng.random() < 0.2,
+            )
+            for doctor in doctors
+            for medical_info in rng.sample(medical_infos, min(args.notes_per_doctor, len(medical_infos)))
+        ]
+        db.add_all(diagnoses + notes)
+        db.commit()
+
+        return Dataset(
+            doctors=[Account(user.id, user.username, UserRole.DOCTOR) for user in doctors],
+            patients=[Account(user.id, user.username, UserRole.PATIENT) for user in patients],
+            counts={
+                "doctors": len(doctors),
+                "patients": len(patients),
+                "cases": len(cases),
+                "diagnoses": len(diagnoses),
+                "doctor_notes": len(notes),
+            },
+        )
+    finally:
+        db.close()
+
+
+async def seed_mongo(mongo_db, dataset: Dataset, args, rng: random.Random):
+    """写入 MongoDB 中的医疗信息和图片记录"""
+    now = datetime.now(timezone.utc)
+    await mongo_db.medical_info.insert_many([
+        {
+            "user_id": patient.user_id,
+            "medical_history": rng.choice(HISTORIES),
+            "allergy_history": rng.choice(ALLERGIES),
+            "family_history": "母亲有糖尿病史",
+            "surgery_history": [{"name": "阑尾切除术", "year": rng.randint(1990, 2020)}],
+            "medication_history": [],
+            "physical_exam_records": [
+                {"date": (now - timedelta(days=rng.randint(30, 365))).isoformat(), "type": "胸部X光", "result": "未见异常"}
+            ],
+            "is_private": 1,
+            "version": 1,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for patient in dataset.patients
+    ])
+
+    images = []
+    for patient in dataset.patients:
+        for k in range(args.images_per_patient):
+            filename = f"{uuid.uuid4().hex}.jpg"
+            images.append({
+                "filename": filename,
+                "original_filename": f"chest_xray_{k}.jpg",
+                "file_path": f"medical_images/{patient.user_id}/{filename}",
+                "file_url": f"https://example.com/medical_images/{patient.user_id}/{filename}",
+                "file_size": rng.randint(200_000, 2_000_000),
+                "mime_type": "image/jpeg",
+                "image_type": "medical_image",
+                "width": 2048,
+                "height": 2048,
+                "format": "JPEG",
+                "image_metadata": {},
+                "tags": ["胸部X光"],
+                "user_id": patient.user_id,
+                "privacy_level": "private",
+                "created_at": now,
+                "updated_at": now,
+                "is_deleted": False,
+            })
+    result = await mongo_db.images.insert_many(images)
+    for image, image_id in zip(images, result.inserted_ids):
+        dataset.images_by_user.setdefault(image["user_id"], []).append(str(image_id))
+        dataset.image_ids.append(str(image_id))
+    dataset.counts["medical_info_documents"] = len(dataset.patients)
+    dataset.counts["image_documents"] = len(images)
+
+
+class Recorder:
+    """按路由记录延迟和状态码，预热阶段的请求不计入"""
+
+    def __init__(self, record_after: float):
+        self.record_after = record_after
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, route: str, started: float, status_code: int):
+        if started >= self.record_after:
+            self.latencies[route].append((time.perf_counter() - started) * 1000)
+            self.statuses[route][status_code] += 1
+
+    def report(self, duration: float) -> dict:
+        routes = {}
+        for route in sorted(self.latencies):
+            statuses = self.statuses[route]
+            requests = sum(statuses.values())
+            routes[route] = {
+                "requests": requests,
+                "rps": requests / duration,
+                "errors": sum(count for status_code, count in statuses.items() if status_code >= 400),
+                "statuses": {str(status_code): count for status_code, count in sorted(statuses.items())},
+                **percentiles(self.latencies[route]),
+            }
+        all_latencies = [latency for latencies in self.latencies.values() for latency in latencies]
+        total = {
+            "requests": len(all_latencies),
+            "rps": len(all_latencies) / duration,
+            "errors": sum(route["errors"] for route in routes.values()),
+            **percentiles(all_latencies),
+        }
+        return {"routes": routes, "total": total}
+
+
+class VirtualUser:
+    """一个已登录的客户端，按 ROUTE_MIX 的权重循环发送请求"""
+
+    def __init__(self, client: httpx.AsyncClient, account: Account, dataset: Dataset, images: List[bytes],
+                 recorder: Recorder, rng: random.Random, unique_images: bool):
+        self.client = client
+        self.account = account
+        self.dataset = dataset
+        self.images = images
+        self.recorder = recorder
+        self.rng = rng
+        self.unique_images = unique_images
+        self.headers = {}
+        self.routes = [route for route in ROUTE_MIX if account.role == UserRole.DOCTOR or route not in DOCTOR_ONLY_ROUTES]
+        self.weights = [ROUTE_MIX[route] for route in self.routes]
+
+    async def _request(self, route: str, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        self.recorder.record(route, started, response.status_code)
+        return response
+
+    async def login(self):
+        response = await self._request(
+            "login", "POST", f"{API}/auth/login",
+            data={"username": self.account.username, "password": PASSWORD},
+        )
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def list_cases(self):
+        await self._request("list_cases", "GET", f"{API}/cases/", params={"limit": 20})
+
+    async def medical_info(self):
+        # 患者查看自己的信息，医生随机查看患者的信息
+        user_id = self.account.user_id
+        if self.account.role == UserRole.DOCTOR:
+            user_id = self.rng.choice(self.dataset.patients).user_id
+        await self._request("medical_info", "GET", f"{API}/medical-info/{user_id}")
+
+    async def doctor_notes(self):
+        await self._request("doctor_notes", "GET", f"{API}/doctor-notes/doctor/{self.account.user_id}")
+
+    async def image_metadata(self):
+        image_ids = self.dataset.images_by_user.get(self.account.user_id) or self.dataset.image_ids
+        await self._request("image_metadata", "GET", f"{API}/images/{self.rng.choice(image_ids)}")
+
+    async def predict(self):
+        data = self.rng.choice(self.images)
+        if self.unique_images:
+            # JPEG 结束标记之后的字节不影响解码，只改变内容哈希，使每次请求都不命中预测缓存
+            data += os.urandom(16)
+        await self._request(
+            "predict", "POST", f"{API}/predict/predict/",
+            files={"file": ("xray.jpg", data, "image/jpeg")},
+        )
+
+    async def run(self, deadline: float):
+        await self.login()
+        while time.perf_counter() < deadline:
+            route = self.rng.choices(self.routes, self.weights)[0]
+            await getattr(self, route)()
+
+
+async def connect_stand_ins(args, directory: str):
+    """创建 SQL 会话工厂、MongoDB 与 Redis 客户端，未指定地址的服务使用进程内替身"""
+    session_factory = create_sql_session_factory(args.database_url, directory)
+    Base.metadata.create_all(bind=session_factory.kw["bind"])
+
+    if args.mongodb_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        mongo_db = AsyncIOMotorClient(args.mongodb_url)[args.mongodb_db]
+    else:
+        mongo_db = FakeMongoDatabase()
+
+    if args.redis_url:
+        from redis import asyncio as aioredis
+        redis = aioredis.from_url(args.redis_url, encoding="utf-8", decode_responses=True)
+    else:
+        redis = FakeRedis()
+    return session_factory, mongo_db, redis
+
+
+def override_dependencies(session_factory, mongo_db):
+    """把应用的数据库依赖替换为压测使用的连接"""
+
+    def get_db_override():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def get_postgres_db_override():
+        db = session_factory()
+        try:
+            return db
+        finally:
+            db.close()
+
+    async def get_mongodb_override():
+        return mongo_db
+
+    app.dependency_overrides[get_db] = get_db_override
+    app.dependency_overrides[get_postgres_db] = get_postgres_db_override
+    app.dependency_overrides[get_mongodb] = get_mongodb_override
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    tag = uuid.uuid4().hex[:6]
+    with tempfile.TemporaryDirectory() as directory:
+        session_factory, mongo_db, redis = await connect_stand_ins(args, directory)
+        override_dependencies(session_factory, mongo_db)
+        redis_manager.redis = redis
+
+        start = time.perf_counter()
+        dataset = seed_sql(session_factory, args, rng, tag)
+        await seed_mongo(mongo_db, dataset, args, rng)
+        seed_seconds = time.perf_counter() - start
+        print(f"数据准备完成 ({seed_seconds:.1f}s): {dataset.counts}")
+
+        # 不触发应用的启动事件，模型在这里加载好，避免第一批预测请求计入加载时间
+        model_service = model_registry.active
+        if not os.path.exists(model_service.model_path):
+            model_service.model_path = make_random_checkpoint(directory)
+        await model_service.ensure_loaded()
+        images = make_xray_images(args.image_count, args.image_size)
+
+        accounts = [
+            rng.choice(dataset.doctors) if i < round(args.users * args.doctor_ratio) else rng.choice(dataset.patients)
+            for i in range(args.users)
+        ]
+        now = time.perf_counter()
+        recorder = Recorder(record_after=now + args.warmup)
+        deadline = now + args.warmup + args.duration
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+                users = [
+                    VirtualUser(client, account, dataset, images, recorder, random.Random(rng.random()), not args.predict_cache)
+                    for account in accounts
+                ]
+                await asyncio.gather(*(user.run(deadline) for user in users))
+            elapsed = time.perf_counter() - recorder.record_after
+        finally:
+            app.dependency_overrides.clear()
+            await model_registry.close()
+            inference_executor.shutdown()
+            await redis.close()
+
+    report = recorder.report(elapsed)
+    for route, row in report["routes"].items():
+        print(
+            f"{route:<15} {row['rps']:8.1f} req/s  p50 {row['p50_ms']:8.2f} ms  p95 {row['p95_ms']:8.2f} ms  "
+            f"p99 {row['p99_ms']:8.2f} ms  errors {row['errors']}"
+        )
+    return {
+        "config": {
+            "users": args.users,
+            "doctor_ratio": args.doctor_ratio,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "route_mix": ROUTE_MIX,
+            "predict_cache": args.predict_cache,
+            "database": args.database_url or "sqlite",
+            "mongodb": args.mongodb_url or "in-memory",
+            "redis": args.redis_url or "in-memory",
+        },
+        "seed": {**dataset.counts, "seconds": seed_seconds},
+        **report,
+        "stages": metrics.summary(),
+        "prediction_cache": prediction_cache.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FastAPI 应用混合流量压测")
+    parser.add_argument("--users", type=int, default=32, help="并发虚拟用户数")
+    parser.add_argument("--doctor-ratio", type=float, default=0.25, help="虚拟用户中医生账号的比例")
+    parser.add_argument("--duration", type=float, default=60, help="计入结果的压测时长（秒）")
+    parser.add_argument("--warmup", type=float, default=5, help="预热时长（秒），期间的请求不计入结果")
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--cases-per-patient", type=int, default=2)
+    parser.add_argument("--notes-per-doctor", type=int, default=20)
+    parser.add_argument("--images-per-patient", type=int, default=3)
+    parser.add_argument("--image-count", type=int, default=16, help="预测请求使用的合成图像数")
+    parser.add_argument("--image-size", type=int, default=1024, help="合成图像边长")
+    parser.add_argument("--predict-cache", action="store_true", help="预测请求重复使用相同的图像字节，允许命中预测缓存")
+    parser.add_argument("--database-url", default="", help="SQL 数据库地址，默认使用临时 SQLite 文件")
+    parser.add_argument("--mongodb-url", default="", help="MongoDB 地址，默认使用进程内替身")
+    parser.add_argument("--mongodb-db", default="loadtest")
+    parser.add_argument("--redis-url", default="", help="Redis 地址，默认使用进程内替身")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--quick", action="store_true", help="缩小规模，用于快速冒烟检查")
+    parser.add_argument("--output", default="", help="JSON 报告输出路径，默认打印到标准输出")
+    args = parser.parse_args()
+    if args.quick:
+        args.users, args.duration, args.warmup = 8, 10, 2
+        args.doctors, args.patients, args.image_count, args.image_size = 4, 40, 4, 512
+
+    write_report(asyncio.run(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
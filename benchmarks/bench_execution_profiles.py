@@ -0,0 +1,63 @@
+"""PyTorch 执行配置基准：对比 eager / optimized / torchscript / compile 在不同批大小下的延迟
+
+未指定权重文件时使用随机初始化的 simplecnn，延迟与权重取值无关。
+
+运行方式（在仓库根目录）:
+    python -m benchmarks.bench_execution_profiles --batch-sizes 1 4 16 32 --iterations 20
+"""
+import argparse
+import time
+
+import torch
+
+from benchmarks.common import percentiles, time_calls, write_report
+from fastapi_classification.core.config import settings
+from fastapi_classification.model.cnn import simplecnn
+from fastapi_classification.services.inference_backends import EXECUTION_PROFILES, build_torch_backend
+
+
+def load_model(model_path: str) -> torch.nn.Module:
+    model = simplecnn(num_class=len(settings.MODEL_CLASS_LABELS))
+    if model_path:
+        model.load_state_dict(torch.load(model_path, map_location="cpu", weights_only=True), strict=True)
+    return model.eval()
+
+
+def measure(backend, batch_size: int, iterations: int, warmup: int) -> dict:
+    input_batch = torch.randn(batch_size, 3, 224, 224)
+    latency = percentiles(time_calls(lambda: backend(input_batch), iterations, warmup))
+    return {
+        "batch_size": batch_size,
+        **latency,
+        "per_image_ms": latency["p50_ms"] / batch_size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyTorch 执行配置延迟对比")
+    parser.add_argument("--model-path", default="", help="权重文件，默认使用随机权重")
+    parser.add_argument("--profiles", nargs="+", choices=EXECUTION_PROFILES, default=list(EXECUTION_PROFILES))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4, 16, 32])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=settings.INFERENCE_TORCH_THREADS)
+    parser.add_argument("--output", default="", help="JSON 报告输出路径，默认打印到标准输出")
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    device = torch.device("cpu")
+    results = {}
+    for profile in args.profiles:
+        start = time.perf_counter()
+        backend = build_torch_backend(load_model(args.model_path), device, profile)
+        build_seconds = time.perf_counter() - start
+        rows = [measure(backend, batch_size, args.iterations, args.warmup) for batch_size in args.batch_sizes]
+        results[profile] = {"build_seconds": build_seconds, "latency": rows}
+        print(f"\n{profile} (构建耗时 {build_seconds:.2f}s)")
+        for row in rows:
+            print(f"  batch={row['batch_size']:<4} p50 {row['p50_ms']:9.2f} ms  p95 {row['p95_ms']:9.2f} ms  per image {row['per_image_ms']:8.2f} ms")
+    write_report({"threads": args.threads, "profiles": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
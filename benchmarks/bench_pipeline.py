@@ -0,0 +1,132 @@
+"""分类流水线基准：预处理、单张预测、不同批大小与线程数下的批量推理
+
+使用合成的 224x224 与全分辨率 X 光图像，输出 JSON 报告（含提交号和峰值内存），
+把不同提交的报告保存下来即可对比是否出现性能回退。未指定权重文件时使用随机权重。
+
+运行方式（在仓库根目录）:
+    python -m benchmarks.bench_pipeline --output bench-$(git rev-parse --short HEAD).json
+    python -m benchmarks.bench_pipeline --quick
+"""
+import argparse
+import io
+import os
+import tempfile
+
+import numpy as np
+import torch
+
+from benchmarks.common import make_random_checkpoint, make_xray_images, percentiles, time_calls, write_report
+from fastapi_classification.core.config import settings
+from fastapi_classification.services.image_utils import preprocess_image
+from fastapi_classification.services.model_service import ModelService
+from fastapi_classification.services.preprocessing import default_preprocessor
+
+
+def throughput(latency: dict, images_per_call: int = 1) -> float:
+    """按平均延迟计算每秒处理的图像数"""
+    return images_per_call / latency["mean_ms"] * 1000 if latency.get("mean_ms") else 0.0
+
+
+def bench_preprocess(image_sets: dict) -> list:
+    """preprocess_image：解码 + 缩放 + 归一化"""
+    rows = []
+    for (size, fmt), images in image_sets.items():
+        latencies = []
+        for data in images:
+            latencies += time_calls(lambda: preprocess_image(io.BytesIO(data)), iterations=1, warmup=0)
+        latency = percentiles(latencies)
+        rows.append({"size": size, "format": fmt, **latency, "images_per_second": throughput(latency)})
+        print(f"preprocess  {fmt:<4} {size:>5}px  p50 {latency['p50_ms']:8.2f} ms  p95 {latency['p95_ms']:8.2f} ms")
+    return rows
+
+
+def bench_predict(model_service: ModelService, image_sets: dict) -> list:
+    """ModelService.predict：单张图像端到端（预处理 + 前向传播）"""
+    rows = []
+    for (size, fmt), images in image_sets.items():
+        model_service.predict(io.BytesIO(images[0]))
+        latencies = []
+        for data in images:
+            latencies += time_calls(lambda: model_service.predict(io.BytesIO(data)), iterations=1, warmup=0)
+        latency = percentiles(latencies)
+        rows.append({"size": size, "format": fmt, **latency, "images_per_second": throughput(latency)})
+        print(f"predict     {fmt:<4} {size:>5}px  p50 {latency['p50_ms']:8.2f} ms  p95 {latency['p95_ms']:8.2f} ms")
+    return rows
+
+
+def bench_batches(model_service: ModelService, images: list, batch_sizes: list, thread_counts: list, iterations: int) -> list:
+    """ModelService.predict_batch：预处理好的输入，只测前向传播和 softmax"""
+    decoded = [default_preprocessor.decode(data) for data in images]
+    rows = []
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+        for batch_size in batch_sizes:
+            batch = [decoded[i % len(decoded)] for i in range(batch_size)]
+            input_batch = default_preprocessor.normalize(np.stack(batch))
+            latency = percentiles(time_calls(lambda: model_service.predict_batch(input_batch), iterations, warmup=2))
+            rows.append({
+                "threads": threads,
+                "batch_size": batch_size,
+                **latency,
+                "images_per_second": throughput(latency, batch_size),
+            })
+            print(
+                f"batch       threads={threads:<2} batch={batch_size:<3} p50 {latency['p50_ms']:8.2f} ms  "
+                f"{rows[-1]['images_per_second']:8.1f} images/s"
+            )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分类流水线基准")
+    parser.add_argument("--model-path", default=settings.MODEL_PATH, help="权重文件，不存在时使用随机权重")
+    parser.add_argument("--count", type=int, default=32, help="每组合成图像数")
+    parser.add_argument("--full-size", type=int, default=2048, help="全分辨率图像边长")
+    parser.add_argument("--formats", nargs="+", default=["JPEG", "PNG"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--iterations", type=int, default=10, help="每个批大小/线程数组合的重复次数")
+    parser.add_argument("--quick", action="store_true", help="缩小规模，用于快速冒烟检查")
+    parser.add_argument("--output", default="", help="JSON 报告输出路径，默认打印到标准输出")
+    args = parser.parse_args()
+    if args.quick:
+        args.count, args.full_size, args.iterations = 4, 1024, 3
+        args.batch_sizes, args.threads = [1, 8, 32], [settings.INFERENCE_TORCH_THREADS]
+
+    image_sets = {
+        (size, fmt): make_xray_images(args.count, size, fmt)
+        for size in (224, args.full_size)
+        for fmt in args.formats
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = args.model_path if os.path.exists(args.model_path) else make_random_checkpoint(directory)
+        model_service = ModelService(
+            model_path=model_path,
+            class_labels=settings.MODEL_CLASS_LABELS,
+            backend="torch",
+            quantization="none",
+        )
+        model_service.load()
+
+        torch.set_num_threads(settings.INFERENCE_TORCH_THREADS)
+        report = {
+            "config": {
+                "count": args.count,
+                "full_size": args.full_size,
+                "formats": args.formats,
+                "model_path": args.model_path if model_path == args.model_path else "random",
+                "execution_profile": model_service.execution_profile,
+                "preprocess_decoder": settings.PREPROCESS_DECODER,
+                "preprocess_jpeg_draft": settings.PREPROCESS_JPEG_DRAFT,
+            },
+            "preprocess": bench_preprocess(image_sets),
+            "predict": bench_predict(model_service, image_sets),
+            "batch": bench_batches(
+                model_service, image_sets[(224, args.formats[0])], args.batch_sizes, args.threads, args.iterations
+            ),
+        }
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
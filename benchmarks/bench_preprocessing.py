@@ -0,0 +1,74 @@
+"""预处理性能对比：旧版逐次构建 transforms.Compose 与新版 ImagePreprocessor
+
+运行方式（在仓库根目录）:
+    python -m benchmarks.bench_preprocessing --count 200 --size 1024
+"""
+import argparse
+import io
+import time
+
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from benchmarks.common import make_xray_images
+from fastapi_classification.services.preprocessing import ImagePreprocessor
+
+
+def legacy_preprocess_image(image) -> torch.Tensor:
+    """优化前的 preprocess_image 实现，作为对比基准"""
+    transform = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=(0.5, 0.5, 0.5), std=(0.5, 0.5, 0.5))
+    ])
+    image = Image.open(image).convert('RGB')
+    return transform(image).unsqueeze(0)
+
+
+def measure(name: str, fn, images: list) -> float:
+    start = time.perf_counter()
+    fn(images)
+    elapsed = time.perf_counter() - start
+    throughput = len(images) / elapsed
+    print(f"{name:<32} {throughput:10.1f} images/s")
+    return throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预处理吞吐量对比")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--size", type=int, default=1024, help="合成图像边长")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    pil = ImagePreprocessor(decoder="pil", jpeg_draft=True)
+    pil_no_draft = ImagePreprocessor(decoder="pil", jpeg_draft=False)
+    opencv = ImagePreprocessor(decoder="opencv")
+
+    def run_batched(preprocessor):
+        def run(images):
+            for start in range(0, len(images), args.batch_size):
+                chunk = images[start:start + args.batch_size]
+                decoded, normalized = preprocessor.batch_buffers(len(chunk))
+                for index, data in enumerate(chunk):
+                    decoded[index] = preprocessor.decode(data)
+                preprocessor.normalize(decoded, normalized)
+        return run
+
+    for fmt in ("JPEG", "PNG"):
+        images = make_xray_images(args.count, args.size, fmt)
+        print(f"\n{fmt} {args.size}x{args.size}, {args.count} 张")
+        baseline = measure("legacy transforms.Compose", lambda xs: [legacy_preprocess_image(io.BytesIO(x)) for x in xs], images)
+        for name, fn in [
+            ("pil (draft)", lambda xs: [pil.preprocess(x) for x in xs]),
+            ("pil (no draft)", lambda xs: [pil_no_draft.preprocess(x) for x in xs]),
+            ("opencv", lambda xs: [opencv.preprocess(x) for x in xs]),
+            ("pil (draft) batched buffers", run_batched(pil)),
+        ]:
+            throughput = measure(name, fn, images)
+            print(f"{'':<32} {throughput / baseline:10.2f}x vs legacy")
+
+
+if __name__ == "__main__":
+    main()
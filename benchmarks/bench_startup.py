@@ -0,0 +1,60 @@
+"""应用启动耗时基准：测量导入 fastapi_classification.main 的时间和内存
+
+每次在全新的子进程中导入，避免模块缓存影响结果。
+
+运行方式（在仓库根目录）:
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import environment
+
+# 子进程中执行的测量代码
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "torch_imported": "torch" in sys.modules,
+}}))
+"""
+
+
+def run_once(module: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="应用启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="fastapi_classification.main")
+    args = parser.parse_args()
+
+    results = [run_once(args.module) for _ in range(args.runs)]
+    summary = {
+        "environment": environment(),
+        "module": args.module,
+        "runs": args.runs,
+        "import_seconds_median": statistics.median(r["import_seconds"] for r in results),
+        "import_seconds_max": max(r["import_seconds"] for r in results),
+        "max_rss_mb_median": statistics.median(r["max_rss_mb"] for r in results),
+        "torch_imported": any(r["torch_imported"] for r in results),
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""多 worker 进程的内存占用基准：对比普通加载与内存映射加载权重时每个进程的 RSS / PSS / USS
+
+同时启动 --workers 个子进程，每个进程加载模型并完成一次推理后保持存活，
+在所有进程都就绪时测量，模拟多个 uvicorn worker 并存的情况。
+RSS 会重复计算共享页，PSS 按共享进程数分摊，USS 只统计进程独占的内存，后两者更能反映实际开销。
+
+运行方式（在仓库根目录，PSS/USS 需要 Linux）:
+    python -m benchmarks.bench_worker_rss --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import psutil
+
+from benchmarks.common import environment, make_random_checkpoint
+from fastapi_classification.core.config import settings
+
+# 子进程中执行：加载模型并推理一次，就绪后等待父进程测量
+PROBE = """
+import sys
+from fastapi_classification.core.config import settings
+from fastapi_classification.services.model_service import ModelService
+service = ModelService(
+    model_path={model_path!r},
+    class_labels=settings.MODEL_CLASS_LABELS,
+    backend="torch",
+    quantization="none",
+    execution_profile="eager",
+    mmap_weights={mmap},
+)
+service.warmup([1])
+print("ready", flush=True)
+sys.stdin.read()
+"""
+
+
+def measure(model_path: str, workers: int, mmap: bool) -> dict:
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", PROBE.format(model_path=model_path, mmap=mmap)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(workers)
+    ]
+    try:
+        for process in processes:
+            if process.stdout.readline().strip() != "ready":
+                raise RuntimeError("子进程加载模型失败")
+        rows = []
+        for process in processes:
+            info = psutil.Process(process.pid).memory_full_info()
+            rows.append({
+                "rss_mb": info.rss / 1024 / 1024,
+                "pss_mb": getattr(info, "pss", 0) / 1024 / 1024,
+                "uss_mb": info.uss / 1024 / 1024,
+            })
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+    return {
+        "mmap_weights": mmap,
+        "workers": workers,
+        "per_worker": rows,
+        "avg_rss_mb": sum(row["rss_mb"] for row in rows) / workers,
+        "avg_pss_mb": sum(row["pss_mb"] for row in rows) / workers,
+        "avg_uss_mb": sum(row["uss_mb"] for row in rows) / workers,
+        "total_pss_mb": sum(row["pss_mb"] for row in rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多 worker 进程内存占用对比")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model-path", default=settings.MODEL_PATH)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = args.model_path if os.path.exists(args.model_path) else make_random_checkpoint(directory)
+        results = [measure(model_path, args.workers, mmap) for mmap in (False, True)]
+    for result in results:
+        print(
+            f"mmap={str(result['mmap_weights']):<5} 平均 RSS {result['avg_rss_mb']:8.1f} MB  "
+            f"PSS {result['avg_pss_mb']:8.1f} MB  USS {result['avg_uss_mb']:8.1f} MB  "
+            f"PSS 合计 {result['total_pss_mb']:8.1f} MB"
+        )
+    print(json.dumps({"environment": environment(), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
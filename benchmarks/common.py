@@ -0,0 +1,115 @@
+"""基准测试公共工具：合成 X 光图像、延迟分位数、峰值内存和运行环境信息
+
+各基准脚本输出的 JSON 都带有 environment 字段，便于跨提交对比结果。
+"""
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Callable, List, Sequence
+
+import numpy as np
+from PIL import Image
+
+
+def make_xray_images(count: int, size: int, fmt: str = "JPEG", seed: int = 0) -> List[bytes]:
+    """生成模拟胸部 X 光片的灰度图像（编码后的字节）
+
+    横向渐变叠加两块较亮的椭圆（模拟肺野）和高斯噪声，压缩率接近真实片子，
+    比纯噪声图更能反映真实的解码耗时。
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    base = 60 + 80 * x
+    lungs = sum(
+        120 * np.exp(-(((x - cx) / 0.14) ** 2 + ((y - 0.5) / 0.3) ** 2))
+        for cx in (0.32, 0.68)
+    )
+    images = []
+    for _ in range(count):
+        noise = rng.normal(0, 12, (size, size)).astype(np.float32)
+        pixels = np.clip(base + lungs + noise, 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, mode="L").save(buffer, format=fmt)
+        images.append(buffer.getvalue())
+    return images
+
+
+def make_random_checkpoint(directory: str) -> str:
+    """没有权重文件时生成随机初始化的 simplecnn 权重，耗时和内存占用与真实权重相同"""
+    import torch
+    from fastapi_classification.core.config import settings
+    from fastapi_classification.model.cnn import simplecnn
+
+    path = os.path.join(directory, "random.pth")
+    torch.save(simplecnn(num_class=len(settings.MODEL_CLASS_LABELS)).state_dict(), path)
+    return path
+
+
+def percentiles(latencies_ms: Sequence[float]) -> dict:
+    """延迟分布（毫秒）"""
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    if values.size == 0:
+        return {"count": 0}
+    return {
+        "count": int(values.size),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def time_calls(fn: Callable[[], object], iterations: int, warmup: int = 1) -> List[float]:
+    """重复调用 fn，返回每次调用的耗时（毫秒）"""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存（MB，Linux 下 ru_maxrss 单位为 KB）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def environment() -> dict:
+    """运行环境：提交号、Python / torch 版本和 CPU 信息"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    info = {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+    if "torch" in sys.modules:
+        torch = sys.modules["torch"]
+        info["torch"] = torch.__version__
+        info["torch_threads"] = torch.get_num_threads()
+    return info
+
+
+def write_report(report: dict, output: str = ""):
+    """输出 JSON 报告：写入文件或打印到标准输出"""
+    report = {"environment": environment(), **report, "peak_rss_mb": peak_rss_mb()}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"结果已写入 {output}")
+    else:
+        print(text)
@@ -0,0 +1,181 @@
+"""压测用的外部服务替身：SQLite 代替 PostgreSQL，进程内实现的 MongoDB 与 Redis
+
+只实现了应用实际用到的操作（等值查询、$set/$inc/$unset、字符串键值与过期时间），
+用于在没有数据库服务的机器上启动完整的 FastAPI 应用。指定真实服务地址时不使用替身。
+"""
+import copy
+import fnmatch
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo.results import DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def _matches(document: dict, query: dict) -> bool:
+    return all(document.get(key) == value for key, value in query.items())
+
+
+class FakeCursor:
+    """find() 的返回值，支持 skip / limit / to_list 和 async for"""
+
+    def __init__(self, documents: List[dict]):
+        self._documents = documents
+
+    def skip(self, count: int) -> "FakeCursor":
+        self._documents = self._documents[count:]
+        return self
+
+    def limit(self, count: int) -> "FakeCursor":
+        if count:
+            self._documents = self._documents[:count]
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        documents = self._documents if length is None else self._documents[:length]
+        return [copy.deepcopy(document) for document in documents]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._documents:
+            yield copy.deepcopy(document)
+
+
+class FakeCollection:
+    """进程内的 MongoDB 集合，返回文档的副本，调用方修改不会影响存储"""
+
+    def __init__(self):
+        self._documents: Dict[Any, dict] = {}
+
+    async def insert_one(self, document: dict) -> InsertOneResult:
+        document.setdefault("_id", ObjectId())
+        self._documents[document["_id"]] = copy.deepcopy(document)
+        return InsertOneResult(document["_id"], acknowledged=True)
+
+    async def insert_many(self, documents: List[dict]) -> InsertManyResult:
+        for document in documents:
+            await self.insert_one(document)
+        return InsertManyResult([document["_id"] for document in documents], acknowledged=True)
+
+    async def find_one(self, query: dict) -> Optional[dict]:
+        for document in self._documents.values():
+            if _matches(document, query):
+                return copy.deepcopy(document)
+        return None
+
+    def find(self, query: Optional[dict] = None) -> FakeCursor:
+        return FakeCursor([document for document in self._documents.values() if _matches(document, query or {})])
+
+    async def count_documents(self, query: dict) -> int:
+        return sum(1 for document in self._documents.values() if _matches(document, query))
+
+    async def update_one(self, query: dict, update: dict) -> UpdateResult:
+        for document in self._documents.values():
+            if _matches(document, query):
+                document.update(update.get("$set", {}))
+                for key, value in update.get("$inc", {}).items():
+                    document[key] = document.get(key, 0) + value
+                for key in update.get("$unset", {}):
+                    document.pop(key, None)
+                return UpdateResult({"n": 1, "nModified": 1}, acknowledged=True)
+        return UpdateResult({"n": 0, "nModified": 0}, acknowledged=True)
+
+    async def delete_one(self, query: dict) -> DeleteResult:
+        for key, document in self._documents.items():
+            if _matches(document, query):
+                del self._documents[key]
+                return DeleteResult({"n": 1}, acknowledged=True)
+        return DeleteResult({"n": 0}, acknowledged=True)
+
+
+class FakeMongoDatabase:
+    """按属性或下标访问集合，集合在首次访问时创建"""
+
+    def __init__(self):
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection()
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+class FakeRedis:
+    """进程内的 Redis，只支持字符串值（与 decode_responses=True 的客户端行为一致）"""
+
+    def __init__(self):
+        self._values: Dict[str, str] = {}
+        self._expires: Dict[str, float] = {}
+
+    def _alive(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._values.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._values
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._values[key] if self._alive(key) else None
+
+    async def set(self, key: str, value, ex: Optional[int] = None, nx: bool = False) -> bool:
+        if nx and self._alive(key):
+            return False
+        self._values[key] = value.decode() if isinstance(value, bytes) else str(value)
+        self._expires.pop(key, None)
+        if ex:
+            self._expires[key] = time.monotonic() + ex
+        return True
+
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return [self._values[key] if self._alive(key) else None for key in keys]
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        if not self._alive(key):
+            return False
+        self._expires[key] = time.monotonic() + seconds
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                del self._values[key]
+                self._expires.pop(key, None)
+                deleted += 1
+        return deleted
+
+    async def keys(self, pattern: str = "*") -> List[str]:
+        return [key for key in list(self._values) if self._alive(key) and fnmatch.fnmatchcase(key, pattern)]
+
+    async def scan_iter(self, match: str = "*"):
+        for key in await self.keys(match):
+            yield key
+
+    async def flushdb(self):
+        self._values.clear()
+        self._expires.clear()
+
+    async def close(self):
+        pass
+
+
+def create_sql_session_factory(database_url: str, directory: str) -> sessionmaker:
+    """未指定数据库地址时在 directory 下创建 SQLite 文件库
+
+    同步路由在线程池中执行，因此关闭 SQLite 的同线程检查。
+    """
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(directory, 'loadtest.db')}"
+    connect_args = {"check_same_thread": False} if database_url.startswith("sqlite") else {}
+    engine = create_engine(database_url, connect_args=connect_args)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Response, status
+from fastapi_classification.core.config import settings
+from fastapi_classification.services.model_registry import model_registry
+
+router = APIRouter()
+
+
+@router.get("/live")
+async def liveness():
+    """存活检查"""
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def readiness(response: Response):
+    """就绪检查：模型加载并预热完成后才返回 200，负载均衡器据此只把流量转发给已预热的实例"""
+    model_status = model_registry.active.status()
+    warmup_required = bool(settings.MODEL_WARMUP_BATCH_SIZES)
+    ready = model_status["loaded"] and (model_status["warmed"] or not warmup_required)
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": ready, **model_status}
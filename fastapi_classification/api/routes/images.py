@@ -1,19 +1,26 @@
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 from typing import List, Optional
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from sqlalchemy.orm import Session
 
 from fastapi_classification.core.security import get_current_user
 from fastapi_classification.models.user import User, UserRole
 from fastapi_classification.schemas.image import ImageResponse
+from fastapi_classification.core.config import settings
 from ...core.database import get_mongodb, get_postgres_db
 from ...models.mongodb_models import ImageType, PrivacyLevel
 from ...services.oss_service import OSSService, oss_service as oss_service_instance
 from ...services.database_service import DatabaseService
+from ...services.ai_diagnosis_service import ImagePredictionItem, ai_diagnosis_pipeline
+from ...services.signed_url_cache import signed_url_cache
+
+# 可以送入分类模型的图片格式
+AI_DIAGNOSIS_CONTENT_TYPES = ["image/jpeg", "image/png"]
 
 # 依赖注入函数，提供 DatabaseService 实例
 async def get_database_service(
@@ -22,10 +29,18 @@ async def get_database_service(
 ) -> DatabaseService:
     return DatabaseService(postgres_db, mongodb_db)
 
+async def _sign_image_url(
+    oss_service: OSSService, image, variant: Optional[str], expires: int, valid_until: int, now: int
+) -> dict:
+    """签名生成缓存条目，有效期延长到窗口结束后 expires 秒"""
+    url = await oss_service.get_file_url(image, valid_until + expires - now, variant)
+    return {"url": url, "expires_at": valid_until + expires, "privacy_level": PrivacyLevel(image.privacy_level).value}
+
 router = APIRouter()
 
 @router.post("/upload", response_model=ImageResponse)
 async def upload_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     image_type: ImageType = ImageType.MEDICAL_IMAGE,
     privacy_level: PrivacyLevel = PrivacyLevel.DOCTORS_ONLY,
@@ -42,6 +57,7 @@ async def upload_image(
 
     mongo_image_data = await oss_service.upload_file(
         file=file,
+        references=db_service,
         user_id=current_user.id,
         image_type=image_type,
         privacy_level=privacy_level,
@@ -50,10 +66,43 @@ async def upload_image(
         diagnosis_id=diagnosis_id
     )
 
-    created_image = await db_service.create_image(mongo_image_data)
+    try:
+        created_image = await db_service.create_image(mongo_image_data)
+    except Exception:
+        # 记录没有写入，释放上传时加的引用
+        await db_service.release_blob(mongo_image_data.content_hash, lambda: oss_service.delete_file(mongo_image_data))
+        raise
+
+    # 病例影像在响应返回后送入 AI 诊断流水线，与其他病例的图像合并推理、批量写入诊断草稿
+    if (
+        settings.AI_DIAGNOSIS_ENABLED
+        and case_id is not None
+        and image_type == ImageType.MEDICAL_IMAGE
+        and file.content_type in AI_DIAGNOSIS_CONTENT_TYPES
+    ):
+        await file.seek(0)
+        background_tasks.add_task(
+            ai_diagnosis_pipeline.submit,
+            ImagePredictionItem(
+                case_id=case_id,
+                doctor_id=current_user.id,
+                data=await file.read(),
+                image_id=created_image.id,
+            ),
+        )
 
     return ImageResponse.model_validate(created_image)
 
+@router.get("/files/{object_key:path}", include_in_schema=False)
+async def download_local_file(
+    object_key: str,
+    expires: int,
+    signature: str,
+    oss_service: OSSService = Depends(lambda: oss_service_instance)
+):
+    """本地存储后端的签名下载地址，与 OSS 签名地址一样凭链接访问，不要求登录"""
+    return oss_service.file_response(object_key, expires, signature)
+
 @router.get("/{image_id}", response_model=ImageResponse)
 async def get_image(
     image_id: str,
@@ -74,20 +123,29 @@ async def get_image(
 async def get_image_url(
     image_id: str,
     expires: int = 3600,
+    variant: Optional[str] = None,
     db_service: DatabaseService = Depends(get_database_service),
     oss_service: OSSService = Depends(lambda: oss_service_instance),
     current_user: User = Depends(get_current_user)
 ):
-    """获取图片访问URL"""
-    image = await db_service.get_image(image_id)
-    if not image:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="图片不存在")
-
-    if image.privacy_level == PrivacyLevel.DOCTORS_ONLY and current_user.role != UserRole.DOCTOR:
+    """获取图片访问URL，variant 指定衍生图（如 thumbnail_256、model），不传则为原图
+
+    同一时间窗口内重复请求返回缓存的 URL，命中时不查询 MongoDB、不重新签名。
+    """
+    now = int(time.time())
+    key, valid_until = await signed_url_cache.make_key(image_id, variant, expires, now)
+    entry = await signed_url_cache.get(key, valid_until)
+    if entry is None:
+        image = await db_service.get_image(image_id)
+        if not image:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="图片不存在")
+        entry = await _sign_image_url(oss_service, image, variant, expires, valid_until, now)
+        await signed_url_cache.set(key, entry, valid_until)
+
+    if entry["privacy_level"] == PrivacyLevel.DOCTORS_ONLY and current_user.role != UserRole.DOCTOR:
          raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权访问此图片")
 
-    url = await oss_service.get_file_url(image, expires)
-    return {"url": url}
+    return {"url": entry["url"], "expires_at": entry["expires_at"]}
 
 @router.delete("/{image_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_image(
@@ -104,11 +162,16 @@ async def delete_image(
     if image.user_id != current_user.id and current_user.role != UserRole.DOCTOR:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权删除此图片")
 
-    await oss_service.delete_file(image)
-
     delete_success = await db_service.delete_image(image_id)
     if not delete_success:
          logger.error(f"删除图片记录失败: {image_id}")
+    await signed_url_cache.invalidate(image_id)
+
+    # 内容相同的图片共用一份文件，由删除了记录的请求释放引用，引用数归零后才删除文件
+    if not image.content_hash:
+        await oss_service.delete_file(image)
+    elif delete_success:
+        await db_service.release_blob(image.content_hash, lambda: oss_service.delete_file(image))
 
     return
 
@@ -134,4 +197,36 @@ async def get_case_images(
 ):
     """获取病例相关的所有图片"""
     images = await db_service.get_case_images(case_id)
-    return [ImageResponse.model_validate(image) for image in images] 
\ No newline at end of file
+    return [ImageResponse.model_validate(image) for image in images]
+
+@router.get("/case/{case_id}/urls")
+async def get_case_image_urls(
+    case_id: int,
+    expires: int = 3600,
+    variant: Optional[str] = None,
+    db_service: DatabaseService = Depends(get_database_service),
+    oss_service: OSSService = Depends(lambda: oss_service_instance),
+    current_user: User = Depends(get_current_user)
+):
+    """一次获取病例所有图片的访问URL：缓存用一次批量查询、一次批量写入，只为未命中的图片签名；无权访问或没有该衍生图的图片不返回"""
+    images = await db_service.get_case_images(case_id)
+    if current_user.role != UserRole.DOCTOR:
+        images = [image for image in images if image.privacy_level != PrivacyLevel.DOCTORS_ONLY]
+    if variant:
+        images = [image for image in images if variant in image.derivatives]
+
+    now = int(time.time())
+    keys = await signed_url_cache.make_keys([image.id for image in images], variant, expires, now)
+    entries = await signed_url_cache.get_many([key for key, _ in keys], [until for _, until in keys])
+
+    signed = []
+    for index, (image, (key, until), entry) in enumerate(zip(images, keys, entries)):
+        if entry is None:
+            entries[index] = await _sign_image_url(oss_service, image, variant, expires, until, now)
+            signed.append((key, entries[index], until))
+    await signed_url_cache.set_many(signed)
+
+    return [
+        {"image_id": image.id, "url": entry["url"], "expires_at": entry["expires_at"]}
+        for image, entry in zip(images, entries)
+    ]
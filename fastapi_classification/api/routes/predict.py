@@ -1,24 +1,243 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+import json
+from typing import List, Optional
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, status
+from fastapi.responses import Response, StreamingResponse
+from fastapi_classification.core.config import settings
+from fastapi_classification.core.metrics import stage_timer
+from fastapi_classification.core.security import get_current_user
+from fastapi_classification.models.user import User, UserRole
 from fastapi_classification.services.model_service import ModelService
+from fastapi_classification.services.model_registry import model_registry, resolve_model_path
+from fastapi_classification.services.prediction_cache import prediction_cache
+from fastapi_classification.services.prediction_jobs import (
+    iter_job_sources,
+    predict_sources,
+    prediction_job_queue,
+    take_sources,
+)
+from fastapi_classification.services.preprocessing import TTA_VIEWS
+from fastapi_classification.services.upload_reader import (
+    InMemoryMultiPartParser,
+    InMemoryUploadRoute,
+    read_upload,
+    upload_stats,
+)
+from fastapi_classification.models.request import ModelLoadRequest
 from fastapi_classification.models.response import PredictionResult
 
-# 定义类别标签
-CLASS_LABELS = ["新冠肺炎", "肺不透明", "正常", "病毒性肺炎"]
+# 支持的图片格式
+IMAGE_CONTENT_TYPES = ["image/jpeg", "image/png"]
+ZIP_CONTENT_TYPES = ["application/zip", "application/x-zip-compressed"]
 
-# 初始化ModelService
-model_path = "fastapi_classification/model_pth/best.pth"
-model_service = ModelService(model_path=model_path, class_labels=CLASS_LABELS)
+SERIALIZATION_SECONDS = stage_timer("serialization")
 
 # 创建路由
 router = APIRouter()
 
 
-@router.post("/predict/", response_model=PredictionResult)
-async def predict(file: UploadFile = File(...)):
-    if file.content_type not in ["image/jpeg", "image/png"]:
+def _json_response(result: PredictionResult) -> Response:
+    """直接序列化为 JSON 响应，以便统计序列化耗时"""
+    with SERIALIZATION_SECONDS.time():
+        return Response(content=result.model_dump_json(), media_type="application/json")
+
+
+async def predict(
+    file: UploadFile = File(...),
+    model_version: Optional[str] = None,
+    tta_views: Optional[int] = Query(None, ge=2, le=len(TTA_VIEWS), description="测试时增强的视图数，不传则只预测原图"),
+):
+    if file.content_type not in IMAGE_CONTENT_TYPES:
         raise HTTPException(status_code=400, detail="仅支持JPEG或PNG格式图片")
+    # 请求开始时确定模型，之后即使发生版本切换，本次请求也使用同一个模型
+    model_service = await model_registry.get_or_load(model_version)
     try:
-        label, confidence_scores = model_service.predict(file.file)
-        return PredictionResult(predicted_label=label, confidence_scores=confidence_scores)
+        await model_service.ensure_loaded()
+        # 从上传文件拷贝一次到预分配的内存缓冲区，后续哈希和解码都使用该缓冲区，不再整体复制
+        data = await read_upload(file, settings.PREDICT_MAX_UPLOAD_BYTES, InMemoryMultiPartParser.max_file_size)
+        # 相同图像（重复上传、不同医生复核）直接返回缓存结果
+        cache_version = model_service.weights_digest if tta_views is None else f"{model_service.weights_digest}-tta{tta_views}"
+        cache_key = prediction_cache.make_key(data, cache_version, model_service.preprocessor.signature)
+        cached = await prediction_cache.get(cache_key)
+        if cached is not None:
+            return _json_response(cached.model_copy(update={"model_version": model_service.model_version}))
+        if tta_views is None:
+            label, confidence_scores = await model_service.predict_async(data)
+            result = PredictionResult(
+                predicted_label=label,
+                confidence_scores=confidence_scores,
+                model_version=model_service.model_version,
+            )
+        else:
+            label, confidence_scores, confidence_variance = await model_service.predict_tta_async(data, tta_views)
+            result = PredictionResult(
+                predicted_label=label,
+                confidence_scores=confidence_scores,
+                confidence_variance=confidence_variance,
+                tta_views=tta_views,
+                model_version=model_service.model_version,
+            )
+        await prediction_cache.set(cache_key, result)
+        return _json_response(result)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# 单张预测的上传文件在解析时保留在内存中（见 InMemoryUploadRoute），只对该路由生效
+router.add_api_route(
+    "/predict/",
+    predict,
+    methods=["POST"],
+    response_model=PredictionResult,
+    route_class_override=InMemoryUploadRoute,
+)
+
+
+def _is_zip(file: UploadFile) -> bool:
+    return file.content_type in ZIP_CONTENT_TYPES or (file.filename or "").lower().endswith(".zip")
+
+
+async def _read_sources(files: List[UploadFile], max_bytes: int) -> List[dict]:
+    """把上传文件读入内存，返回 {"filename", "kind", "data"} 列表，总大小超过 max_bytes 时返回 413
+
+    处理函数返回后 FastAPI 即关闭上传文件，流式响应和异步任务只能使用这里读出的数据。
+    """
+    sources = []
+    remaining = max_bytes
+    for file in files:
+        if _is_zip(file):
+            kind = "zip"
+        elif file.content_type in IMAGE_CONTENT_TYPES:
+            kind = "image"
+        else:
+            sources.append({"filename": file.filename, "kind": "unsupported", "data": None})
+            continue
+        data = await read_upload(file, remaining)
+        remaining -= len(data)
+        sources.append({"filename": file.filename, "kind": kind, "data": data})
+    return sources
+
+
+def _format_row(filename: str, result, model_version: str) -> str:
+    """把单张图像的预测结果序列化为一行 NDJSON"""
+    with SERIALIZATION_SECONDS.time():
+        return _serialize_row(filename, result, model_version)
+
+
+def _serialize_row(filename: str, result, model_version: str) -> str:
+    if isinstance(result, Exception):
+        return json.dumps({"filename": filename, "error": str(result)}, ensure_ascii=False) + "\n"
+    label, confidence_scores = result
+    return PredictionResult(
+        predicted_label=label,
+        confidence_scores=confidence_scores,
+        filename=filename,
+        model_version=model_version,
+    ).model_dump_json() + "\n"
+
+
+async def _stream_predictions(model_service: ModelService, files: List[dict]):
+    """按固定批大小推理，每完成一批就输出对应的 NDJSON 行
+
+    压缩包在推理线程中按批逐个解压成员，成员数和解压后的大小与异步任务使用相同的上限。
+    """
+    executor = model_service.executor
+    sources = iter_job_sources(
+        files,
+        max_members=settings.PREDICTION_JOB_ZIP_MAX_MEMBERS,
+        max_member_bytes=settings.PREDICT_MAX_UPLOAD_BYTES,
+        max_total_bytes=settings.PREDICTION_JOB_ZIP_MAX_BYTES,
+    )
+    while chunk := await executor.run(take_sources, sources, settings.PREDICT_BATCH_CHUNK_SIZE, bounded=False):
+        results = await executor.run(predict_sources, model_service, chunk, bounded=False)
+        yield "".join(
+            _format_row(filename, result, model_service.model_version)
+            for (filename, _), result in zip(chunk, results)
+        )
+
+
+@router.post("/batch/")
+async def predict_batch(files: List[UploadFile] = File(...), model_version: Optional[str] = None):
+    """批量预测：支持多个 JPEG/PNG 文件或 zip 压缩包，以 NDJSON 流式返回每张图像的结果"""
+    model_service = await model_registry.get_or_load(model_version)
+    # 响应开始流式输出后无法再返回错误状态码，因此在此处提前做准入检查
+    if model_service.executor.pending >= model_service.executor.max_queue_size:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="推理服务繁忙，请稍后重试"
+        )
+    await model_service.ensure_loaded()
+    sources = await _read_sources(files, settings.PREDICT_BATCH_MAX_BYTES)
+    return StreamingResponse(_stream_predictions(model_service, sources), media_type="application/x-ndjson")
+
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_prediction_job(
+    files: List[UploadFile] = File(...),
+    model_version: Optional[str] = None,
+    tta_views: Optional[int] = Query(None, ge=2, le=len(TTA_VIEWS), description="测试时增强的视图数，不传则只预测原图"),
+):
+    """提交异步预测任务（多个 JPEG/PNG 文件或 zip 压缩包），立即返回任务 ID，结果通过任务查询接口获取"""
+    # 任务可能由其他进程处理，只检查版本是否已注册或已发布，不在本进程加载
+    if model_version is not None and not await model_registry.exists(model_version):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"模型版本 {model_version} 不存在")
+    job_files = await _read_sources(files, settings.PREDICTION_JOB_MAX_BYTES)
+    job_id = await prediction_job_queue.submit(job_files, model_version, tta_views)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/jobs/{job_id}")
+async def get_prediction_job(job_id: str):
+    """查询异步预测任务的状态和结果"""
+    job = await prediction_job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在或已过期")
+    return job
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """获取预测缓存的命中统计"""
+    return prediction_cache.stats()
+
+
+@router.get("/upload/stats")
+async def get_upload_stats():
+    """获取上传读取字节数和解码耗时统计"""
+    return upload_stats.stats()
+
+
+def _require_admin(current_user: User):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="需要管理员权限才能管理模型")
+
+
+@router.get("/models")
+async def list_models(current_user: User = Depends(get_current_user)):
+    """列出所有模型版本及其状态"""
+    return {"active_version": model_registry.active_version, "models": model_registry.describe()}
+
+
+@router.post("/models", status_code=status.HTTP_202_ACCEPTED)
+async def load_model(request: ModelLoadRequest, current_user: User = Depends(get_current_user)):
+    """在后台加载新的模型版本"""
+    _require_admin(current_user)
+    model_path = resolve_model_path(request.model_file)
+    model_registry.load_in_background(request.version, model_path, activate=request.activate)
+    return {"message": "模型开始加载", "version": request.version}
+
+
+@router.post("/models/{version}/activate")
+async def activate_model(version: str, current_user: User = Depends(get_current_user)):
+    """把指定版本切换为当前版本"""
+    _require_admin(current_user)
+    await model_registry.activate(version)
+    return {"active_version": model_registry.active_version}
+
+
+@router.delete("/models/{version}", status_code=status.HTTP_204_NO_CONTENT)
+async def unload_model(version: str, current_user: User = Depends(get_current_user)):
+    """卸载非当前使用的模型版本"""
+    _require_admin(current_user)
+    await model_registry.unload(version)
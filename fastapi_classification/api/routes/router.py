@@ -8,6 +8,7 @@ from .patients import router as patients_router
 from .medical_info import router as medical_info_router
 from .images import router as images_router
 from .doctor_notes import router as doctor_notes_router
+from .health import router as health_router
 
 api_router = APIRouter()
 
@@ -38,3 +39,5 @@ api_router.include_router(images_router, prefix="/images", tags=["图片管理"]
 # 注册医生笔记路由
 api_router.include_router(doctor_notes_router, prefix="/doctor-notes", tags=["医生笔记"])
 
+# 注册健康检查路由
+api_router.include_router(health_router, prefix="/health", tags=["健康检查"])
@@ -32,5 +32,53 @@ class Settings:
     # CORS配置
     BACKEND_CORS_ORIGINS: List[str] = ["*"]
 
+    # 模型推理配置
+    MODEL_DIR: str = "fastapi_classification/model_pth"  # 权重文件目录，热加载只允许使用该目录下的文件
+    MODEL_PATH: str = f"{MODEL_DIR}/best.pth"
+    MODEL_VERSION: str = "v1"  # 默认模型的版本号
+    MODEL_CLASS_LABELS: List[str] = ["新冠肺炎", "肺不透明", "正常", "病毒性肺炎"]
+    MODEL_PRELOAD_ON_STARTUP: bool = True  # 应用启动后在后台加载模型，否则在首次预测时加载
+    MODEL_REGISTRY_SYNC_INTERVAL: float = 5.0  # 从 Redis 同步其他进程加载的模型版本和当前版本的间隔（秒），0 表示不同步
+    MODEL_WARMUP_BATCH_SIZES: List[int] = [1, 4, 16]  # 预热时依次运行的批大小，为空则不预热
+    MODEL_BATCH_MAX_SIZE: int = 16  # 动态批处理的最大批大小
+    MODEL_BATCH_MAX_WAIT_MS: float = 10.0  # 凑批的最长等待时间（毫秒）
+    INFERENCE_WORKERS: int = 2  # 推理线程池大小
+    INFERENCE_TORCH_THREADS: int = 2  # torch 计算线程数
+    INFERENCE_MAX_QUEUE_SIZE: int = 64  # 推理排队上限，超过后返回 503
+    PREDICT_BATCH_CHUNK_SIZE: int = 32  # 批量预测接口每次前向传播的图像数
+    PREDICT_BATCH_MAX_BYTES: int = 100 * 1024 * 1024  # 批量预测请求上传文件的总大小上限
+    MODEL_BACKEND: str = "torch"  # 推理后端：torch 或 onnx（onnx 加载失败时回退到 torch）
+    MODEL_ONNX_PATH: str = "fastapi_classification/model_pth/best.onnx"
+    ONNX_INTRA_OP_THREADS: int = 2  # 单个算子内部的并行线程数
+    ONNX_INTER_OP_THREADS: int = 1  # 算子之间的并行线程数
+    ONNX_GRAPH_OPTIMIZATION: str = "all"  # 图优化级别：disable/basic/extended/all
+    MODEL_MMAP_WEIGHTS: bool = False  # 以内存映射方式加载权重，多个 worker 进程共享同一份物理内存（仅 CPU）
+    MODEL_EXECUTION_PROFILE: str = "eager"  # PyTorch 执行配置：eager/optimized/torchscript/compile
+    MODEL_QUANTIZATION: str = "none"  # 量化模式：none/dynamic（仅全连接层）/static（卷积+全连接层）
+    MODEL_QUANT_CALIBRATION_DIR: str = ""  # static 量化的校准图片目录
+    MODEL_QUANT_CALIBRATION_LIMIT: int = 64  # 最多使用的校准图片数
+    PREPROCESS_DECODER: str = "pil"  # 图像解码器：pil 或 opencv
+    PREPROCESS_JPEG_DRAFT: bool = False  # JPEG 是否使用 draft 降采样解码：更快，但像素与完整解码不同，需先验证模型精度
+    PREDICTION_CACHE_MAX_ENTRIES: int = 1024  # 进程内预测缓存条数
+    PREDICTION_CACHE_EXPIRE: int = 24 * 3600  # Redis 中预测缓存的过期时间（秒）
+    PREDICT_MAX_UPLOAD_BYTES: int = 20 * 1024 * 1024  # 单张预测图片的大小上限，超过返回 413
+    PREDICTION_JOB_RUN_IN_API: bool = True  # 是否在 API 进程内处理预测任务，独立部署 worker 时关闭
+    PREDICTION_JOB_WORKERS: int = 2  # 每个进程并发处理的预测任务数
+    PREDICTION_JOB_PREFETCH: int = 2  # 每个进程预先从队列取出、在本地等待处理的任务数
+    PREDICTION_JOB_RESULT_TTL: int = 3600  # 任务状态和结果在 Redis 中的保留时间（秒）
+    PREDICTION_JOB_MAX_BYTES: int = 100 * 1024 * 1024  # 单个任务上传文件的总大小上限
+    PREDICTION_JOB_ZIP_MAX_MEMBERS: int = 10000  # 单个任务或批量预测请求中压缩包内最多处理的图片数
+    PREDICTION_JOB_ZIP_MAX_BYTES: int = 1024 * 1024 * 1024  # 单个任务或批量预测请求中压缩包解压后的总大小上限，单个成员不超过 PREDICT_MAX_UPLOAD_BYTES
+    AI_DIAGNOSIS_ENABLED: bool = True  # 上传病例影像后自动生成 AI 诊断草稿
+    AI_DIAGNOSIS_BATCH_SIZE: int = 32  # 累积多少张图像后统一推理并批量写库
+    AI_DIAGNOSIS_FLUSH_INTERVAL: float = 2.0  # 未凑满一批时的最长等待时间（秒）
+    IMAGE_DERIVATIVES_ENABLED: bool = True  # 上传图片时生成缩略图和模型输入尺寸的衍生图
+    IMAGE_THUMBNAIL_SIZES: List[int] = [256]  # 缩略图最长边（像素）
+    IMAGE_THUMBNAIL_QUALITY: int = 85  # 缩略图 JPEG 质量
+    IMAGE_BLOB_DELETE_WAIT_ATTEMPTS: int = 50  # 上传的文件正在被删除时最多等待的次数，超过返回 503
+    IMAGE_BLOB_DELETE_WAIT_INTERVAL: float = 0.1  # 每次等待的时间（秒）
+    SIGNED_URL_CACHE_MAX_ENTRIES: int = 4096  # 进程内签名 URL 缓存条数
+    SIGNED_URL_CACHE_WINDOW: int = 300  # 签名 URL 的复用窗口（秒），窗口内同一图片返回同一个 URL
+
 # 创建全局设置实例
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,180 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# 耗时直方图的默认桶边界（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 批大小、队列深度等计数类直方图的桶边界
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+# 导出的分位数
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """固定桶直方图（线程安全），分位数按桶内线性插值估计，与 Prometheus 的 histogram_quantile 一致"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """记录 with 代码块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count > 0:
+                if index == len(self.buckets):
+                    return self.buckets[-1]  # 落在 +Inf 桶时返回最大的有限边界
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            **{f"p{int(q * 100)}": self.quantile(q) for q in QUANTILES},
+        }
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+def _format_labels(labels: LabelKey, extra: Dict[str, str] = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    """进程内指标注册表，以 Prometheus 文本格式导出
+
+    同名指标按标签区分，例如 inference_stage_seconds{stage="decode"}；
+    回调指标在导出时才取值，用于队列深度、缓存命中数等已有统计。
+    """
+
+    def __init__(self):
+        self._help: Dict[str, Tuple[str, str]] = {}  # 指标名 -> (类型, 说明)
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, Counter]] = {}
+        self._callbacks: Dict[str, Dict[LabelKey, Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, kind: str, name: str, help_text: str):
+        registered = self._help.setdefault(name, (kind, help_text))
+        if registered[0] != kind:
+            raise ValueError(f"指标 {name} 已注册为 {registered[0]}")
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS, **labels) -> Histogram:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._register("histogram", name, help_text)
+            family = self._histograms.setdefault(name, {})
+            if key not in family:
+                family[key] = Histogram(buckets)
+            return family[key]
+
+    def counter(self, name: str, help_text: str, **labels) -> Counter:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._register("counter", name, help_text)
+            family = self._counters.setdefault(name, {})
+            if key not in family:
+                family[key] = Counter()
+            return family[key]
+
+    def callback(self, name: str, help_text: str, fn: Callable[[], float], kind: str = "gauge", **labels):
+        """注册导出时才求值的指标，kind 为 gauge 或 counter"""
+        with self._lock:
+            self._register(kind, name, help_text)
+            self._callbacks.setdefault(name, {})[tuple(sorted(labels.items()))] = fn
+
+    def render(self) -> str:
+        """导出 Prometheus 文本格式"""
+        lines: List[str] = []
+        for name, (kind, help_text) in sorted(self._help.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, histogram in self._histograms.get(name, {}).items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels, {'le': le})} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            for labels, counter in self._counters.get(name, {}).items():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(counter.value)}")
+            for labels, fn in self._callbacks.get(name, {}).items():
+                try:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(fn())}")
+                except Exception:
+                    continue
+        # 直方图的分位数估计单独作为 gauge 导出，便于不经 PromQL 直接查看
+        for name, family in sorted(self._histograms.items()):
+            lines.append(f"# HELP {name}_quantile {self._help[name][1]}（分位数估计）")
+            lines.append(f"# TYPE {name}_quantile gauge")
+            for labels, histogram in family.items():
+                for q in QUANTILES:
+                    lines.append(f"{name}_quantile{_format_labels(labels, {'quantile': str(q)})} {histogram.quantile(q)}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """各直方图的次数、总和与 p50/p95/p99"""
+        return {
+            name: {_format_labels(labels) or "_": histogram.summary() for labels, histogram in family.items()}
+            for name, family in self._histograms.items()
+        }
+
+
+metrics = MetricsRegistry()
+
+
+def stage_timer(stage: str) -> Histogram:
+    """预测各阶段（上传读取、解码、归一化、前向传播、softmax、序列化）的耗时直方图"""
+    return metrics.histogram("inference_stage_seconds", "预测各阶段耗时（秒）", stage=stage)
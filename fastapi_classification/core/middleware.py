@@ -0,0 +1,31 @@
+from typing import Dict
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# multipart 边界和表单头部占用的额外字节
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class ContentLengthLimitMiddleware:
+    """按路径限制请求体大小：在解析 multipart 之前根据 Content-Length 直接返回 413
+
+    未携带 Content-Length 的请求（分块传输）放行，由路由读取上传文件时再检查。
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is not None:
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length is not None and content_length.isdigit() and int(content_length) > limit + MULTIPART_OVERHEAD:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"请求体大小不能超过 {limit // 1024 // 1024} MB"}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -35,6 +35,11 @@ class MongoDB:
 async def get_database():
     return mongodb.db
 
+async def create_indexes():
+    """创建应用依赖的索引，索引已存在时不做任何操作"""
+    # 上传去重按内容哈希查找已有图片，blobs 中没有引用计数时按哈希统计记录数补建（blobs 以哈希为 _id）
+    await mongodb.db.images.create_index("content_hash")
+
 # 在应用关闭时关闭客户端连接的函数
 async def close_mongo_connection():
     if mongodb.client:
@@ -1,12 +1,30 @@
 from pydantic import BaseModel
 
 class OSSConfig(BaseModel):
-    """阿里云OSS配置"""
+    """对象存储配置（阿里云OSS / S3 兼容存储 / 本地磁盘）"""
     access_key_id: str = "your_access_key_id"
     access_key_secret: str = "your_access_key_secret"
     endpoint: str = "oss-cn-hangzhou.aliyuncs.com"  # 根据您的地区修改
     bucket_name: str = "your-bucket-name"
     base_url: str = "https://your-bucket-name.oss-cn-hangzhou.aliyuncs.com"  # 访问域名
     max_size: int = 10 * 1024 * 1024  # 最大文件大小（10MB）
+    upload_chunk_size: int = 1024 * 1024  # 读取上传文件的分块大小
+    multipart_threshold: int = 5 * 1024 * 1024  # 超过该大小的文件使用分片上传
+    multipart_part_size: int = 1024 * 1024  # 分片大小，小于存储后端要求的最小分片（OSS 100KB、S3 5MB）时按最小分片
     allowed_types: list = ["image/jpeg", "image/png", "image/gif", "application/pdf"]
-    upload_dir: str = "medical_images"  # 上传目录 
\ No newline at end of file
+    upload_dir: str = "medical_images"  # 上传目录
+    backend: str = "oss"  # 存储后端：oss、s3 或 local（本地磁盘）
+    # S3 兼容存储（backend = "s3"）
+    s3_endpoint_url: str = ""  # MinIO 等自建服务的地址，AWS S3 留空
+    s3_region: str = ""
+    s3_bucket: str = "medical-images"
+    s3_access_key_id: str = ""  # 留空时使用 boto3 默认的凭证链
+    s3_secret_access_key: str = ""
+    # 本地磁盘（backend = "local"）
+    local_root: str = "storage"  # 文件根目录
+    local_url_prefix: str = "/api/v1/images/files"  # 签名下载地址的前缀，对应 images 路由中的下载接口
+    local_accel_redirect: str = ""  # 设置后由 nginx 按 X-Accel-Redirect 发送文件，如 /protected-images
+    max_concurrency: int = 16  # 同时进行的存储请求数（线程数与连接池大小）
+    timeout: float = 30  # 连接和读取超时（秒）
+    retries: int = 3  # 网络错误和 5xx 错误的重试次数
+    retry_backoff: float = 0.2  # 首次重试前的等待时间（秒），之后每次翻倍 
\ No newline at end of file
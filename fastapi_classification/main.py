@@ -1,9 +1,19 @@
+import asyncio
+import logging
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_classification.core.config import settings
+from fastapi_classification.core.metrics import metrics
+from fastapi_classification.core.middleware import ContentLengthLimitMiddleware
 from fastapi_classification.core.redis import redis_manager
-from fastapi_classification.core.mongodb import mongodb, close_mongo_connection
+from fastapi_classification.core.mongodb import mongodb, close_mongo_connection, create_indexes
 from fastapi_classification.api.routes.router import api_router
+from fastapi_classification.services.model_registry import model_registry
+from fastapi_classification.services.inference_executor import inference_executor
+from fastapi_classification.services.prediction_jobs import prediction_job_workers
+from fastapi_classification.services.ai_diagnosis_service import ai_diagnosis_pipeline
+from fastapi_classification.services.oss_service import oss_service
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -19,16 +29,58 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 单张预测的请求体超限时在解析前直接拒绝
+app.add_middleware(
+    ContentLengthLimitMiddleware,
+    limits={f"{settings.API_V1_STR}/predict/predict/": settings.PREDICT_MAX_UPLOAD_BYTES},
+)
+
 # 注册路由
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+logger = logging.getLogger(__name__)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus 指标：各阶段耗时直方图、批大小与队列深度分布、缓存与上传计数"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# 后台任务引用，防止被垃圾回收
+background_tasks = set()
+
+async def preload_model():
+    """在后台加载并预热模型，加载期间应用已可处理其他请求"""
+    try:
+        model_service = model_registry.active
+        await model_service.ensure_loaded()
+        if settings.MODEL_WARMUP_BATCH_SIZES:
+            await model_service.warmup_async()
+    except Exception as e:
+        logger.error(f"模型预加载失败: {str(e)}")
+
 @app.on_event("startup")
 async def startup_event():
-    """应用启动时初始化 Redis"""
+    """应用启动时初始化 Redis、创建 MongoDB 索引、启动模型注册表同步，并在后台加载模型"""
     await redis_manager.init_redis()
+    try:
+        await create_indexes()
+    except Exception as e:
+        logger.error(f"创建 MongoDB 索引失败: {str(e)}")
+    model_registry.start_sync()
+    if settings.MODEL_PRELOAD_ON_STARTUP:
+        task = asyncio.create_task(preload_model())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    if settings.PREDICTION_JOB_RUN_IN_API and redis_manager.redis is not None:
+        prediction_job_workers.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """应用关闭时关闭 Redis 连接"""
+    """应用关闭时关闭 Redis 连接并停止推理队列"""
+    await prediction_job_workers.close()
+    await ai_diagnosis_pipeline.close()
+    await model_registry.close()
+    inference_executor.shutdown()
+    oss_service.close()
     await redis_manager.close()
     await close_mongo_connection()
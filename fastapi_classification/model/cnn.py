@@ -21,7 +21,7 @@ class simplecnn(nn.Module):
     def forward(self,x):
         # 前向传播部分
         x = self.features(x) # 先将图像进行特征提取
-        x = x.view(x.size(0),-1) # 展平 x.size(0) 为batch
+        x = x.flatten(1) # 展平，保留第 0 维 batch；channels_last 输入时 view 无法展平，flatten 会按需复制
         x = self.classifier(x)
         return x
 
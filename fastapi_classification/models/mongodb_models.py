@@ -36,6 +36,14 @@ class ImageType(str, Enum):
     PHOTO = "photo"  # 照片
     OTHER = "other"  # 其他
 
+class ImageDerivative(BaseModel):
+    """上传时由原图生成的衍生图（缩略图、模型输入尺寸图）"""
+    file_path: str  # 文件在存储服务中的路径
+    width: int
+    height: int
+    file_size: int
+    mime_type: str
+
 class MongoImage(BaseModel):
     """MongoDB图片模型"""
     id: str = Field(default_factory=lambda: str(ObjectId()))
@@ -49,6 +57,8 @@ class MongoImage(BaseModel):
     width: Optional[int] = None  # 图片宽度
     height: Optional[int] = None  # 图片高度
     format: Optional[str] = None  # 图片格式
+    content_hash: Optional[str] = None  # 文件内容的 SHA-256
+    derivatives: Dict[str, ImageDerivative] = {}  # 衍生图，键为名称（thumbnail_256、model 等）
     image_metadata: Dict[str, Any] = {}  # 图片元数据
     tags: List[str] = []  # 标签
     user_id: int  # 上传用户ID
@@ -1,5 +1,15 @@
 from fastapi import UploadFile, File
+from pydantic import BaseModel, ConfigDict
 
 
 class PredictRequest:
     file: UploadFile = File(...)
+
+
+class ModelLoadRequest(BaseModel):
+    """加载新模型版本请求"""
+    model_config = ConfigDict(protected_namespaces=())
+
+    version: str  # 版本号
+    model_file: str  # 模型目录下的权重文件名
+    activate: bool = False  # 加载完成后是否立即切换为当前版本
@@ -1,7 +1,13 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
 
 
 class PredictionResult(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
     predicted_label: str  # 分类标签
     confidence_scores: List[float]  # 每个类别对应的置信度分数
+    filename: Optional[str] = None  # 批量预测时对应的文件名
+    model_version: Optional[str] = None  # 产生该结果的模型版本
+    confidence_variance: Optional[List[float]] = None  # TTA 模式下各类别置信度在多个视图间的方差
+    tta_views: Optional[int] = None  # TTA 模式使用的视图数
@@ -1,7 +1,7 @@
-from pydantic import BaseModel
+from pydantic import AliasChoices, BaseModel, Field
 from datetime import datetime
-from typing import Optional
-from ..models.mongodb_models import ImageType, PrivacyLevel
+from typing import Dict, Optional
+from ..models.mongodb_models import ImageDerivative, ImageType, PrivacyLevel
 
 class ImageBase(BaseModel):
     """图片基础模型"""
@@ -19,10 +19,14 @@ class ImageResponse(ImageBase):
     """图片响应模型"""
     id: str
     user_id: int
-    file_name: str
+    file_name: str = Field(validation_alias=AliasChoices("file_name", "filename"))
     file_path: str
     file_size: int
     mime_type: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    format: Optional[str] = None
+    derivatives: Dict[str, ImageDerivative] = {}
     created_at: datetime
     updated_at: datetime
 
@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import logging
+import time
+from typing import List, Optional
+from fastapi_classification.core.mongodb import mongodb
+from fastapi_classification.models.mongodb_models import ImageType, MongoImage
+from fastapi_classification.services.ai_diagnosis_service import ImagePredictionItem, predict_and_persist
+from fastapi_classification.services.image_derivatives import MODEL_DERIVATIVE
+from fastapi_classification.services.inference_executor import inference_executor
+from fastapi_classification.services.model_registry import model_registry
+from fastapi_classification.services.oss_service import oss_service
+
+logger = logging.getLogger(__name__)
+
+# 可以送入分类模型的图片格式
+CONTENT_TYPES = ["image/jpeg", "image/png"]
+
+async def download_batch(documents: List[dict], semaphore: asyncio.Semaphore) -> List[ImagePredictionItem]:
+    """并发下载一批图像，下载失败的图像被跳过"""
+    async def download(document: dict) -> Optional[ImagePredictionItem]:
+        async with semaphore:
+            try:
+                image = MongoImage(**document)
+                # 有模型输入尺寸的衍生图时直接下载它，不必下载和解码全分辨率原图
+                variant = MODEL_DERIVATIVE if MODEL_DERIVATIVE in image.derivatives else None
+                data = await oss_service.download_file(image, variant)
+            except Exception as e:
+                logger.warning(f"跳过图像 {document['_id']}: {str(e)}")
+                return None
+        return ImagePredictionItem(
+            case_id=document["case_id"],
+            doctor_id=document["user_id"],
+            data=data,
+            image_id=str(document["_id"]),
+        )
+
+    items = await asyncio.gather(*(download(document) for document in documents))
+    return [item for item in items if item is not None]
+
+async def backfill(batch_size: int, concurrency: int, case_ids: List[int]):
+    """遍历归档中的病例影像，按批推理并批量写入 AI 诊断草稿
+
+    下一批图像的下载与当前批次的推理、写库重叠进行；每批只提交一次事务。
+    """
+    query = {
+        "case_id": {"$in": case_ids} if case_ids else {"$ne": None},
+        "image_type": ImageType.MEDICAL_IMAGE.value,
+        "mime_type": {"$in": CONTENT_TYPES},
+        "is_deleted": {"$ne": True},
+    }
+    model_service = model_registry.active
+    await model_service.ensure_loaded()
+    await model_service.warmup_async()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    cursor = mongodb.db.images.find(query).batch_size(batch_size)
+    start = time.perf_counter()
+    total_images = total_inserted = total_updated = 0
+    pending: Optional[asyncio.Task] = None
+    documents = []
+
+    async def process(task: asyncio.Task):
+        nonlocal total_images, total_inserted, total_updated
+        items = await task
+        if not items:
+            return
+        inserted, updated = await predict_and_persist(items)
+        total_images += len(items)
+        total_inserted += inserted
+        total_updated += updated
+        logger.info(f"已处理图像 {total_images} 张，新增草稿 {total_inserted}，更新草稿 {total_updated}")
+
+    async for document in cursor:
+        documents.append(document)
+        if len(documents) < batch_size:
+            continue
+        task = asyncio.create_task(download_batch(documents, semaphore))
+        documents = []
+        if pending is not None:
+            await process(pending)
+        pending = task
+    if documents:
+        task = asyncio.create_task(download_batch(documents, semaphore))
+        if pending is not None:
+            await process(pending)
+        pending = task
+    if pending is not None:
+        await process(pending)
+
+    elapsed = time.perf_counter() - start
+    print(f"完成: 图像 {total_images} 张，新增草稿 {total_inserted}，更新草稿 {total_updated}，耗时 {elapsed:.1f}s")
+
+async def run(batch_size: int, concurrency: int, case_ids: List[int]):
+    try:
+        await backfill(batch_size, concurrency, case_ids)
+    finally:
+        await model_registry.close()
+        inference_executor.shutdown()
+        oss_service.close()
+        mongodb.client.close()
+
+def main():
+    """为已有病例影像批量生成 AI 诊断草稿"""
+    parser = argparse.ArgumentParser(description="回填 AI 诊断草稿")
+    parser.add_argument("--batch-size", type=int, default=256, help="每批推理和写库的图像数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发下载数")
+    parser.add_argument("--case-id", type=int, action="append", default=[], help="只处理指定病例，可重复")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.batch_size, args.concurrency, args.case_id))
+
+if __name__ == "__main__":
+    main()
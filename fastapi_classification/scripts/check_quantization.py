@@ -0,0 +1,71 @@
+import argparse
+import io
+import time
+import torch
+from fastapi_classification.core.config import settings
+from fastapi_classification.model.cnn import simplecnn
+from fastapi_classification.services.inference_backends import load_calibration_batches, quantize_model
+
+# 定义类别数，与预测接口的类别标签保持一致
+NUM_CLASSES = len(settings.MODEL_CLASS_LABELS)
+
+def model_size_mb(model: torch.nn.Module) -> float:
+    """序列化后的模型权重大小（MB）"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1024 / 1024
+
+def run_batches(model: torch.nn.Module, batches: list):
+    """返回所有样本的 softmax 概率和总耗时（秒）"""
+    outputs = []
+    start = time.perf_counter()
+    with torch.no_grad():
+        for batch in batches:
+            outputs.append(model(batch).softmax(dim=1))
+    return torch.cat(outputs, dim=0), time.perf_counter() - start
+
+def main():
+    """在样本集上对比 fp32 模型与 int8 量化模型的预测结果"""
+    parser = argparse.ArgumentParser(description="量化模型精度检查")
+    parser.add_argument("sample_dir", help="样本图片目录（JPEG/PNG）")
+    parser.add_argument("--model-path", default=settings.MODEL_PATH)
+    parser.add_argument("--mode", choices=["dynamic", "static"], default="dynamic")
+    parser.add_argument("--calibration-dir", default=settings.MODEL_QUANT_CALIBRATION_DIR,
+                        help="static 模式的校准图片目录，默认使用样本目录")
+    parser.add_argument("--limit", type=int, default=256, help="最多使用的样本数")
+    parser.add_argument("--num-classes", type=int, default=NUM_CLASSES)
+    args = parser.parse_args()
+
+    model = simplecnn(num_class=args.num_classes)
+    model.load_state_dict(torch.load(args.model_path, map_location="cpu"), strict=True)
+    model.eval()
+
+    batches = load_calibration_batches(args.sample_dir, limit=args.limit)
+    if not batches:
+        print(f"样本目录中没有可用图片: {args.sample_dir}")
+        return
+
+    calibration_batches = []
+    if args.mode == "static":
+        calibration_batches = load_calibration_batches(
+            args.calibration_dir or args.sample_dir, limit=settings.MODEL_QUANT_CALIBRATION_LIMIT
+        )
+    quantized = quantize_model(model, args.mode, calibration_batches)
+
+    fp32_probs, fp32_seconds = run_batches(model, batches)
+    int8_probs, int8_seconds = run_batches(quantized, batches)
+
+    total = fp32_probs.shape[0]
+    agreement = (fp32_probs.argmax(dim=1) == int8_probs.argmax(dim=1)).float().mean().item()
+    max_diff = (fp32_probs - int8_probs).abs().max().item()
+    mean_diff = (fp32_probs - int8_probs).abs().mean().item()
+
+    print(f"样本数: {total}")
+    print(f"量化模式: {args.mode}")
+    print(f"Top-1 一致率: {agreement:.4f}")
+    print(f"置信度最大绝对误差: {max_diff:.6f}，平均绝对误差: {mean_diff:.6f}")
+    print(f"模型大小: fp32 {model_size_mb(model):.2f} MB -> int8 {model_size_mb(quantized):.2f} MB")
+    print(f"单张耗时: fp32 {fp32_seconds / total * 1000:.2f} ms -> int8 {int8_seconds / total * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
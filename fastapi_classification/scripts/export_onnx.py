@@ -0,0 +1,25 @@
+import argparse
+from fastapi_classification.core.config import settings
+from fastapi_classification.model.cnn import simplecnn
+from fastapi_classification.services.inference_backends import export_onnx
+import torch
+
+# 定义类别数，与预测接口的类别标签保持一致
+NUM_CLASSES = len(settings.MODEL_CLASS_LABELS)
+
+def main():
+    """把 PyTorch 权重导出为 ONNX 模型"""
+    parser = argparse.ArgumentParser(description="导出 simplecnn 为 ONNX 模型")
+    parser.add_argument("--model-path", default=settings.MODEL_PATH)
+    parser.add_argument("--onnx-path", default=settings.MODEL_ONNX_PATH)
+    parser.add_argument("--num-classes", type=int, default=NUM_CLASSES)
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    model = simplecnn(num_class=args.num_classes)
+    model.load_state_dict(torch.load(args.model_path, map_location="cpu"), strict=True)
+    export_onnx(model, args.onnx_path, opset_version=args.opset)
+    print(f"ONNX 模型已导出: {args.onnx_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import logging
+from fastapi_classification.core.config import settings
+from fastapi_classification.core.redis import redis_manager
+from fastapi_classification.services.inference_executor import inference_executor
+from fastapi_classification.services.model_registry import model_registry
+from fastapi_classification.services.prediction_jobs import PredictionJobWorkerPool, prediction_job_queue
+
+logger = logging.getLogger(__name__)
+
+async def run_worker(workers: int, prefetch: int):
+    """独立的预测任务进程：加载并预热模型后持续从 Redis 队列拉取任务"""
+    await redis_manager.init_redis()
+    pool = PredictionJobWorkerPool(prediction_job_queue, model_registry, workers=workers, prefetch=prefetch)
+    try:
+        # 先同步 API 进程发布的版本，再跟随同步当前版本
+        await model_registry.sync()
+        model_registry.start_sync()
+        model_service = model_registry.active
+        await model_service.ensure_loaded()
+        if settings.MODEL_WARMUP_BATCH_SIZES:
+            await model_service.warmup_async()
+        pool.start()
+        await pool.wait()
+    finally:
+        await pool.close()
+        await model_registry.close()
+        inference_executor.shutdown()
+        await redis_manager.close()
+
+def main():
+    """与 API 进程分开部署、单独扩容推理能力时使用（此时 API 进程应设置 PREDICTION_JOB_RUN_IN_API=false）"""
+    parser = argparse.ArgumentParser(description="预测任务 worker")
+    parser.add_argument("--workers", type=int, default=settings.PREDICTION_JOB_WORKERS, help="并发处理的任务数")
+    parser.add_argument("--prefetch", type=int, default=settings.PREDICTION_JOB_PREFETCH, help="本地预取的任务数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(run_worker(args.workers, args.prefetch))
+    except KeyboardInterrupt:
+        logger.info("预测任务 worker 已停止")
+
+if __name__ == "__main__":
+    main()
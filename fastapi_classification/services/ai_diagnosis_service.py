@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.diagnosis import Diagnosis, DiagnosisPriority, DiagnosisStatus
+from .model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+# AI 生成的诊断草稿使用的诊断类型，医生确认或驳回后不再被自动更新
+AI_DIAGNOSIS_TYPE = "AI辅助诊断"
+
+
+@dataclass
+class ImagePredictionItem:
+    """待预测的病例图像"""
+    case_id: int
+    doctor_id: int
+    data: bytes
+    image_id: Optional[str] = None
+
+
+@dataclass
+class CasePrediction:
+    """病例级别的预测结果：取该病例各图像中置信度最高的一次预测"""
+    case_id: int
+    doctor_id: int
+    label: str
+    confidence: float
+    model_version: str
+    image_id: Optional[str] = None
+
+
+def aggregate_by_case(items: List[ImagePredictionItem], results: list, model_version: str) -> List[CasePrediction]:
+    """把逐张图像的预测结果按病例合并，无法解码的图像（结果为异常）被跳过"""
+    cases: Dict[int, CasePrediction] = {}
+    for item, result in zip(items, results):
+        if isinstance(result, Exception):
+            logger.warning(f"病例 {item.case_id} 的图像 {item.image_id} 预测失败: {str(result)}")
+            continue
+        label, scores = result
+        confidence = max(scores)
+        current = cases.get(item.case_id)
+        if current is None or confidence > current.confidence:
+            cases[item.case_id] = CasePrediction(
+                case_id=item.case_id,
+                doctor_id=item.doctor_id,
+                label=label,
+                confidence=confidence,
+                model_version=model_version,
+                image_id=item.image_id,
+            )
+    return list(cases.values())
+
+
+def _diagnosis_result(prediction: CasePrediction) -> str:
+    return (
+        f"AI 预测: {prediction.label}，置信度 {prediction.confidence:.2%}"
+        f"（模型版本 {prediction.model_version}，图像 {prediction.image_id or '-'}），待医生确认"
+    )
+
+
+def persist_case_predictions(db: Session, predictions: List[CasePrediction]) -> Tuple[int, int]:
+    """把病例预测结果批量写入诊断草稿，返回 (新增数, 更新数)
+
+    每个病例最多保留一条待确认的 AI 诊断草稿：已有草稿且新结果置信度更高时更新，没有草稿时新增。
+    一次查询现有草稿，新增和更新各用一条批量语句，整批只提交一次。
+    """
+    if not predictions:
+        return 0, 0
+    existing = {
+        case_id: (diagnosis_id, confidence_score)
+        for diagnosis_id, case_id, confidence_score in db.query(
+            Diagnosis.id, Diagnosis.case_id, Diagnosis.confidence_score
+        ).filter(
+            Diagnosis.case_id.in_([prediction.case_id for prediction in predictions]),
+            Diagnosis.diagnosis_type == AI_DIAGNOSIS_TYPE,
+            Diagnosis.status == DiagnosisStatus.PENDING,
+        )
+    }
+    now = datetime.now(timezone.utc)
+    inserts, updates = [], []
+    for prediction in predictions:
+        if prediction.case_id not in existing:
+            inserts.append({
+                "case_id": prediction.case_id,
+                "doctor_id": prediction.doctor_id,
+                "diagnosis_type": AI_DIAGNOSIS_TYPE,
+                "diagnosis_result": _diagnosis_result(prediction),
+                "confidence_score": prediction.confidence,
+                "status": DiagnosisStatus.PENDING,
+                "priority": DiagnosisPriority.MEDIUM,
+                "created_at": now,
+                "updated_at": now,
+            })
+            continue
+        diagnosis_id, confidence_score = existing[prediction.case_id]
+        if confidence_score is None or prediction.confidence > confidence_score:
+            updates.append({
+                "id": diagnosis_id,
+                "diagnosis_result": _diagnosis_result(prediction),
+                "confidence_score": prediction.confidence,
+                "updated_at": now,
+            })
+    try:
+        if inserts:
+            db.bulk_insert_mappings(Diagnosis, inserts)
+        if updates:
+            db.bulk_update_mappings(Diagnosis, updates)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(inserts), len(updates)
+
+
+def _persist_in_new_session(predictions: List[CasePrediction]) -> Tuple[int, int]:
+    db = SessionLocal()
+    try:
+        return persist_case_predictions(db, predictions)
+    finally:
+        db.close()
+
+
+async def predict_and_persist(items: List[ImagePredictionItem]) -> Tuple[int, int]:
+    """对一批病例图像做一次批量推理，并把结果批量写入诊断草稿"""
+    model_service = model_registry.active
+    await model_service.ensure_loaded()
+    results = []
+    chunk_size = settings.PREDICT_BATCH_CHUNK_SIZE
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        results += await model_service.executor.run(
+            model_service.predict_many, [item.data for item in chunk], bounded=False
+        )
+    predictions = aggregate_by_case(items, results, model_service.model_version)
+    return await run_in_threadpool(_persist_in_new_session, predictions)
+
+
+class AIDiagnosisPipeline:
+    """上传图像后的自动诊断流水线：累积多个病例的图像，凑满一批或超时后统一推理并批量写库"""
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending: List[ImagePredictionItem] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def submit(self, item: ImagePredictionItem):
+        """加入待处理队列（由上传接口的后台任务调用）"""
+        self._pending.append(item)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        """处理当前累积的全部图像"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            items, self._pending = self._pending, []
+            if not items:
+                return
+            try:
+                inserted, updated = await predict_and_persist(items)
+                logger.info(f"AI 诊断草稿已写入: 图像 {len(items)} 张，新增 {inserted}，更新 {updated}")
+            except Exception as e:
+                logger.error(f"AI 诊断草稿写入失败: {str(e)}")
+
+    async def close(self):
+        """应用关闭前处理剩余图像"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+
+ai_diagnosis_pipeline = AIDiagnosisPipeline(
+    batch_size=settings.AI_DIAGNOSIS_BATCH_SIZE,
+    flush_interval=settings.AI_DIAGNOSIS_FLUSH_INTERVAL,
+)
@@ -1,10 +1,13 @@
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import Awaitable, Callable, List, Optional
+import asyncio
 import json
 import logging
 
 from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from sqlalchemy.orm import Session
 
 from .cache_service import CacheService
@@ -18,7 +21,8 @@ from ..schemas.diagnosis import DiagnosisCreate, DiagnosisUpdate, DiagnosisRespo
 from ..schemas.doctor_note import DoctorNoteCreate, DoctorNoteUpdate, DoctorNoteResponse
 from ..schemas.medical_info import MedicalInfoCreate, MedicalInfoUpdate, MedicalInfoResponse
 from ..schemas.user import UserUpdate
-from ..models.image import Image
+from ..models.mongodb_models import MongoImage
+from ..core.config import settings
 from ..core.security import get_password_hash
 
 # 配置日志记录器
@@ -652,13 +656,19 @@ class DatabaseService:
         return response_notes
 
     # 图片相关方法
-    async def create_image(self, image: Image) -> Image:
+    @staticmethod
+    def _to_image(image_data: dict) -> MongoImage:
+        """MongoDB 文档转换为图片记录，id 取自 _id"""
+        image_data["id"] = str(image_data.pop("_id"))
+        return MongoImage(**image_data)
+
+    async def create_image(self, image: MongoImage) -> MongoImage:
         """创建图片记录"""
-        result = await self.mongodb_db.images.insert_one(image.model_dump())
+        result = await self.mongodb_db.images.insert_one(image.model_dump(exclude={"id"}))
         image.id = str(result.inserted_id)
         return image
 
-    async def get_image(self, image_id: str) -> Optional[Image]:
+    async def get_image(self, image_id: str) -> Optional[MongoImage]:
         """获取图片记录"""
         from bson import ObjectId # 在函数内部导入以避免循环导入
         try:
@@ -670,9 +680,76 @@ class DatabaseService:
 
         image_data = await self.mongodb_db.images.find_one({"_id": object_id})
         if image_data:
-            return Image(**image_data)
+            return self._to_image(image_data)
+        return None
+
+    async def find_image_by_hash(self, content_hash: str) -> Optional[MongoImage]:
+        """按内容哈希查找已有的图片记录（content_hash 上有索引）"""
+        image_data = await self.mongodb_db.images.find_one({"content_hash": content_hash})
+        if image_data:
+            return self._to_image(image_data)
         return None
 
+    async def count_image_references(self, content_hash: str) -> int:
+        """引用同一份文件的图片记录数"""
+        return await self.mongodb_db.images.count_documents({"content_hash": content_hash})
+
+    # 内容相同的图片共用一份文件，blobs 集合按内容哈希记录引用数：
+    # 上传前先加引用，删除记录或上传失败后减引用，引用数归零并认领删除后才删除文件
+    async def _seed_blob(self, content_hash: str):
+        """blobs 中没有记录时按已有的图片记录数补建（引入引用计数前上传的文件）"""
+        refs = await self.count_image_references(content_hash)
+        try:
+            await self.mongodb_db.blobs.update_one(
+                {"_id": content_hash}, {"$setOnInsert": {"refs": refs}}, upsert=True
+            )
+        except DuplicateKeyError:
+            pass
+
+    async def acquire_blob(self, content_hash: str) -> bool:
+        """为文件加一个引用，返回此前是否没有任何引用；为 True 时调用方负责上传文件
+
+        文件正在被删除时撤回引用，等删除完成后重试。
+        """
+        for _ in range(settings.IMAGE_BLOB_DELETE_WAIT_ATTEMPTS):
+            blob = await self.mongodb_db.blobs.find_one_and_update(
+                {"_id": content_hash}, {"$inc": {"refs": 1}}, return_document=ReturnDocument.BEFORE
+            )
+            if blob is None:
+                await self._seed_blob(content_hash)
+                continue
+            if not blob.get("deleting"):
+                return blob["refs"] <= 0
+            await self.mongodb_db.blobs.update_one({"_id": content_hash}, {"$inc": {"refs": -1}})
+            await asyncio.sleep(settings.IMAGE_BLOB_DELETE_WAIT_INTERVAL)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="文件正在删除，请稍后重试")
+
+    async def release_blob(self, content_hash: str, delete_files: Optional[Callable[[], Awaitable]] = None) -> bool:
+        """减一个引用；引用数归零时认领删除，调用 delete_files 删除文件后移除记录，返回是否认领了删除
+
+        认领期间记录标记为 deleting，同一内容的新上传会等待删除完成，不会复用或重新写入将被删除的文件。
+        """
+        blob = await self.mongodb_db.blobs.find_one_and_update(
+            {"_id": content_hash}, {"$inc": {"refs": -1}}, return_document=ReturnDocument.AFTER
+        )
+        if blob is None:
+            await self._seed_blob(content_hash)
+
+        claimed = await self.mongodb_db.blobs.find_one_and_update(
+            {"_id": content_hash, "refs": {"$lte": 0}, "deleting": {"$ne": True}},
+            {"$set": {"deleting": True}},
+        )
+        if claimed is None:
+            return False
+        try:
+            if delete_files is not None:
+                await delete_files()
+        except BaseException:
+            await self.mongodb_db.blobs.update_one({"_id": content_hash}, {"$set": {"deleting": False}})
+            raise
+        await self.mongodb_db.blobs.find_one_and_delete({"_id": content_hash, "deleting": True})
+        return True
+
     async def delete_image(self, image_id: str) -> bool:
         """删除图片记录"""
         from bson import ObjectId # 在函数内部导入以避免循环导入
@@ -684,23 +761,23 @@ class DatabaseService:
         result = await self.mongodb_db.images.delete_one({"_id": object_id})
         return result.deleted_count > 0
 
-    async def get_user_images(self, user_id: int) -> List[Image]:
+    async def get_user_images(self, user_id: int) -> List[MongoImage]:
         """获取用户的所有图片记录"""
         cursor = self.mongodb_db.images.find({"user_id": user_id})
         images_data = await cursor.to_list(length=None)
-        return [Image(**image_data) for image_data in images_data]
+        return [self._to_image(image_data) for image_data in images_data]
 
-    async def get_case_images(self, case_id: int) -> List[Image]:
+    async def get_case_images(self, case_id: int) -> List[MongoImage]:
         """获取病例相关的所有图片记录"""
         cursor = self.mongodb_db.images.find({"case_id": case_id})
         images_data = await cursor.to_list(length=None)
-        return [Image(**image_data) for image_data in images_data]
+        return [self._to_image(image_data) for image_data in images_data]
 
-    async def get_diagnosis_images(self, diagnosis_id: int) -> List[Image]:
+    async def get_diagnosis_images(self, diagnosis_id: int) -> List[MongoImage]:
         """获取诊断相关的所有图片记录"""
         cursor = self.mongodb_db.images.find({"diagnosis_id": diagnosis_id})
         images_data = await cursor.to_list(length=None)
-        return [Image(**image_data) for image_data in images_data]
+        return [self._to_image(image_data) for image_data in images_data]
 
     # 用户相关方法
     async def get_user(self, user_id: int) -> Optional[User]:
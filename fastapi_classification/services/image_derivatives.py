@@ -0,0 +1,73 @@
+import io
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence
+
+from PIL import Image
+
+from ..core.metrics import stage_timer
+from .preprocessing import BufferReader, default_preprocessor
+
+logger = logging.getLogger(__name__)
+
+# 模型输入尺寸的衍生图名称，分类时优先读取它而不是原图
+MODEL_DERIVATIVE = "model"
+
+DERIVATIVE_SECONDS = stage_timer("derivatives")
+
+
+@dataclass
+class EncodedDerivative:
+    """编码后的衍生图"""
+    data: bytes
+    width: int
+    height: int
+    mime_type: str
+    extension: str
+
+
+@dataclass
+class DerivativeSet:
+    """原图的尺寸、格式和由它生成的衍生图"""
+    width: int
+    height: int
+    format: Optional[str]
+    derivatives: Dict[str, EncodedDerivative] = field(default_factory=dict)
+
+
+def _encode(image: Image.Image, fmt: str, **options) -> EncodedDerivative:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    extension, mime_type = {"JPEG": (".jpg", "image/jpeg"), "PNG": (".png", "image/png")}[fmt]
+    return EncodedDerivative(buffer.getvalue(), image.width, image.height, mime_type, extension)
+
+
+def generate_derivatives(data, thumbnail_sizes: Sequence[int], thumbnail_quality: int = 85) -> DerivativeSet:
+    """生成缩略图和模型输入尺寸的衍生图（CPU 密集，需在线程池中调用）
+
+    缩略图：JPEG 按最大缩略图边长用 draft 降采样解码，全分辨率 X 光片不必完整解码；保持宽高比、编码为 JPEG。
+    模型衍生图：直接调用 ImagePreprocessor.decode，解码和缩放方式（draft 目标尺寸、PIL/OpenCV）与预测时完全相同，
+    以 PNG 无损保存，分类时解码后无需再缩放，像素与直接预处理原图一致。
+    """
+    with DERIVATIVE_SECONDS.time():
+        image = Image.open(BufferReader(data))
+        width, height, fmt = image.width, image.height, image.format
+        result = DerivativeSet(width=width, height=height, format=fmt)
+        if thumbnail_sizes:
+            if image.format == "JPEG":
+                target = max(thumbnail_sizes)
+                image.draft("RGB", (target, target))
+            rgb = image.convert("RGB")
+            for size in thumbnail_sizes:
+                thumbnail = rgb.copy()
+                thumbnail.thumbnail((size, size), Image.BILINEAR)
+                result.derivatives[f"thumbnail_{size}"] = _encode(thumbnail, "JPEG", quality=thumbnail_quality)
+        model_input = Image.fromarray(default_preprocessor.decode(data))
+        result.derivatives[MODEL_DERIVATIVE] = _encode(model_input, "PNG")
+        return result
+
+
+def derivative_key(object_key: str, name: str, extension: str) -> str:
+    """衍生图与原图存放在同一目录：<原图路径去掉扩展名>.<名称><扩展名>"""
+    return f"{os.path.splitext(object_key)[0]}.{name}{extension}"
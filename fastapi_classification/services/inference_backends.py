@@ -0,0 +1,203 @@
+import copy
+import logging
+import os
+from typing import TYPE_CHECKING, Iterable, List
+
+import numpy as np
+
+from .preprocessing import IMAGE_EXTENSIONS
+
+# torch 只在 PyTorch 后端、量化和导出的函数内部导入，ONNX 后端的进程不加载 torch
+if TYPE_CHECKING:
+    import torch
+
+logger = logging.getLogger(__name__)
+
+# ONNX Runtime 图优化级别
+ONNX_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+# PyTorch 执行配置
+EXECUTION_PROFILES = ("eager", "optimized", "torchscript", "compile")
+
+
+class TorchBackend:
+    """PyTorch 推理后端"""
+    name = "torch"
+
+    def __init__(
+        self,
+        model: "torch.nn.Module",
+        device: "torch.device",
+        profile: str = "eager",
+        channels_last: bool = False,
+        inference_mode: bool = False,
+    ):
+        self.model = model
+        self.device = device
+        self.profile = profile
+        self.channels_last = channels_last
+        self.inference_mode = inference_mode
+
+    def __call__(self, input_batch) -> np.ndarray:
+        """输入 NxCxHxW 数组或张量，返回 logits 数组"""
+        import torch
+
+        if isinstance(input_batch, np.ndarray):
+            input_batch = torch.from_numpy(input_batch)
+        # inference_mode 比 no_grad 更进一步，连版本计数和视图追踪也关闭
+        with torch.inference_mode() if self.inference_mode else torch.no_grad():
+            input_batch = input_batch.to(self.device)
+            if self.channels_last:
+                input_batch = input_batch.contiguous(memory_format=torch.channels_last)
+            return self.model(input_batch).cpu().numpy()
+
+
+def build_torch_backend(
+    model: "torch.nn.Module",
+    device: "torch.device",
+    profile: str = "eager",
+    image_size: int = 224,
+) -> TorchBackend:
+    """按执行配置包装模型
+
+    eager: 与原实现一致，no_grad 下逐算子执行
+    optimized: inference_mode + channels_last，仍逐算子执行
+    torchscript: 在 optimized 基础上用 TorchScript 追踪、冻结并做推理优化（optimize_for_inference 融合 Conv+ReLU）
+    compile: 在 optimized 基础上使用 torch.compile（首次调用时编译，由预热触发，逐元素算子由 Inductor 融合）
+    """
+    import torch
+
+    if profile not in EXECUTION_PROFILES:
+        raise ValueError(f"不支持的执行配置: {profile}")
+    if profile == "eager":
+        logger.info("PyTorch 执行配置: eager (no_grad)")
+        return TorchBackend(model, device)
+
+    model = model.eval().to(device=device, memory_format=torch.channels_last)
+    if profile == "torchscript":
+        example = torch.zeros(1, 3, image_size, image_size, device=device).contiguous(memory_format=torch.channels_last)
+        with torch.no_grad():
+            model = torch.jit.optimize_for_inference(torch.jit.freeze(torch.jit.trace(model, example)))
+    elif profile == "compile":
+        # 动态批处理的批大小不固定，使用动态形状避免按批大小反复重新编译
+        model = torch.compile(model, dynamic=True)
+    graph = {"torchscript": "torchscript", "compile": "torch.compile"}.get(profile, "none")
+    logger.info(
+        f"PyTorch 执行配置: {profile} (inference_mode=True, channels_last=True, graph={graph})"
+    )
+    return TorchBackend(model, device, profile=profile, channels_last=True, inference_mode=True)
+
+
+class OnnxRuntimeBackend:
+    """ONNX Runtime 推理后端，只依赖导出的 .onnx 文件，不需要常驻 torch 模型"""
+    name = "onnx"
+
+    def __init__(
+        self,
+        onnx_path: str,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        graph_optimization: str = "all",
+    ):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads  # 0 表示由 onnxruntime 自行决定
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = getattr(
+            ort.GraphOptimizationLevel,
+            ONNX_GRAPH_OPTIMIZATION_LEVELS.get(graph_optimization, "ORT_ENABLE_ALL"),
+        )
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        logger.info(
+            f"ONNX Runtime 后端已加载: {onnx_path}, intra_op_threads={intra_op_threads}, "
+            f"inter_op_threads={inter_op_threads}, graph_optimization={graph_optimization}"
+        )
+
+    def __call__(self, input_batch: np.ndarray) -> np.ndarray:
+        """输入 NxCxHxW 数组，返回 logits 数组"""
+        inputs = np.ascontiguousarray(input_batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: inputs})[0]
+
+
+def load_calibration_batches(directory: str, limit: int = 64, batch_size: int = 16) -> List["torch.Tensor"]:
+    """读取目录下的样本图片并预处理为若干批张量，用于量化校准和精度对比"""
+    import torch
+    from .image_utils import preprocess_image
+
+    if not directory or not os.path.isdir(directory):
+        return []
+    paths = sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+    tensors = [preprocess_image(path) for path in paths]
+    return [torch.cat(tensors[i:i + batch_size], dim=0) for i in range(0, len(tensors), batch_size)]
+
+
+def quantize_model(
+    model: "torch.nn.Module",
+    mode: str,
+    calibration_batches: Iterable["torch.Tensor"] = (),
+) -> "torch.nn.Module":
+    """对模型做 int8 量化，量化后的模型只能在 CPU 上运行
+
+    dynamic: 动态量化全连接层，classifier 中 32*56*56x128 的权重占模型绝大部分体积
+    static: 基于 FX 的静态量化，卷积与全连接层都量化，需要校准数据
+    """
+    import torch
+
+    model = copy.deepcopy(model).cpu().eval()
+    if mode == "static":
+        calibration_batches = list(calibration_batches)
+        if calibration_batches:
+            from torch.ao.quantization import get_default_qconfig_mapping
+            from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+            example_inputs = (calibration_batches[0][:1],)
+            prepared = prepare_fx(model, get_default_qconfig_mapping("x86"), example_inputs)
+            with torch.no_grad():
+                for batch in calibration_batches:
+                    prepared(batch)
+            logger.info(f"静态量化完成，校准批次数: {len(calibration_batches)}")
+            return convert_fx(prepared)
+        logger.warning("未提供校准数据，静态量化回退为动态量化")
+        mode = "dynamic"
+    if mode == "dynamic":
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info("动态量化完成: 全连接层已转换为 int8")
+        return quantized
+    raise ValueError(f"不支持的量化模式: {mode}")
+
+
+def export_onnx(model: "torch.nn.Module", onnx_path: str, image_size: int = 224, opset_version: int = 17) -> str:
+    """把 simplecnn 导出为带动态 batch 维度的 ONNX 模型"""
+    import torch
+
+    model = model.cpu().eval()
+    dummy_input = torch.zeros(1, 3, image_size, image_size)
+    directory = os.path.dirname(onnx_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    torch.onnx.export(
+        model,
+        dummy_input,
+        onnx_path,
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset_version,
+    )
+    logger.info(f"模型已导出为 ONNX: {onnx_path}")
+    return onnx_path
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+from fastapi import HTTPException, status
+from ..core.config import settings
+from ..core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceExecutor:
+    """专用推理线程池：图像解码、预处理和前向传播都在这里执行，不占用事件循环"""
+
+    def __init__(self, max_workers: int, torch_threads: int, max_queue_size: int):
+        self.max_workers = max(1, max_workers)
+        self.torch_threads = torch_threads
+        self.max_queue_size = max(1, max_queue_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0  # 已提交但尚未完成的任务数
+        self._torch_configured = False
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def configure_torch(self):
+        """设置 torch 的计算线程数，避免推理线程和 torch 内部线程互相抢占 CPU
+
+        set_num_threads 是进程级设置，对所有线程生效，因此在首次导入 torch 时调用一次即可，
+        所有推理线程共用这一个 torch 线程池，而不是每个线程各自固定。
+        """
+        if self.torch_threads > 0 and not self._torch_configured:
+            import torch
+            torch.set_num_threads(self.torch_threads)
+            self._torch_configured = True
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference",
+            )
+            logger.info(
+                f"推理线程池已启动: workers={self.max_workers}, "
+                f"torch_threads={self.torch_threads}, max_queue_size={self.max_queue_size}"
+            )
+        return self._executor
+
+    async def run(self, fn, *args, bounded: bool = True):
+        """在推理线程池中执行 fn；队列已满时返回 503"""
+        if bounded and self._pending >= self.max_queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="推理服务繁忙，请稍后重试"
+            )
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), partial(fn, *args))
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+inference_executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_WORKERS,
+    torch_threads=settings.INFERENCE_TORCH_THREADS,
+    max_queue_size=settings.INFERENCE_MAX_QUEUE_SIZE,
+)
+metrics.callback("inference_executor_pending", "推理线程池中已提交未完成的任务数", lambda: inference_executor.pending)
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Set
+
+from fastapi import HTTPException, status
+from ..core.config import settings
+from ..core.redis import redis_manager
+from .model_service import ModelService, model_service
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """模型注册表：同时持有多个模型版本，支持后台加载、原子切换和按版本调用
+
+    切换只是替换当前版本号的引用，正在处理中的请求仍持有原 ModelService，不会被中断。
+
+    模型实例只存在于各自的进程中。多个 uvicorn worker 或独立的预测任务 worker 之间，
+    通过管理接口加载的版本（版本号 -> MODEL_DIR 下的权重文件名）和当前版本号发布到 Redis：
+    其他进程每 MODEL_REGISTRY_SYNC_INTERVAL 秒同步一次，在后台加载新版本并跟随切换；
+    请求或任务指定了本进程尚未加载的版本时，先按需加载再处理。限制：
+    - 各进程需要在自己的 MODEL_DIR 下读到同名权重文件（共享存储或随部署分发）；
+    - 切换最多延迟一个同步周期在其他进程生效，期间不同进程可能使用不同版本，结果中的 model_version 为实际使用的版本；
+    - Redis 不可用时注册表只在本进程内有效。
+    """
+
+    def __init__(self, prefix: str = "model_registry"):
+        self._models: Dict[str, ModelService] = {}
+        self._active_version: Optional[str] = None
+        self._loading: Dict[str, asyncio.Task] = {}  # 正在后台加载的版本
+        self._errors: Dict[str, str] = {}  # 加载失败的版本及原因
+        self._published: Set[str] = set()  # 已发布到 Redis 的版本（本进程发布或同步加载），从 Redis 撤销后本进程也卸载
+        self._versions_key = f"{prefix}:versions"
+        self._active_key = f"{prefix}:active"
+        self._sync_task: Optional[asyncio.Task] = None
+
+    @property
+    def active_version(self) -> Optional[str]:
+        return self._active_version
+
+    @property
+    def active(self) -> ModelService:
+        """当前对外服务的模型"""
+        return self._models[self._active_version]
+
+    def register(self, version: str, service: ModelService, activate: bool = False):
+        """注册一个模型版本"""
+        service.model_version = version
+        self._models[version] = service
+        self._errors.pop(version, None)
+        if activate or self._active_version is None:
+            self._active_version = version
+
+    def get(self, version: Optional[str] = None) -> ModelService:
+        """获取指定版本的模型，未指定时返回当前版本"""
+        if version is None:
+            return self.active
+        service = self._models.get(version)
+        if service is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"模型版本 {version} 不存在")
+        return service
+
+    async def get_or_load(self, version: Optional[str] = None) -> ModelService:
+        """同 get；指定的版本已由其他进程发布、本进程尚未加载时，先在本进程加载完成"""
+        if version is None or version in self._models:
+            return self.get(version)
+        if version not in self._loading:
+            model_file = await self._shared_model_file(version)
+            if model_file is None:
+                return self.get(version)
+            self._start_load(version, resolve_model_path(model_file), activate=False, publish=False)
+        # 调用方取消时不中断加载，其他请求仍可使用
+        await asyncio.shield(self._loading[version])
+        if version in self._errors:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"模型版本 {version} 加载失败: {self._errors[version]}"
+            )
+        return self.get(version)
+
+    async def exists(self, version: str) -> bool:
+        """版本是否已在本进程注册、正在加载或已由其他进程发布"""
+        return version in self._models or version in self._loading or await self._shared_model_file(version) is not None
+
+    def _switch(self, version: str):
+        """在本进程内切换当前版本，只允许切换到已加载完成的版本"""
+        service = self.get(version)
+        if not service.is_ready:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"模型版本 {version} 尚未加载完成")
+        previous = self._active_version
+        self._active_version = version
+        logger.info(f"模型版本已切换: {previous} -> {version}")
+
+    async def activate(self, version: str):
+        """把指定版本切换为当前版本，并发布到 Redis，其他进程在下次同步时跟随切换"""
+        self._switch(version)
+        if redis_manager.redis is not None:
+            await redis_manager.redis.set(self._active_key, version)
+
+    async def _shared_model_file(self, version: str) -> Optional[str]:
+        if redis_manager.redis is None:
+            return None
+        return await redis_manager.redis.hget(self._versions_key, version)
+
+    async def _publish(self, version: str, model_path: str, activate: bool):
+        """发布版本号和相对 MODEL_DIR 的权重文件名"""
+        if redis_manager.redis is None:
+            return
+        model_file = os.path.relpath(model_path, os.path.realpath(settings.MODEL_DIR))
+        async with redis_manager.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._versions_key, version, model_file)
+            if activate:
+                pipe.set(self._active_key, version)
+            await pipe.execute()
+
+    async def _load(self, version: str, model_path: str, activate: bool, publish: bool):
+        try:
+            service = ModelService(
+                model_path=model_path,
+                class_labels=settings.MODEL_CLASS_LABELS,
+                onnx_path=os.path.splitext(model_path)[0] + ".onnx",
+                version=version,
+            )
+            await service.ensure_loaded()
+            if settings.MODEL_WARMUP_BATCH_SIZES:
+                await service.warmup_async()
+            # 加载并预热完成后才注册，保证切换后的第一个请求就是热的
+            self.register(version, service)
+            if activate:
+                self._switch(version)
+            if publish:
+                await self._publish(version, model_path, activate)
+            if redis_manager.redis is not None:
+                self._published.add(version)
+            logger.info(f"模型版本 {version} 加载完成: {model_path}")
+        except Exception as e:
+            self._errors[version] = str(e)
+            logger.error(f"模型版本 {version} 加载失败: {str(e)}")
+        finally:
+            self._loading.pop(version, None)
+
+    def _start_load(self, version: str, model_path: str, activate: bool, publish: bool):
+        self._errors.pop(version, None)
+        self._loading[version] = asyncio.create_task(self._load(version, model_path, activate, publish))
+
+    def load_in_background(self, version: str, model_path: str, activate: bool = False):
+        """在后台加载新的权重文件，加载完成后发布到 Redis"""
+        if version in self._models or version in self._loading:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"模型版本 {version} 已存在")
+        self._start_load(version, model_path, activate, publish=True)
+
+    async def _drop(self, version: str):
+        service = self._models.pop(version)
+        self._published.discard(version)
+        await service.batch_queue.drain()
+        await service.close()
+
+    async def unload(self, version: str):
+        """卸载非当前版本，先等待其队列中的请求处理完成；同时从 Redis 撤销，其他进程在下次同步时卸载"""
+        if version == self._active_version:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="不能卸载当前正在使用的模型版本")
+        self.get(version)
+        if redis_manager.redis is not None:
+            await redis_manager.redis.hdel(self._versions_key, version)
+        await self._drop(version)
+
+    async def sync(self):
+        """从 Redis 同步其他进程发布的版本和当前版本"""
+        if redis_manager.redis is None:
+            return
+        versions = await redis_manager.redis.hgetall(self._versions_key)
+        active = await redis_manager.redis.get(self._active_key)
+        for version, model_file in versions.items():
+            # 加载失败的版本不自动重试，避免每个同步周期重复加载
+            if version in self._models or version in self._loading or version in self._errors:
+                continue
+            try:
+                model_path = resolve_model_path(model_file)
+            except HTTPException as e:
+                self._errors[version] = str(e.detail)
+                continue
+            self._start_load(version, model_path, activate=version == active, publish=False)
+        service = self._models.get(active) if active else None
+        if service is not None and service.is_ready and active != self._active_version:
+            self._switch(active)
+        # 先跟随切换再卸载，已被撤销的旧当前版本也能卸载
+        for version in [version for version in self._published if version not in versions and version != self._active_version]:
+            await self._drop(version)
+
+    async def _run_sync(self, interval: float):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"同步模型注册表失败: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def start_sync(self, interval: float = settings.MODEL_REGISTRY_SYNC_INTERVAL):
+        """启动后台同步任务，interval <= 0 时不同步"""
+        if interval > 0 and self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._run_sync(interval))
+
+    def describe(self) -> List[dict]:
+        """列出所有版本及其状态"""
+        versions = [
+            {
+                **service.status(),
+                "model_version": version,
+                "active": version == self._active_version,
+                "state": "ready" if service.is_ready else "registered",
+            }
+            for version, service in self._models.items()
+        ]
+        versions += [{"model_version": version, "active": False, "state": "loading"} for version in self._loading]
+        versions += [
+            {"model_version": version, "active": False, "state": "failed", "error": error}
+            for version, error in self._errors.items()
+        ]
+        return versions
+
+    async def close(self):
+        """关闭所有模型的后台任务"""
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        for task in list(self._loading.values()):
+            task.cancel()
+        for service in self._models.values():
+            await service.close()
+
+
+def resolve_model_path(model_file: str) -> str:
+    """把请求中的权重文件名解析为模型目录下的路径，禁止访问目录之外的文件"""
+    model_dir = os.path.realpath(settings.MODEL_DIR)
+    path = os.path.realpath(os.path.join(model_dir, model_file))
+    if os.path.commonpath([model_dir, path]) != model_dir or not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="模型文件不存在")
+    return path
+
+
+model_registry = ModelRegistry()
+model_registry.register(settings.MODEL_VERSION, model_service, activate=True)
@@ -1,27 +1,402 @@
-import torch
-from fastapi_classification.services.image_utils import preprocess_image
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException, status
+from fastapi_classification.core.config import settings
+from fastapi_classification.core.metrics import SIZE_BUCKETS, metrics, stage_timer
+from fastapi_classification.services.preprocessing import ImagePreprocessor, default_preprocessor
+from fastapi_classification.services.inference_executor import InferenceExecutor, inference_executor
+from fastapi_classification.services.upload_reader import upload_stats
+
+# 注意：torch / torchvision 及推理后端只在首次加载模型时导入，
+# 避免应用启动、测试和 Alembic 命令为导入 torch 付出数秒时间和数百 MB 内存
+
+logger = logging.getLogger(__name__)
+
+FORWARD_SECONDS = stage_timer("forward")
+SOFTMAX_SECONDS = stage_timer("softmax")
+BATCH_SIZE = metrics.histogram("inference_batch_size", "每次前向传播的批大小", buckets=SIZE_BUCKETS)
+QUEUE_DEPTH = metrics.histogram("inference_queue_depth", "动态批处理凑批时队列中等待的请求数", buckets=SIZE_BUCKETS)
+QUEUE_WAIT_SECONDS = stage_timer("queue_wait")
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    """按行计算 softmax，先减去每行最大值避免溢出"""
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class BatchInferenceQueue:
+    """动态批处理队列：把并发的单张推理请求合并为一次前向传播"""
+
+    def __init__(
+        self,
+        infer_fn,
+        executor: InferenceExecutor,
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_queue_size: int = 0,
+    ):
+        self.infer_fn = infer_fn  # 接收批量数组，返回逐样本结果列表
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_queue_size = max_queue_size  # 0 表示不限制
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self):
+        """在当前事件循环中惰性启动后台凑批任务"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, input_tensor: np.ndarray):
+        """提交单张预处理后的图像（1xCxHxW），等待其推理结果"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((input_tensor, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="推理服务繁忙，请稍后重试"
+            )
+        return await future
+
+    async def _collect_batch(self) -> list:
+        """收集一个批次：达到最大批大小或等待超时即返回"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        QUEUE_DEPTH.observe(self._queue.qsize() + 1)
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # 优先取走已在队列中的请求，避免无谓等待
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            try:
+                await self._process_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process_batch(self, batch: list):
+        """执行一个批次的推理并把结果分发给各调用方"""
+        # 调用方可能已取消，跳过这些请求
+        batch = [(tensor, future, enqueued_at) for tensor, future, enqueued_at in batch if not future.done()]
+        if not batch:
+            return
+        # 排队时间从入队算到所在批次出队，不含前向传播
+        dequeued_at = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            QUEUE_WAIT_SECONDS.observe(dequeued_at - enqueued_at)
+        batch = [(tensor, future) for tensor, future, _ in batch]
+        try:
+            input_batch = np.concatenate([tensor for tensor, _ in batch], axis=0)
+            # 前向传播放到推理线程池中执行，不阻塞事件循环；准入已由队列上限控制
+            results = await self.executor.run(self.infer_fn, input_batch, bounded=False)
+        except Exception as e:
+            logger.error(f"批量推理失败: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def drain(self, timeout: float = 30.0):
+        """等待已入队的请求全部处理完成（用于模型下线前）"""
+        if self._queue is not None and self._worker is not None and not self._worker.done():
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("等待推理队列清空超时")
+
+    async def close(self):
+        """停止后台凑批任务"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
 
 
 class ModelService:
-    def __init__(self, model_path: str, class_labels: list):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    def __init__(
+        self,
+        model_path: str,
+        class_labels: list,
+        max_batch_size: int = settings.MODEL_BATCH_MAX_SIZE,
+        max_wait_ms: float = settings.MODEL_BATCH_MAX_WAIT_MS,
+        executor: Optional[InferenceExecutor] = None,
+        backend: str = settings.MODEL_BACKEND,
+        onnx_path: str = settings.MODEL_ONNX_PATH,
+        quantization: str = settings.MODEL_QUANTIZATION,
+        execution_profile: str = settings.MODEL_EXECUTION_PROFILE,
+        mmap_weights: bool = settings.MODEL_MMAP_WEIGHTS,
+        preprocessor: Optional[ImagePreprocessor] = None,
+        version: Optional[str] = None,
+    ):
+        self.model_path = model_path
+        self.onnx_path = onnx_path
+        self.backend_name = backend
         self.class_labels = class_labels
-        self.model = self._load_model(model_path)  # 加载模型
+        self.quantization = quantization
+        self.execution_profile = execution_profile
+        self.mmap_weights = mmap_weights
+        self.preprocessor = preprocessor or default_preprocessor
+        # 模型在首次使用或启动后的后台任务中加载
+        self.device = None
+        self.model_version = version  # 对外展示的版本号，未指定时使用权重摘要
+        self.weights_digest: Optional[str] = None  # 权重文件内容摘要，用作预测缓存的键
+        self.backend = None
+        self._load_lock = threading.Lock()
+        self.is_warmed = False
+        self.last_warmup_latency_ms: Dict[int, float] = {}  # 最近一次预热各批大小的耗时
+        self.executor = executor or inference_executor
+        self.batch_queue = BatchInferenceQueue(
+            self.predict_batch,
+            self.executor,
+            max_batch_size,
+            max_wait_ms,
+            max_queue_size=self.executor.max_queue_size,
+        )
+
+    @property
+    def is_ready(self) -> bool:
+        """模型是否已加载完成"""
+        return self.backend is not None
 
+    def load(self):
+        """加载模型（线程安全，重复调用只加载一次）"""
+        if self.backend is not None:
+            return
+        with self._load_lock:
+            if self.backend is not None:
+                return
+            self.weights_digest = self._compute_weights_digest(self.model_path, self.onnx_path, self.backend_name)
+            self.model_version = self.model_version or self.weights_digest
+            self.backend = self._load_backend(self.backend_name, self.model_path, self.onnx_path)  # 加载模型
+            logger.info(f"模型已加载: version={self.model_version}, backend={self.backend.name}, device={self.device}")
+
+    async def ensure_loaded(self):
+        """确保模型已加载，加载过程在推理线程池中执行"""
+        if self.backend is None:
+            await self.executor.run(self.load, bounded=False)
+
+    def warmup(self, batch_sizes: Sequence[int] = settings.MODEL_WARMUP_BATCH_SIZES):
+        """用合成输入跑几次不同批大小的前向传播，完成内存分配器预热、算子选择和权重页加载"""
+        self.load()
+        latencies = {}
+        for batch_size in batch_sizes:
+            dummy_input = np.zeros((batch_size, 3, self.preprocessor.size, self.preprocessor.size), dtype=np.float32)
+            start = time.perf_counter()
+            self.predict_batch(dummy_input)
+            latencies[batch_size] = (time.perf_counter() - start) * 1000
+        self.last_warmup_latency_ms = latencies
+        self.is_warmed = True
+        logger.info(f"模型预热完成，各批大小耗时(ms): {latencies}")
+
+    async def warmup_async(self, batch_sizes: Sequence[int] = settings.MODEL_WARMUP_BATCH_SIZES):
+        """在推理线程池中执行预热"""
+        await self.executor.run(self.warmup, batch_sizes, bounded=False)
+
+    def status(self) -> dict:
+        """模型加载与预热状态，供就绪检查使用"""
+        torch_threads = None
+        if self.is_ready and self.backend.name == "torch":
+            import torch
+            torch_threads = torch.get_num_threads()
+        return {
+            "loaded": self.is_ready,
+            "warmed": self.is_warmed,
+            "model_version": self.model_version,
+            "weights_digest": self.weights_digest,
+            "backend": self.backend.name if self.is_ready else self.backend_name,
+            "mmap_weights": self.mmap_weights,
+            "execution_profile": getattr(self.backend, "profile", None) if self.is_ready else self.execution_profile,
+            "device": str(self.device) if self.device is not None else None,
+            "torch_threads": torch_threads,
+            "inference_workers": self.executor.max_workers,
+            "last_warmup_latency_ms": self.last_warmup_latency_ms,
+        }
+
+    def _init_torch(self):
+        """导入 torch 并选择推理设备；ONNX 后端正常加载时不调用，进程内不会导入 torch"""
+        if self.device is not None:
+            return
+        import torch
+        self.executor.configure_torch()
+        # 量化模型只支持 CPU 推理
+        use_cuda = torch.cuda.is_available() and self.quantization == "none"
+        self.device = torch.device("cuda" if use_cuda else "cpu")
 
     def _load_model(self, model_path: str):
         """加载用于推理的深度学习模型"""
+        import torch
         from ..model.cnn import simplecnn  # 确保可以导入您的模型定义
+        self._init_torch()
+        if self.mmap_weights and self.device.type == "cpu":
+            # 权重张量直接映射权重文件的页面，不复制到进程私有内存：
+            # 同一台机器上的多个 worker 通过页缓存共享同一份物理内存。
+            # 模型先在 meta 设备上构建（不分配参数内存），再用 assign=True 直接接管映射的张量
+            state_dict = torch.load(model_path, map_location="cpu", weights_only=True, mmap=True)
+            with torch.device("meta"):
+                model = simplecnn(num_class=len(self.class_labels))
+            model.load_state_dict(state_dict, strict=True, assign=True)
+            return model.eval()
         model = simplecnn(num_class=len(self.class_labels))
-        model.load_state_dict(torch.load(model_path, map_location=self.device), strict=True)
+        model.load_state_dict(torch.load(model_path, map_location=self.device, weights_only=True), strict=True)
         model.to(self.device).eval()  # 设置为评估模式
         return model
 
+    def _compute_weights_digest(self, model_path: str, onnx_path: str, backend: str) -> str:
+        """根据权重文件内容生成摘要，量化模式的输出不同，单独区分"""
+        path = model_path if os.path.exists(model_path) or backend != "onnx" else onnx_path
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        version = digest.hexdigest()[:12]
+        if self.quantization != "none":
+            version = f"{version}-int8-{self.quantization}"
+        return version
+
+    def _load_backend(self, backend: str, model_path: str, onnx_path: str):
+        """按配置加载推理后端，ONNX Runtime 不可用时回退到 PyTorch"""
+        from .inference_backends import (
+            OnnxRuntimeBackend,
+            TorchBackend,
+            build_torch_backend,
+            export_onnx,
+            load_calibration_batches,
+            quantize_model,
+        )
+        if backend == "onnx":
+            try:
+                if not os.path.exists(onnx_path):
+                    logger.info(f"未找到 ONNX 模型，从 {model_path} 导出")
+                    export_onnx(self._load_model(model_path), onnx_path)
+                return OnnxRuntimeBackend(
+                    onnx_path,
+                    intra_op_threads=settings.ONNX_INTRA_OP_THREADS,
+                    inter_op_threads=settings.ONNX_INTER_OP_THREADS,
+                    graph_optimization=settings.ONNX_GRAPH_OPTIMIZATION,
+                )
+            except Exception as e:
+                logger.warning(f"加载 ONNX Runtime 后端失败，回退到 PyTorch: {str(e)}")
+        model = self._load_model(model_path)
+        if self.quantization != "none":
+            calibration_batches = []
+            if self.quantization == "static":
+                calibration_batches = load_calibration_batches(
+                    settings.MODEL_QUANT_CALIBRATION_DIR, limit=settings.MODEL_QUANT_CALIBRATION_LIMIT
+                )
+            model = quantize_model(model, self.quantization, calibration_batches)
+            if self.execution_profile != "eager":
+                logger.warning(f"量化模型只支持 eager 执行配置，忽略 {self.execution_profile}")
+            return TorchBackend(model, self.device)
+        return build_torch_backend(model, self.device, self.execution_profile, image_size=self.preprocessor.size)
+
+    def predict_batch(self, input_batch) -> List[Tuple[str, List[float]]]:
+        """对一批预处理后的图像（NxCxHxW 数组）进行分类，返回每张图像的标签和置信度"""
+        self.load()
+        BATCH_SIZE.observe(input_batch.shape[0])
+        with FORWARD_SECONDS.time():
+            output = self.backend(input_batch)  # 得到推理结果（logits 数组）
+        with SOFTMAX_SECONDS.time():
+            probabilities = softmax(output)  # 每个类别的置信度
+            predicted_indices = probabilities.argmax(axis=1).tolist()  # 预测类别索引
+            probabilities = probabilities.tolist()
+        return [
+            (self.class_labels[index], scores)
+            for index, scores in zip(predicted_indices, probabilities)
+        ]
+
+    def predict_many(self, images: list) -> list:
+        """批量分类：逐张解码到预分配缓冲区后合并为一次前向传播，无法解码的图像在对应位置返回异常"""
+        results: list = [None] * len(images)
+        decoded, normalized = self.preprocessor.batch_buffers(len(images))
+        indices = []
+        for index, image in enumerate(images):
+            try:
+                decoded[len(indices)] = self.preprocessor.decode(image)
+                indices.append(index)
+            except Exception as e:
+                results[index] = e
+        if indices:
+            count = len(indices)
+            input_batch = self.preprocessor.normalize(decoded[:count], normalized[:count])
+            for index, result in zip(indices, self.predict_batch(input_batch)):
+                results[index] = result
+        return results
+
+    def predict_tta(self, image, views: int) -> Tuple[str, List[float], List[float]]:
+        """测试时增强：把一张图像的多个翻转/裁剪视图合并为一次前向传播，返回平均置信度及其方差"""
+        start = time.perf_counter()
+        input_batch = self.preprocessor.normalize(self.preprocessor.augment(self.preprocessor.decode(image), views))
+        upload_stats.record_decode(time.perf_counter() - start)
+        self.load()
+        BATCH_SIZE.observe(input_batch.shape[0])
+        with FORWARD_SECONDS.time():
+            output = self.backend(input_batch)
+        with SOFTMAX_SECONDS.time():
+            probabilities = softmax(output)
+            mean = probabilities.mean(axis=0)
+            variance = probabilities.var(axis=0)
+            return self.class_labels[int(mean.argmax())], mean.tolist(), variance.tolist()
+
     def predict(self, image_path: str):
         """对图像进行分类"""
-        input_tensor = preprocess_image(image_path).to(self.device)
-        with torch.no_grad():  # 禁用梯度计算
-            output = self.model(input_tensor)  # 得到推理结果
-            predicted_index = torch.argmax(output, dim=1).item()  # 获取预测类别索引
-            confidence_scores = output.softmax(dim=1)[0].tolist()  # 获取每个类别的置信度
-        return self.class_labels[predicted_index], confidence_scores
+        input_tensor = self.preprocessor.preprocess(image_path)
+        return self.predict_batch(input_tensor)[0]
+
+    def _preprocess_timed(self, image) -> np.ndarray:
+        start = time.perf_counter()
+        input_batch = self.preprocessor.preprocess(image)
+        upload_stats.record_decode(time.perf_counter() - start)
+        return input_batch
+
+    async def predict_async(self, image) -> Tuple[str, List[float]]:
+        """异步分类：预处理在推理线程池中完成，前向传播经批处理队列与其他请求合并"""
+        await self.ensure_loaded()
+        input_tensor = await self.executor.run(self._preprocess_timed, image)
+        return await self.batch_queue.submit(input_tensor)
+
+    async def predict_tta_async(self, image, views: int) -> Tuple[str, List[float], List[float]]:
+        """异步 TTA 分类：视图本身已构成一个批次，直接在推理线程池中执行，不经过批处理队列"""
+        await self.ensure_loaded()
+        return await self.executor.run(self.predict_tta, image, views)
+
+    async def close(self):
+        """释放后台推理资源"""
+        await self.batch_queue.close()
+
+
+model_service = ModelService(
+    model_path=settings.MODEL_PATH,
+    class_labels=settings.MODEL_CLASS_LABELS,
+    version=settings.MODEL_VERSION,
+)
@@ -0,0 +1,86 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from ..core.config import settings
+from ..core.oss_config import OSSConfig
+from .storage_backends import Part, ObjectInfo, StorageBackend, create_storage_backend
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBucket:
+    """存储驱动的异步封装：同步 SDK 调用在专用的有界线程池中执行，不阻塞事件循环
+
+    线程数即最大并发请求数；驱动判定可重试的错误按指数退避重试 retries 次。
+    sign_url 只在本地计算签名，不发网络请求，直接调用。
+    """
+
+    def __init__(self, backend: StorageBackend, max_workers: int, retries: int, retry_backoff: float):
+        self.backend = backend
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+
+    async def _call(self, fn: Callable, *args):
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            try:
+                return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+            except Exception as e:
+                if attempt == self.retries or not self.backend.is_retryable(e):
+                    raise
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning(f"存储请求失败，{delay:.1f}s 后重试 ({attempt + 1}/{self.retries}): {str(e)}")
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _rewind(data):
+        if hasattr(data, "seek"):
+            data.seek(0)  # 重试时从头重新发送
+        return data
+
+    async def put_object(self, key: str, data):
+        return await self._call(self._put_object, key, data)
+
+    def _put_object(self, key: str, data):
+        return self.backend.put_object(key, self._rewind(data))
+
+    async def get_object_bytes(self, key: str) -> bytes:
+        return await self._call(self.backend.get_object_bytes, key)
+
+    async def delete_object(self, key: str):
+        return await self._call(self.backend.delete_object, key)
+
+    async def head_object(self, key: str) -> ObjectInfo:
+        return await self._call(self.backend.head_object, key)
+
+    def sign_url(self, method: str, key: str, expires: int) -> str:
+        return self.backend.sign_url(method, key, expires)
+
+    async def init_multipart_upload(self, key: str) -> str:
+        return await self._call(self.backend.init_multipart_upload, key)
+
+    async def upload_part(self, key: str, upload_id: str, part_number: int, data) -> Part:
+        etag = await self._call(self._upload_part, key, upload_id, part_number, data)
+        return part_number, etag
+
+    def _upload_part(self, key: str, upload_id: str, part_number: int, data) -> str:
+        return self.backend.upload_part(key, upload_id, part_number, self._rewind(data))
+
+    async def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Part]):
+        return await self._call(self.backend.complete_multipart_upload, key, upload_id, parts)
+
+    async def abort_multipart_upload(self, key: str, upload_id: str):
+        return await self._call(self.backend.abort_multipart_upload, key, upload_id)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def create_bucket(config: OSSConfig) -> AsyncBucket:
+    """按配置创建存储驱动并包装为 AsyncBucket"""
+    backend = create_storage_backend(config, settings.SECRET_KEY)
+    return AsyncBucket(backend, config.max_concurrency, config.retries, config.retry_backoff)
@@ -1,24 +1,55 @@
+import asyncio
+import hashlib
+import mimetypes
 import os
-import uuid
 import logging
 from datetime import datetime, timezone
-from typing import Optional
-import oss2
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import quote
 from fastapi import UploadFile, HTTPException
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
+from ..core.config import settings
 from ..core.oss_config import OSSConfig
-from ..models.mongodb_models import MongoImage, ImageType, PrivacyLevel
+from ..models.mongodb_models import ImageDerivative, MongoImage, ImageType, PrivacyLevel
+from .image_derivatives import DerivativeSet, derivative_key, generate_derivatives
+from .oss_client import create_bucket
+from .storage_backends import LocalBackend
+from .preprocessing import BufferReader
+
+if TYPE_CHECKING:
+    from .database_service import DatabaseService
 
 logger = logging.getLogger(__name__)
 
+# 由文件内容决定的字段，内容相同的图片记录共用
+STORED_FIELDS = {
+    "filename", "file_path", "file_url", "file_size", "mime_type",
+    "content_hash", "width", "height", "format", "derivatives",
+}
+
+
+def _read_and_hash(fileobj, view: memoryview, hasher, chunk_size: int) -> int:
+    """按 chunk_size 分块读入 view，同时更新哈希，返回读取的字节数"""
+    total = 0
+    while total < len(view):
+        count = fileobj.readinto(view[total:total + chunk_size])
+        if not count:
+            break
+        hasher.update(view[total:total + count])
+        total += count
+    return total
+
+
 class OSSService:
     def __init__(self, config: OSSConfig):
         self.config = config
-        self.auth = oss2.Auth(config.access_key_id, config.access_key_secret)
-        self.bucket = oss2.Bucket(self.auth, config.endpoint, config.bucket_name)
+        self.bucket = create_bucket(config)
 
     async def upload_file(
         self,
         file: UploadFile,
+        references: "DatabaseService",
         user_id: int,
         image_type: ImageType,
         privacy_level: PrivacyLevel = PrivacyLevel.DOCTORS_ONLY,
@@ -26,74 +57,205 @@ class OSSService:
         medical_info_id: Optional[int] = None,
         diagnosis_id: Optional[int] = None
     ) -> MongoImage:
-        """上传文件到OSS并创建图片记录"""
+        """上传文件到OSS并创建图片记录
+
+        文件按内容的 SHA-256 存储，上传前先通过 references 为文件加引用；按哈希查到已有记录时不再上传，
+        新记录与其共用同一份文件和衍生图。返回的记录持有这个引用，记录删除时由调用方释放。
+        """
         # 验证文件类型
         if file.content_type not in self.config.allowed_types:
             raise HTTPException(status_code=400, detail="不支持的文件类型")
 
-        # 验证文件大小
-        file_size = 0
-        file_content = b""
-        while chunk := await file.read(8192):
-            file_size += len(chunk)
-            file_content += chunk
-            if file_size > self.config.max_size:
-                raise HTTPException(status_code=400, detail="文件大小超过限制")
-
-        # 生成唯一文件名
-        file_ext = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        object_key = f"{self.config.upload_dir}/{datetime.now().strftime('%Y/%m/%d')}/{unique_filename}"
+        # 分块读入预分配的缓冲区，同时计算大小和内容哈希
+        data, content_hash = await self._read_content(file)
 
+        first = await references.acquire_blob(content_hash)
+        duplicate = None
         try:
-            # 上传到OSS
-            self.bucket.put_object(object_key, file_content)
-            
-            # 获取文件URL
-            file_url = f"{self.config.base_url}/{object_key}"
-
-            # 创建图片记录
-            image = MongoImage(
-                filename=unique_filename,
-                original_filename=file.filename,
-                file_path=object_key,
-                file_url=file_url,
-                file_size=file_size,
-                mime_type=file.content_type,
-                image_type=image_type,
-                user_id=user_id,
-                case_id=case_id,
-                medical_info_id=medical_info_id,
-                diagnosis_id=diagnosis_id,
-                privacy_level=privacy_level,
-                created_at=datetime.now(timezone.utc),
-                updated_at=datetime.now(timezone.utc)
-            )
+            if not first:
+                duplicate = await references.find_image_by_hash(content_hash)
+        except Exception:
+            await references.release_blob(content_hash)
+            raise
+        # 其他引用可能是尚未写入记录的上传，此时同样上传一遍，写入的内容相同
+        if duplicate is not None:
+            stored = duplicate.model_dump(include=STORED_FIELDS)
+        else:
+            stored = await self._store(file, data, content_hash, references)
+
+        # 创建图片记录
+        now = datetime.now(timezone.utc)
+        return MongoImage(
+            **stored,
+            original_filename=file.filename,
+            image_type=image_type,
+            user_id=user_id,
+            case_id=case_id,
+            medical_info_id=medical_info_id,
+            diagnosis_id=diagnosis_id,
+            privacy_level=privacy_level,
+            created_at=now,
+            updated_at=now
+        )
+
+    async def _store(
+        self, file: UploadFile, data: memoryview, content_hash: str, references: "DatabaseService"
+    ) -> dict:
+        """上传原图和衍生图，返回图片记录中与存储相关的字段
 
-            return image
+        上传失败时释放引用，只有不再有任何引用时才删除已上传的对象：同一内容的对象可能属于已有记录或其他上传。
+        """
+        # 按内容哈希命名，相同内容总是对应同一个对象
+        file_ext = os.path.splitext(file.filename)[1].lower()
+        filename = f"{content_hash}{file_ext}"
+        object_key = f"{self.config.upload_dir}/{content_hash[:2]}/{filename}"
 
+        uploaded_keys = [object_key]
+        try:
+            # 上传原图的同时在线程池中解码原图、生成衍生图，再并发上传衍生图
+            _, derivative_set = await asyncio.gather(
+                self._put_object(object_key, data),
+                self._generate_derivatives(file.content_type, data),
+            )
+            derivatives = self._derivative_records(object_key, derivative_set)
+            uploaded_keys += [derivative.file_path for derivative in derivatives.values()]
+            await self._put_derivatives(derivatives, derivative_set)
         except Exception as e:
-            # 如果上传失败，尝试删除已上传的文件
             try:
-                self.bucket.delete_object(object_key)
-            except:
-                pass
+                await references.release_blob(content_hash, lambda: self._delete_objects(uploaded_keys))
+            except Exception as cleanup_error:
+                logger.error(f"清理上传失败的文件失败: {str(cleanup_error)}")
             logger.error(f"文件上传失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
 
+        return {
+            "filename": filename,
+            "file_path": object_key,
+            "file_url": f"{self.config.base_url}/{object_key}",
+            "file_size": len(data),
+            "mime_type": file.content_type,
+            "content_hash": content_hash,
+            "width": derivative_set.width if derivative_set else None,
+            "height": derivative_set.height if derivative_set else None,
+            "format": derivative_set.format if derivative_set else None,
+            "derivatives": derivatives,
+        }
+
+    async def _generate_derivatives(self, content_type: str, data: memoryview) -> Optional[DerivativeSet]:
+        """图片文件生成衍生图；无法解码时只记录警告，不影响原图上传"""
+        if not settings.IMAGE_DERIVATIVES_ENABLED or not content_type.startswith("image/"):
+            return None
+        try:
+            return await run_in_threadpool(
+                generate_derivatives, data, settings.IMAGE_THUMBNAIL_SIZES, settings.IMAGE_THUMBNAIL_QUALITY
+            )
+        except Exception as e:
+            logger.warning(f"生成衍生图失败: {str(e)}")
+            return None
+
+    @staticmethod
+    def _derivative_records(object_key: str, derivative_set: Optional[DerivativeSet]) -> Dict[str, ImageDerivative]:
+        if derivative_set is None:
+            return {}
+        return {
+            name: ImageDerivative(
+                file_path=derivative_key(object_key, name, derivative.extension),
+                width=derivative.width,
+                height=derivative.height,
+                file_size=len(derivative.data),
+                mime_type=derivative.mime_type,
+            )
+            for name, derivative in derivative_set.derivatives.items()
+        }
+
+    async def _put_derivatives(self, records: Dict[str, ImageDerivative], derivative_set: Optional[DerivativeSet]):
+        if derivative_set is None:
+            return
+        await asyncio.gather(*(
+            self.bucket.put_object(records[name].file_path, derivative.data)
+            for name, derivative in derivative_set.derivatives.items()
+        ))
+
+    @staticmethod
+    def _object_key(image: MongoImage, variant: Optional[str]) -> str:
+        """原图或指定衍生图的存储路径"""
+        if variant is None:
+            return image.file_path
+        derivative = image.derivatives.get(variant)
+        if derivative is None:
+            raise HTTPException(status_code=404, detail=f"图片没有 {variant} 衍生图")
+        return derivative.file_path
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(status_code=400, detail="文件大小超过限制")
+
+    async def _read_content(self, file: UploadFile) -> Tuple[memoryview, str]:
+        """读取上传文件，返回内容和 SHA-256
+
+        文件大小已知时按大小预分配缓冲区，在线程池中分块 readinto 并更新哈希，
+        每个字节只复制一次；大小未知时逐块追加，超过上限立即停止。
+        """
+        hasher = hashlib.sha256()
+        if file.size is None:
+            buffer = bytearray()
+            while chunk := await file.read(self.config.upload_chunk_size):
+                buffer += chunk
+                hasher.update(chunk)
+                if len(buffer) > self.config.max_size:
+                    raise self._too_large()
+            return memoryview(buffer), hasher.hexdigest()
+
+        if file.size > self.config.max_size:
+            raise self._too_large()
+        view = memoryview(bytearray(file.size))
+        await file.seek(0)
+        count = await run_in_threadpool(_read_and_hash, file.file, view, hasher, self.config.upload_chunk_size)
+        return view[:count], hasher.hexdigest()
+
+    async def _put_object(self, object_key: str, data: memoryview):
+        """小文件直接上传，超过 multipart_threshold 的文件并发分片上传，各分片引用缓冲区的切片，发送时按块读取，不预先复制整段数据"""
+        if len(data) <= self.config.multipart_threshold:
+            await self.bucket.put_object(object_key, BufferReader(data))
+            return
+
+        upload_id = await self.bucket.init_multipart_upload(object_key)
+        try:
+            part_size = max(self.config.multipart_part_size, self.bucket.backend.min_part_size)
+            parts = await asyncio.gather(*(
+                self.bucket.upload_part(object_key, upload_id, part_number, BufferReader(data[offset:offset + part_size]))
+                for part_number, offset in enumerate(range(0, len(data), part_size), start=1)
+            ))
+            await self.bucket.complete_multipart_upload(object_key, upload_id, list(parts))
+        except Exception:
+            await self.bucket.abort_multipart_upload(object_key, upload_id)
+            raise
+
+    async def _delete_objects(self, keys: List[str]):
+        await asyncio.gather(*(self.bucket.delete_object(key) for key in keys))
+
     async def delete_file(self, image: MongoImage) -> bool:
         """删除OSS中的文件"""
         try:
-            self.bucket.delete_object(image.file_path)
+            await self._delete_objects([image.file_path] + [derivative.file_path for derivative in image.derivatives.values()])
             return True
         except Exception as e:
             logger.error(f"文件删除失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"文件删除失败: {str(e)}")
 
-    async def get_file_url(self, image: MongoImage, expires: int = 3600) -> str:
-        """获取文件的临时访问URL"""
+    async def download_file(self, image: MongoImage, variant: Optional[str] = None) -> bytes:
+        """下载原图或衍生图的内容（在存储线程池中执行，可并发下载）"""
+        object_key = self._object_key(image, variant)
         try:
-            url = self.bucket.sign_url('GET', image.file_path, expires)
+            return await self.bucket.get_object_bytes(object_key)
+        except Exception as e:
+            logger.error(f"文件下载失败: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"文件下载失败: {str(e)}")
+
+    async def get_file_url(self, image: MongoImage, expires: int = 3600, variant: Optional[str] = None) -> str:
+        """获取原图或衍生图的临时访问URL"""
+        object_key = self._object_key(image, variant)
+        try:
+            url = self.bucket.sign_url('GET', object_key, expires)
             return url
         except Exception as e:
             logger.error(f"获取文件URL失败: {str(e)}")
@@ -115,7 +277,7 @@ class OSSService:
         """获取文件信息"""
         try:
             # 获取文件元数据
-            headers = self.bucket.head_object(image.file_path)
+            headers = await self.bucket.head_object(image.file_path)
             return {
                 "size": headers.content_length,
                 "last_modified": headers.last_modified,
@@ -126,4 +288,34 @@ class OSSService:
             logger.error(f"获取文件信息失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"获取文件信息失败: {str(e)}")
 
+    def file_response(self, object_key: str, expires: int, signature: str) -> Response:
+        """本地存储后端的签名下载：校验签名后直接返回磁盘文件
+
+        FileResponse 分块从磁盘读取，不把整个文件读入内存；配置 local_accel_redirect 时
+        只返回 X-Accel-Redirect 头，由 nginx 用 sendfile 零拷贝发送。
+        """
+        backend = self.bucket.backend
+        if not isinstance(backend, LocalBackend):
+            raise HTTPException(status_code=404, detail="文件不存在")
+        if not backend.verify(object_key, expires, signature):
+            raise HTTPException(status_code=403, detail="链接无效或已过期")
+        try:
+            path = backend.path(object_key)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="文件不存在")
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="文件不存在")
+
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.config.local_accel_redirect:
+            return Response(
+                media_type=media_type,
+                headers={"X-Accel-Redirect": f"{self.config.local_accel_redirect.rstrip('/')}/{quote(object_key)}"},
+            )
+        return FileResponse(path, media_type=media_type)
+
+    def close(self):
+        """关闭存储线程池"""
+        self.bucket.close()
+
 oss_service = OSSService(OSSConfig()) 
\ No newline at end of file
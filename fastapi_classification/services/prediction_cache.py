@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from ..core.config import settings
+from ..core.metrics import metrics
+from ..core.redis import redis_manager
+from ..models.response import PredictionResult
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """预测结果缓存：按图像内容哈希 + 模型版本 + 预处理配置缓存，进程内 LRU 为一级，Redis 为二级"""
+
+    def __init__(self, max_entries: int, expire: int, prefix: str = "prediction"):
+        self.max_entries = max_entries
+        self.expire = expire
+        self.prefix = prefix
+        self._entries: "OrderedDict[str, PredictionResult]" = OrderedDict()
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def make_key(self, data: bytes, model_version: str, preprocessing: str) -> str:
+        """缓存键：模型版本 + 预处理配置（解码方式、尺寸、归一化参数）+ 原始图像字节的 SHA-256"""
+        return f"{self.prefix}:{model_version}:{preprocessing}:{hashlib.sha256(data).hexdigest()}"
+
+    def _remember(self, key: str, result: PredictionResult):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[PredictionResult]:
+        """依次查询进程内缓存和 Redis"""
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return result
+
+        if redis_manager.redis is not None:
+            try:
+                data = await redis_manager.redis.get(key)
+                if data:
+                    result = PredictionResult(**json.loads(data))
+                    self._remember(key, result)
+                    self.redis_hits += 1
+                    return result
+            except Exception as e:
+                logger.error(f"获取预测缓存失败: {str(e)}")
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, result: PredictionResult):
+        """写入进程内缓存和 Redis"""
+        self._remember(key, result)
+        if redis_manager.redis is None:
+            return
+        try:
+            await redis_manager.redis.set(key, result.model_dump_json(), ex=self.expire)
+        except Exception as e:
+            logger.error(f"设置预测缓存失败: {str(e)}")
+
+    def stats(self) -> dict:
+        """命中/未命中计数"""
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._entries),
+        }
+
+
+prediction_cache = PredictionCache(
+    max_entries=settings.PREDICTION_CACHE_MAX_ENTRIES,
+    expire=settings.PREDICTION_CACHE_EXPIRE,
+)
+metrics.callback("prediction_cache_hits_total", "预测缓存命中次数", lambda: prediction_cache.memory_hits, kind="counter", tier="memory")
+metrics.callback("prediction_cache_hits_total", "预测缓存命中次数", lambda: prediction_cache.redis_hits, kind="counter", tier="redis")
+metrics.callback("prediction_cache_misses_total", "预测缓存未命中次数", lambda: prediction_cache.misses, kind="counter")
+metrics.callback("prediction_cache_entries", "进程内预测缓存条数", lambda: len(prediction_cache._entries))
@@ -0,0 +1,317 @@
+import asyncio
+import base64
+import io
+import itertools
+import json
+import logging
+import time
+import uuid
+import zipfile
+from typing import Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from ..core.config import settings
+from ..core.redis import redis_manager
+from ..models.response import PredictionResult
+from .model_registry import ModelRegistry, model_registry
+from .model_service import ModelService
+from .preprocessing import IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionJobQueue:
+    """基于 Redis 列表的异步预测任务队列
+
+    任务数据（base64 编码的文件）与任务状态分开存放，状态和结果在 result_ttl 后自动过期。
+    """
+
+    def __init__(self, result_ttl: int, prefix: str = "prediction_job"):
+        self.result_ttl = result_ttl
+        self.prefix = prefix
+        self.queue_key = f"{prefix}:queue"
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}"
+
+    def _payload_key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}:payload"
+
+    @property
+    def redis(self):
+        if redis_manager.redis is None:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="任务队列不可用")
+        return redis_manager.redis
+
+    async def submit(self, files: List[dict], model_version: Optional[str], tta_views: Optional[int]) -> str:
+        """提交任务，files 为 {"filename", "kind", "data"} 列表，data 为原始字节"""
+        job_id = uuid.uuid4().hex
+        payload = json.dumps([
+            {**file, "data": base64.b64encode(file["data"]).decode("ascii") if file.get("data") else None}
+            for file in files
+        ])
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._payload_key(job_id), payload, ex=self.result_ttl)
+            pipe.hset(self._job_key(job_id), mapping={
+                "status": "queued",
+                "model_version": model_version or "",
+                "tta_views": tta_views or 0,
+                "files": len(files),
+                "created_at": time.time(),
+            })
+            pipe.expire(self._job_key(job_id), self.result_ttl)
+            pipe.lpush(self.queue_key, job_id)
+            await pipe.execute()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """查询任务状态，完成后包含逐张图像的结果"""
+        job = await self.redis.hgetall(self._job_key(job_id))
+        if not job:
+            return None
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "model_version": job.get("model_version") or None,
+            "tta_views": int(job.get("tta_views") or 0) or None,
+            "files": int(job.get("files", 0)),
+            "created_at": float(job["created_at"]),
+            "finished_at": float(job["finished_at"]) if job.get("finished_at") else None,
+            "error": job.get("error"),
+            "results": json.loads(job["results"]) if job.get("results") else None,
+        }
+
+    async def pop(self, timeout: int = 5) -> Optional[str]:
+        """阻塞取出一个任务 ID，超时返回 None"""
+        item = await self.redis.brpop(self.queue_key, timeout=timeout)
+        return item[1] if item else None
+
+    async def load(self, job_id: str) -> Optional[Tuple[dict, List[dict]]]:
+        """读取任务参数和文件"""
+        job = await self.redis.hgetall(self._job_key(job_id))
+        payload = await self.redis.get(self._payload_key(job_id))
+        if not job or payload is None:
+            return None
+        files = [
+            {**file, "data": base64.b64decode(file["data"]) if file.get("data") else None}
+            for file in json.loads(payload)
+        ]
+        return job, files
+
+    async def mark_running(self, job_id: str):
+        await self.redis.hset(self._job_key(job_id), mapping={"status": "running", "started_at": time.time()})
+
+    async def _finish(self, job_id: str, mapping: dict):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job_id), mapping={**mapping, "finished_at": time.time()})
+            pipe.expire(self._job_key(job_id), self.result_ttl)
+            pipe.delete(self._payload_key(job_id))  # 结果写入后不再需要原始文件
+            await pipe.execute()
+
+    async def complete(self, job_id: str, results: List[dict]):
+        await self._finish(job_id, {"status": "completed", "results": json.dumps(results, ensure_ascii=False)})
+
+    async def fail(self, job_id: str, error: str):
+        await self._finish(job_id, {"status": "failed", "error": error})
+
+
+def iter_job_sources(files: List[dict], max_members: int, max_member_bytes: int, max_total_bytes: int) -> Iterator[tuple]:
+    """依次产出 (文件名, 图像字节或异常)，zip 压缩包迭代到哪个成员才解压哪个成员
+
+    压缩包中的图片数、单个成员及所有成员解压后的总大小都有上限，按 zip 中记录的原始大小在解压前检查；
+    zipfile 解压时最多输出记录的大小，谎报大小的成员会因校验失败报错，不会多占内存。
+    """
+    members = 0
+    total_bytes = 0
+    for file in files:
+        if file["kind"] == "image":
+            yield file["filename"], file["data"]
+            continue
+        if file["kind"] != "zip":
+            yield file["filename"], ValueError("仅支持JPEG或PNG格式图片")
+            continue
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(file["data"]))
+        except zipfile.BadZipFile as e:
+            yield file["filename"], e
+            continue
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                members += 1
+                if members > max_members:
+                    yield file["filename"], ValueError(f"压缩包中的图片数超过上限 {max_members}，其余图片未处理")
+                    break
+                if info.file_size > max_member_bytes:
+                    yield info.filename, ValueError(f"解压后大小不能超过 {max_member_bytes // 1024 // 1024} MB")
+                    continue
+                total_bytes += info.file_size
+                if total_bytes > max_total_bytes:
+                    yield file["filename"], ValueError(
+                        f"压缩包解压后的总大小超过 {max_total_bytes // 1024 // 1024} MB，其余图片未处理"
+                    )
+                    break
+                try:
+                    data = archive.read(info)
+                except Exception as e:
+                    yield info.filename, e
+                    continue
+                yield info.filename, data
+
+
+def take_sources(sources: Iterator[tuple], count: int) -> list:
+    """在推理线程中取出（并解压）接下来的 count 个图像"""
+    return list(itertools.islice(sources, count))
+
+
+def predict_sources(model_service: ModelService, sources: list) -> list:
+    """在推理线程中预测一批 (文件名, 图像字节或异常)，按原顺序返回结果或异常"""
+    images = [data for _, data in sources if not isinstance(data, Exception)]
+    results_iter = iter(model_service.predict_many(images))
+    return [data if isinstance(data, Exception) else next(results_iter) for _, data in sources]
+
+
+def _format_result(filename: str, result, model_version: str) -> dict:
+    if isinstance(result, Exception):
+        return {"filename": filename, "error": str(result)}
+    label, confidence_scores = result
+    return PredictionResult(
+        predicted_label=label,
+        confidence_scores=confidence_scores,
+        filename=filename,
+        model_version=model_version,
+    ).model_dump(exclude_none=True)
+
+
+async def _run_tta(model_service: ModelService, filename: str, data, tta_views: int) -> dict:
+    try:
+        if isinstance(data, Exception):
+            raise data
+        label, confidence_scores, confidence_variance = await model_service.executor.run(
+            model_service.predict_tta, data, tta_views, bounded=False
+        )
+    except Exception as e:
+        return {"filename": filename, "error": str(e)}
+    return PredictionResult(
+        predicted_label=label,
+        confidence_scores=confidence_scores,
+        confidence_variance=confidence_variance,
+        tta_views=tta_views,
+        filename=filename,
+        model_version=model_service.model_version,
+    ).model_dump(exclude_none=True)
+
+
+async def run_prediction_job(model_service: ModelService, files: List[dict], tta_views: Optional[int]) -> List[dict]:
+    """执行一个预测任务，返回逐张图像的结果；TTA 模式下每张图像的多个视图各自构成一个批次
+
+    与流式批量预测一样，压缩包按批逐个解压成员，内存占用与一批图像的大小相当，与压缩包解压后的总大小无关。
+    """
+    executor = model_service.executor
+    sources = iter_job_sources(
+        files,
+        max_members=settings.PREDICTION_JOB_ZIP_MAX_MEMBERS,
+        max_member_bytes=settings.PREDICT_MAX_UPLOAD_BYTES,
+        max_total_bytes=settings.PREDICTION_JOB_ZIP_MAX_BYTES,
+    )
+    chunk_size = 1 if tta_views else settings.PREDICT_BATCH_CHUNK_SIZE
+    rows = []
+    while chunk := await executor.run(take_sources, sources, chunk_size, bounded=False):
+        if tta_views:
+            rows += [await _run_tta(model_service, filename, data, tta_views) for filename, data in chunk]
+            continue
+        results = await executor.run(predict_sources, model_service, chunk, bounded=False)
+        rows += [
+            _format_result(filename, result, model_service.model_version)
+            for (filename, _), result in zip(chunk, results)
+        ]
+    return rows
+
+
+class PredictionJobWorkerPool:
+    """预测任务工作池：一个拉取协程按 prefetch 从 Redis 预取任务，workers 个协程并发处理
+
+    本地队列满时拉取协程阻塞，未处理的任务留在 Redis 中，可由其他进程的工作池取走。
+    已取出但进程退出前未完成的任务会停留在 queued/running 状态，直到过期。
+    """
+
+    def __init__(self, queue: PredictionJobQueue, registry: ModelRegistry, workers: int, prefetch: int):
+        self.queue = queue
+        self.registry = registry
+        self.workers = max(1, workers)
+        self.prefetch = max(1, prefetch)
+        self._local: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._local = asyncio.Queue(maxsize=self.prefetch)
+        self._tasks = [asyncio.create_task(self._fetch())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        logger.info(f"预测任务工作池已启动: workers={self.workers}, prefetch={self.prefetch}")
+
+    async def _fetch(self):
+        while True:
+            try:
+                job_id = await self.queue.pop()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"拉取预测任务失败: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+            if job_id:
+                await self._local.put(job_id)
+
+    async def _work(self):
+        while True:
+            job_id = await self._local.get()
+            try:
+                await self._process(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"处理预测任务 {job_id} 失败: {str(e)}")
+            finally:
+                self._local.task_done()
+
+    async def _process(self, job_id: str):
+        loaded = await self.queue.load(job_id)
+        if loaded is None:
+            logger.warning(f"预测任务 {job_id} 已过期")
+            return
+        job, files = loaded
+        await self.queue.mark_running(job_id)
+        try:
+            # 指定的版本若由其他进程加载、本进程尚未加载，先按需加载
+            model_service = await self.registry.get_or_load(job.get("model_version") or None)
+            await model_service.ensure_loaded()
+            results = await run_prediction_job(model_service, files, int(job.get("tta_views") or 0) or None)
+        except HTTPException as e:
+            await self.queue.fail(job_id, str(e.detail))
+            return
+        except Exception as e:
+            await self.queue.fail(job_id, str(e))
+            return
+        await self.queue.complete(job_id, results)
+
+    async def wait(self):
+        """等待工作池退出（独立 worker 进程使用）"""
+        await asyncio.gather(*self._tasks)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+prediction_job_queue = PredictionJobQueue(result_ttl=settings.PREDICTION_JOB_RESULT_TTL)
+prediction_job_workers = PredictionJobWorkerPool(
+    prediction_job_queue,
+    model_registry,
+    workers=settings.PREDICTION_JOB_WORKERS,
+    prefetch=settings.PREDICTION_JOB_PREFETCH,
+)
@@ -0,0 +1,200 @@
+import io
+import threading
+from typing import Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+from ..core.config import settings
+from ..core.metrics import stage_timer
+
+DECODE_SECONDS = stage_timer("decode")
+RESIZE_SECONDS = stage_timer("resize")
+NORMALIZE_SECONDS = stage_timer("normalize")
+
+# 支持的图片文件扩展名
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# 测试时增强（TTA）的视图顺序：(裁剪位置, 是否水平翻转)，None 表示整图
+TTA_VIEWS = [
+    (None, False),
+    (None, True),
+    ("center", False),
+    ("top_left", False),
+    ("top_right", False),
+    ("bottom_left", False),
+    ("bottom_right", False),
+    ("center", True),
+]
+
+class BufferReader(io.RawIOBase):
+    """在内存缓冲区上读取的只读文件对象
+
+    io.BytesIO 对 bytearray/memoryview 会先复制整块数据；这里不复制整个缓冲区，readinto 直接写入调用方的缓冲区，
+    read 只把请求的那一段复制为 bytes（PIL 等调用方需要 bytes）。
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+class ImagePreprocessor:
+    """图像预处理流水线：构建一次后重复使用
+
+    解码时直接缩放到模型输入尺寸（可选 JPEG 的 PIL draft 降采样解码，或使用 OpenCV），
+    ToTensor + Normalize 合并为一次查表运算：uint8 像素值只有 256 种取值，
+    (x / 255 - mean) / std 可以预先算成每个通道一张 256 项的表。
+    """
+
+    def __init__(
+        self,
+        size: int = 224,
+        mean: Sequence[float] = (0.5, 0.5, 0.5),
+        std: Sequence[float] = (0.5, 0.5, 0.5),
+        decoder: str = "pil",
+        jpeg_draft: bool = False,
+    ):
+        self.size = size
+        self.decoder = decoder
+        self.jpeg_draft = jpeg_draft
+        # 不同的解码方式得到的像素不同，预测缓存按该标识区分
+        self.signature = "-".join([
+            decoder + ("-draft" if decoder == "pil" and jpeg_draft else ""),
+            str(size),
+            ",".join(f"{value:g}" for value in (*mean, *std)),
+        ])
+        values = np.arange(256, dtype=np.float32) / 255
+        mean = np.asarray(mean, dtype=np.float32)[:, None]
+        std = np.asarray(std, dtype=np.float32)[:, None]
+        self.lut = ((values[None, :] - mean) / std).astype(np.float32)  # 3x256 归一化查找表
+        self._local = threading.local()  # 每个推理线程各自的批处理缓冲区
+
+    def decode(self, source) -> np.ndarray:
+        """解码并缩放为 size x size 的 RGB uint8 数组（HxWx3）"""
+        if self.decoder == "opencv":
+            return self._decode_opencv(source)
+        return self._decode_pil(source)
+
+    def _decode_pil(self, source) -> np.ndarray:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = BufferReader(source)
+        with DECODE_SECONDS.time():
+            image = Image.open(source)
+            if self.jpeg_draft and image.format == "JPEG":
+                # JPEG 可在 DCT 域按 1/2、1/4、1/8 降采样解码，结果不小于目标尺寸
+                image.draft("RGB", (self.size, self.size))
+            image = image.convert("RGB")  # 确保是RGB格式
+        if image.size != (self.size, self.size):
+            with RESIZE_SECONDS.time():
+                image = image.resize((self.size, self.size), Image.BILINEAR)
+        return np.asarray(image)
+
+    def _decode_opencv(self, source) -> np.ndarray:
+        import cv2
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            data = source
+        elif isinstance(source, str):
+            with open(source, "rb") as f:
+                data = f.read()
+        else:
+            data = source.read()
+        with DECODE_SECONDS.time():
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("无法解码图片")
+        if image.shape[:2] != (self.size, self.size):
+            with RESIZE_SECONDS.time():
+                image = cv2.resize(image, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def augment(self, image: np.ndarray, count: int, crop_ratio: float = 0.875) -> np.ndarray:
+        """由一张解码后的图像（HxWx3）生成前 count 个 TTA 视图（NxHxWx3），裁剪视图缩放回原尺寸"""
+        size = self.size
+        crop = int(round(size * crop_ratio))
+        offset = size - crop
+        origins = {
+            "center": (offset // 2, offset // 2),
+            "top_left": (0, 0),
+            "top_right": (0, offset),
+            "bottom_left": (offset, 0),
+            "bottom_right": (offset, offset),
+        }
+        views = np.empty((count, size, size, 3), dtype=np.uint8)
+        for index, (position, flip) in enumerate(TTA_VIEWS[:count]):
+            view = image
+            if position is not None:
+                top, left = origins[position]
+                view = np.asarray(
+                    Image.fromarray(image[top:top + crop, left:left + crop]).resize((size, size), Image.BILINEAR)
+                )
+            views[index] = view[:, ::-1] if flip else view
+        return views
+
+    def normalize(self, images: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """把 NxHxWx3 的 uint8 图像转换为归一化后的 Nx3xHxW float32 数组"""
+        if out is None:
+            out = np.empty((images.shape[0], 3, self.size, self.size), dtype=np.float32)
+        # 按样本、通道写入，保证每次写入的目标都是连续内存，避免临时拷贝
+        with NORMALIZE_SECONDS.time():
+            for index in range(images.shape[0]):
+                for channel in range(3):
+                    np.take(self.lut[channel], images[index, ..., channel], out=out[index, channel], mode="clip")
+        return out
+
+    def batch_buffers(self, batch_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回当前线程复用的 uint8/float32 批处理缓冲区（按需扩容）
+
+        缓冲区会被同一线程的下一次调用覆盖，调用方需在此之前用完结果。
+        """
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or buffers[0].shape[0] < batch_size:
+            buffers = (
+                np.empty((batch_size, self.size, self.size, 3), dtype=np.uint8),
+                np.empty((batch_size, 3, self.size, self.size), dtype=np.float32),
+            )
+            self._local.buffers = buffers
+        return buffers[0][:batch_size], buffers[1][:batch_size]
+
+    def preprocess(self, source) -> np.ndarray:
+        """预处理单张图像，返回新分配的 1x3xHxW float32 数组"""
+        image = self.decode(source)
+        return self.normalize(image[None, ...])
+
+
+default_preprocessor = ImagePreprocessor(
+    size=224,
+    decoder=settings.PREPROCESS_DECODER,
+    jpeg_draft=settings.PREPROCESS_JPEG_DRAFT,
+)
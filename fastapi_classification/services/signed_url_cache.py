@@ -0,0 +1,168 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import metrics
+from ..core.redis import redis_manager
+
+logger = logging.getLogger(__name__)
+
+
+class SignedUrlCache:
+    """图片签名 URL 缓存：按 (图片, 衍生图, 有效期, 时间窗口) 缓存，进程内 TTL 缓存为一级，Redis 为二级
+
+    时间按固定宽度的窗口划分，同一窗口内的请求复用同一个 URL；签名时过期时间取窗口结束时刻再加 expires，
+    因此返回的 URL 剩余有效期始终不少于请求的 expires，窗口结束后才重新签名。
+    缓存条目同时记录图片的隐私级别，命中时无需再查询 MongoDB 即可做权限检查。
+    缓存键中带有图片的代数（Redis 计数器），删除图片时代数加一，所有进程的旧条目随之失效，不必逐个删除。
+    """
+
+    def __init__(self, max_entries: int, window: int, prefix: str = "signed_url"):
+        self.max_entries = max_entries
+        self.window = window
+        self.prefix = prefix
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        # Redis 不可用时在本进程记录代数，按失效时刻排序
+        self._generations: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _generation_key(self, image_id: str) -> str:
+        return f"{self.prefix}:generation:{image_id}"
+
+    def _local_generation(self, image_id: str, now: float) -> int:
+        while self._generations:
+            image, (expires_at, _) = next(iter(self._generations.items()))
+            if expires_at > now:
+                break
+            del self._generations[image]
+        cached = self._generations.get(image_id)
+        return cached[1] if cached else 0
+
+    async def make_keys(
+        self, image_ids: List[str], variant: Optional[str], expires: int, now: float
+    ) -> List[Tuple[str, int]]:
+        """返回每张图片的缓存键和当前窗口的结束时刻，各图片的代数用一次 MGET 取回
+
+        窗口不超过 expires 的一半，短有效期的 URL 不会被延长太多。
+        """
+        generations = [self._local_generation(image_id, now) for image_id in image_ids]
+        if image_ids and redis_manager.redis is not None:
+            try:
+                values = await redis_manager.redis.mget([self._generation_key(image_id) for image_id in image_ids])
+                generations = [max(local, int(value or 0)) for local, value in zip(generations, values)]
+            except Exception as e:
+                logger.error(f"获取签名 URL 缓存代数失败: {str(e)}")
+
+        window = max(1, min(self.window, expires // 2))
+        bucket = int(now) // window
+        return [
+            (f"{self.prefix}:{image_id}:{generation}:{variant or 'original'}:{expires}:{bucket}", (bucket + 1) * window)
+            for image_id, generation in zip(image_ids, generations)
+        ]
+
+    async def make_key(self, image_id: str, variant: Optional[str], expires: int, now: float) -> Tuple[str, int]:
+        return (await self.make_keys([image_id], variant, expires, now))[0]
+
+    def _remember(self, key: str, entry: dict, valid_until: float):
+        self._entries[key] = (valid_until, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_local(self, key: str, now: float) -> Optional[dict]:
+        cached = self._entries.get(key)
+        if cached is None:
+            return None
+        valid_until, entry = cached
+        if valid_until <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def get_many(self, keys: List[str], valid_until: List[int]) -> List[Optional[dict]]:
+        """依次查询进程内缓存和 Redis，Redis 中的多个键用一次 MGET 取回"""
+        now = time.time()
+        entries = [self._get_local(key, now) for key in keys]
+        self.memory_hits += sum(entry is not None for entry in entries)
+
+        missing = [index for index, entry in enumerate(entries) if entry is None]
+        if missing and redis_manager.redis is not None:
+            try:
+                values = await redis_manager.redis.mget([keys[index] for index in missing])
+                for index, value in zip(missing, values):
+                    if value:
+                        entries[index] = json.loads(value)
+                        self._remember(keys[index], entries[index], valid_until[index])
+                        self.redis_hits += 1
+            except Exception as e:
+                logger.error(f"获取签名 URL 缓存失败: {str(e)}")
+
+        self.misses += sum(entry is None for entry in entries)
+        return entries
+
+    async def get(self, key: str, valid_until: int) -> Optional[dict]:
+        return (await self.get_many([key], [valid_until]))[0]
+
+    async def set_many(self, items: List[Tuple[str, dict, int]]):
+        """写入进程内缓存和 Redis，各条目到所在窗口结束时过期；Redis 写入合并为一次管道提交"""
+        for key, entry, valid_until in items:
+            self._remember(key, entry, valid_until)
+        if not items or redis_manager.redis is None:
+            return
+        try:
+            now = time.time()
+            async with redis_manager.redis.pipeline(transaction=False) as pipe:
+                for key, entry, valid_until in items:
+                    pipe.set(key, json.dumps(entry), ex=max(1, int(valid_until - now)))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"设置签名 URL 缓存失败: {str(e)}")
+
+    async def set(self, key: str, entry: dict, valid_until: int):
+        await self.set_many([(key, entry, valid_until)])
+
+    async def invalidate(self, image_id: str):
+        """使图片的所有缓存 URL 失效：代数加一，旧代数的条目不再被查到，到窗口结束时自然过期
+
+        代数本身只需保留一个窗口，过期后旧条目也都已过期。
+        """
+        now = time.time()
+        ttl = self.window + 1
+        generation = self._local_generation(image_id, now) + 1
+        if redis_manager.redis is not None:
+            try:
+                async with redis_manager.redis.pipeline(transaction=True) as pipe:
+                    pipe.incr(self._generation_key(image_id))
+                    pipe.expire(self._generation_key(image_id), ttl)
+                    generation = max(generation, (await pipe.execute())[0])
+            except Exception as e:
+                logger.error(f"清除签名 URL 缓存失败: {str(e)}")
+        self._generations.pop(image_id, None)
+        self._generations[image_id] = (now + ttl, generation)
+
+    def stats(self) -> dict:
+        """命中/未命中计数"""
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._entries),
+        }
+
+
+signed_url_cache = SignedUrlCache(
+    max_entries=settings.SIGNED_URL_CACHE_MAX_ENTRIES,
+    window=settings.SIGNED_URL_CACHE_WINDOW,
+)
+metrics.callback("signed_url_cache_hits_total", "签名 URL 缓存命中次数", lambda: signed_url_cache.memory_hits, kind="counter", tier="memory")
+metrics.callback("signed_url_cache_hits_total", "签名 URL 缓存命中次数", lambda: signed_url_cache.redis_hits, kind="counter", tier="redis")
+metrics.callback("signed_url_cache_misses_total", "签名 URL 缓存未命中次数", lambda: signed_url_cache.misses, kind="counter")
+metrics.callback("signed_url_cache_entries", "进程内签名 URL 缓存条数", lambda: len(signed_url_cache._entries))
@@ -0,0 +1,340 @@
+import hashlib
+import hmac
+import logging
+import mimetypes
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+from ..core.oss_config import OSSConfig
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKENDS = ("oss", "s3", "local")
+
+# 分片：(分片号, ETag)
+Part = Tuple[int, str]
+
+
+@dataclass
+class ObjectInfo:
+    """对象元数据"""
+    content_length: int
+    last_modified: int  # Unix 时间戳
+    etag: str
+    content_type: Optional[str]
+
+
+class StorageBackend(ABC):
+    """对象存储驱动接口
+
+    方法均为同步调用，由 AsyncBucket 在线程池中执行；data 参数可以是 bytes 或可 seek 的文件对象。
+    接口方法均为抽象方法，缺少任何一个的驱动在创建时即报错。
+    """
+
+    name = ""
+    min_part_size = 0  # 除最后一片外分片的最小字节数
+
+    @abstractmethod
+    def put_object(self, key: str, data):
+        ...
+
+    @abstractmethod
+    def get_object_bytes(self, key: str) -> bytes:
+        ...
+
+    @abstractmethod
+    def delete_object(self, key: str):
+        ...
+
+    @abstractmethod
+    def head_object(self, key: str) -> ObjectInfo:
+        ...
+
+    @abstractmethod
+    def sign_url(self, method: str, key: str, expires: int) -> str:
+        ...
+
+    @abstractmethod
+    def init_multipart_upload(self, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def upload_part(self, key: str, upload_id: str, part_number: int, data) -> str:
+        ...
+
+    @abstractmethod
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Part]):
+        ...
+
+    @abstractmethod
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        ...
+
+    def is_retryable(self, error: Exception) -> bool:
+        """网络错误和 5xx 服务端错误可以重试"""
+        return False
+
+
+class OSSBackend(StorageBackend):
+    """阿里云 OSS，所有线程共用一个 oss2.Session，连接池大小与并发数相同以复用长连接"""
+
+    name = "oss"
+    min_part_size = 100 * 1024
+
+    def __init__(self, config: OSSConfig):
+        import oss2
+
+        self._oss2 = oss2
+        self.bucket = oss2.Bucket(
+            oss2.Auth(config.access_key_id, config.access_key_secret),
+            config.endpoint,
+            config.bucket_name,
+            session=oss2.Session(pool_size=config.max_concurrency),
+            connect_timeout=config.timeout,
+        )
+
+    def put_object(self, key: str, data):
+        self.bucket.put_object(key, data)
+
+    def get_object_bytes(self, key: str) -> bytes:
+        with self.bucket.get_object(key) as result:
+            return result.read()
+
+    def delete_object(self, key: str):
+        self.bucket.delete_object(key)
+
+    def head_object(self, key: str) -> ObjectInfo:
+        headers = self.bucket.head_object(key)
+        return ObjectInfo(headers.content_length, headers.last_modified, headers.etag, headers.content_type)
+
+    def sign_url(self, method: str, key: str, expires: int) -> str:
+        return self.bucket.sign_url(method, key, expires)
+
+    def init_multipart_upload(self, key: str) -> str:
+        return self.bucket.init_multipart_upload(key).upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data) -> str:
+        return self.bucket.upload_part(key, upload_id, part_number, data).etag
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Part]):
+        part_infos = [self._oss2.models.PartInfo(part_number, etag) for part_number, etag in parts]
+        self.bucket.complete_multipart_upload(key, upload_id, part_infos)
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        self.bucket.abort_multipart_upload(key, upload_id)
+
+    def is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, self._oss2.exceptions.RequestError):
+            return True
+        return isinstance(error, self._oss2.exceptions.ServerError) and error.status >= 500
+
+
+class S3Backend(StorageBackend):
+    """S3 兼容存储（AWS S3、MinIO、Ceph RGW 等），重试由 AsyncBucket 统一处理，boto3 自身不重试"""
+
+    name = "s3"
+    min_part_size = 5 * 1024 * 1024
+
+    def __init__(self, config: OSSConfig):
+        import boto3
+        import botocore.exceptions
+        from botocore.config import Config
+
+        self._exceptions = botocore.exceptions
+        self.bucket_name = config.s3_bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=config.s3_endpoint_url or None,
+            region_name=config.s3_region or None,
+            aws_access_key_id=config.s3_access_key_id or None,
+            aws_secret_access_key=config.s3_secret_access_key or None,
+            config=Config(
+                max_pool_connections=config.max_concurrency,
+                connect_timeout=config.timeout,
+                read_timeout=config.timeout,
+                retries={"mode": "standard", "total_max_attempts": 1},
+            ),
+        )
+
+    def put_object(self, key: str, data):
+        self.client.put_object(Bucket=self.bucket_name, Key=key, Body=data)
+
+    def get_object_bytes(self, key: str) -> bytes:
+        body = self.client.get_object(Bucket=self.bucket_name, Key=key)["Body"]
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def delete_object(self, key: str):
+        self.client.delete_object(Bucket=self.bucket_name, Key=key)
+
+    def head_object(self, key: str) -> ObjectInfo:
+        response = self.client.head_object(Bucket=self.bucket_name, Key=key)
+        return ObjectInfo(
+            response["ContentLength"],
+            int(response["LastModified"].timestamp()),
+            response["ETag"].strip('"'),
+            response.get("ContentType"),
+        )
+
+    def sign_url(self, method: str, key: str, expires: int) -> str:
+        operation = {"GET": "get_object", "PUT": "put_object"}[method]
+        return self.client.generate_presigned_url(
+            operation, Params={"Bucket": self.bucket_name, "Key": key}, ExpiresIn=expires
+        )
+
+    def init_multipart_upload(self, key: str) -> str:
+        return self.client.create_multipart_upload(Bucket=self.bucket_name, Key=key)["UploadId"]
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data) -> str:
+        return self.client.upload_part(
+            Bucket=self.bucket_name, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data
+        )["ETag"]
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Part]):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": part_number, "ETag": etag} for part_number, etag in parts]},
+        )
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        self.client.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+
+    def is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, (self._exceptions.ConnectionError, self._exceptions.HTTPClientError)):
+            return True
+        if isinstance(error, self._exceptions.ClientError):
+            return error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+        return False
+
+
+class LocalBackend(StorageBackend):
+    """本地磁盘存储，适合把影像放在本机 NVMe 上的私有化部署，也用于开发和测试
+
+    签名地址指向应用自身的下载路由（url_prefix），签名为 HMAC-SHA256(key + 过期时间)，
+    下载时由 OSSService.file_response 校验后直接返回磁盘文件。
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, url_prefix: str, secret_key: str):
+        self.root = os.path.abspath(root)
+        self.url_prefix = url_prefix.rstrip("/")
+        self._secret = secret_key.encode()
+        self._uploads_dir = os.path.join(self.root, ".multipart")
+
+    def path(self, key: str) -> str:
+        """对象在磁盘上的路径，拒绝跳出根目录的 key"""
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"非法的对象路径: {key}")
+        return path
+
+    @staticmethod
+    def _write(path: str, data):
+        # 先写临时文件再原子替换，读者不会看到写了一半的文件
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            if hasattr(data, "read"):
+                while chunk := data.read(1024 * 1024):
+                    f.write(chunk)
+            else:
+                f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _etag(path: str) -> str:
+        hasher = hashlib.md5()
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                hasher.update(chunk)
+        return hasher.hexdigest().upper()
+
+    def put_object(self, key: str, data):
+        self._write(self.path(key), data)
+
+    def get_object_bytes(self, key: str) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def delete_object(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass  # 与 OSS/S3 一致，删除不存在的对象不报错
+
+    def head_object(self, key: str) -> ObjectInfo:
+        path = self.path(key)
+        stat = os.stat(path)
+        return ObjectInfo(
+            stat.st_size,
+            int(stat.st_mtime),
+            self._etag(path),
+            mimetypes.guess_type(key)[0] or "application/octet-stream",
+        )
+
+    def signature(self, key: str, expires: int) -> str:
+        return hmac.new(self._secret, f"{key}\n{expires}".encode(), hashlib.sha256).hexdigest()
+
+    def sign_url(self, method: str, key: str, expires: int) -> str:
+        self.path(key)
+        expires_at = int(time.time()) + expires
+        query = urlencode({"expires": expires_at, "signature": self.signature(key, expires_at)})
+        return f"{self.url_prefix}/{quote(key)}?{query}"
+
+    def verify(self, key: str, expires: int, signature: str) -> bool:
+        """校验签名地址：未过期且签名正确"""
+        return expires >= time.time() and hmac.compare_digest(self.signature(key, expires), signature)
+
+    def init_multipart_upload(self, key: str) -> str:
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self._uploads_dir, upload_id))
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data) -> str:
+        path = os.path.join(self._uploads_dir, upload_id, f"{part_number:05d}")
+        self._write(path, data)
+        return self._etag(path)
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Part]):
+        upload_dir = os.path.join(self._uploads_dir, upload_id)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{upload_id}.tmp"
+        with open(tmp_path, "wb") as out:
+            for part_number, _ in sorted(parts):
+                with open(os.path.join(upload_dir, f"{part_number:05d}"), "rb") as f:
+                    while chunk := f.read(1024 * 1024):
+                        out.write(chunk)
+        os.replace(tmp_path, path)
+        self.abort_multipart_upload(key, upload_id)
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        upload_dir = os.path.join(self._uploads_dir, upload_id)
+        if os.path.isdir(upload_dir):
+            for name in os.listdir(upload_dir):
+                os.remove(os.path.join(upload_dir, name))
+            os.rmdir(upload_dir)
+
+    def is_retryable(self, error: Exception) -> bool:
+        return False
+
+
+def create_storage_backend(config: OSSConfig, secret_key: str) -> StorageBackend:
+    """按 config.backend 创建存储驱动"""
+    if config.backend == "oss":
+        return OSSBackend(config)
+    if config.backend == "s3":
+        return S3Backend(config)
+    if config.backend == "local":
+        return LocalBackend(config.local_root, config.local_url_prefix, secret_key)
+    raise ValueError(f"不支持的存储后端: {config.backend}，可选 {', '.join(STORAGE_BACKENDS)}")
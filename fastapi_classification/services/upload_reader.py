@@ -0,0 +1,133 @@
+import threading
+
+from fastapi import HTTPException, Request, Response, UploadFile, status
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import FormData
+from starlette.formparsers import MultiPartException, MultiPartParser
+from ..core.config import settings
+from ..core.metrics import metrics, stage_timer
+
+
+class UploadStats:
+    """上传读取与解码的统计：读取字节数、拒绝次数、解码耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # 解码在推理线程中记录
+        self.uploads = 0
+        self.bytes_read = 0
+        self.rejected = 0
+        self.decodes = 0
+        self.decode_seconds = 0.0
+
+    def record_read(self, size: int):
+        self.uploads += 1
+        self.bytes_read += size
+
+    def record_rejected(self):
+        self.rejected += 1
+
+    def record_decode(self, seconds: float):
+        with self._lock:
+            self.decodes += 1
+            self.decode_seconds += seconds
+
+    def stats(self) -> dict:
+        return {
+            "uploads": self.uploads,
+            "bytes_read": self.bytes_read,
+            "rejected": self.rejected,
+            "decodes": self.decodes,
+            "decode_seconds_total": self.decode_seconds,
+            "decode_ms_avg": self.decode_seconds / self.decodes * 1000 if self.decodes else 0.0,
+        }
+
+
+upload_stats = UploadStats()
+metrics.callback("upload_requests_total", "读入内存的上传文件数", lambda: upload_stats.uploads, kind="counter")
+metrics.callback("upload_bytes_total", "读入内存的上传字节数", lambda: upload_stats.bytes_read, kind="counter")
+metrics.callback("upload_rejected_total", "因超过大小上限被拒绝的上传数", lambda: upload_stats.rejected, kind="counter")
+
+UPLOAD_READ_SECONDS = stage_timer("upload_read")
+
+
+class InMemoryMultiPartParser(MultiPartParser):
+    """单张预测使用的 multipart 解析器：不超过上限的上传文件保留在内存中，不写临时文件（默认阈值 1 MB）"""
+    max_file_size = settings.PREDICT_MAX_UPLOAD_BYTES
+
+
+class InMemoryUploadRequest(Request):
+    """multipart 表单用 InMemoryMultiPartParser 解析，且只接受一个文件，避免多个文件同时占用内存"""
+
+    async def form(self, *, max_files: int = 1, max_fields: int = 1000) -> FormData:
+        if not self.headers.get("content-type", "").startswith("multipart/form-data"):
+            return await super().form(max_files=max_files, max_fields=max_fields)
+        parser = InMemoryMultiPartParser(self.headers, self.stream(), max_files=max_files, max_fields=max_fields)
+        try:
+            return await parser.parse()
+        except MultiPartException as exc:
+            raise HTTPException(status_code=400, detail=exc.message)
+
+
+class InMemoryUploadRoute(APIRoute):
+    """只对单个路由生效的内存解析，其他上传接口（批量预测、任务、图片上传）仍使用默认阈值"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await handler(InMemoryUploadRequest(request.scope, request.receive))
+
+        return route_handler
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    upload_stats.record_rejected()
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"图片大小不能超过 {max_bytes // 1024 // 1024} MB"
+    )
+
+
+def _readinto(fileobj, view: memoryview) -> int:
+    total = 0
+    while total < len(view):
+        count = fileobj.readinto(view[total:])
+        if not count:
+            break
+        total += count
+    return total
+
+
+async def read_upload(
+    file: UploadFile, max_bytes: int, spool_max_size: int = MultiPartParser.max_file_size
+) -> memoryview:
+    """把上传文件读入按实际大小预分配的内存缓冲区，返回其 memoryview；每个字节从上传文件拷贝一次
+
+    超过 max_bytes 的文件在读取前即被拒绝。spool_max_size 为解析该请求的 multipart 解析器的内存阈值：
+    SpooledTemporaryFile 只在写入超过该大小后才落盘，不超过的文件一定仍在内存中，直接拷贝；
+    其余文件在线程池中读取，避免阻塞事件循环。
+    """
+    with UPLOAD_READ_SECONDS.time():
+        return await _read_upload(file, max_bytes, spool_max_size)
+
+
+async def _read_upload(file: UploadFile, max_bytes: int, spool_max_size: int) -> memoryview:
+    if file.size is None:
+        # 大小未知时最多多读一个字节来判断是否超限
+        data = await file.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            raise _too_large(max_bytes)
+        upload_stats.record_read(len(data))
+        return memoryview(data)
+
+    if file.size > max_bytes:
+        raise _too_large(max_bytes)
+    view = memoryview(bytearray(file.size))
+    await file.seek(0)
+    if file.size <= spool_max_size:
+        count = _readinto(file.file, view)
+    else:
+        count = await run_in_threadpool(_readinto, file.file, view)
+    upload_stats.record_read(count)
+    return view[:count]
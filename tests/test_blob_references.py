@@ -0,0 +1,152 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+from starlette.datastructures import Headers
+
+from fastapi_classification.core.config import settings
+from fastapi_classification.core.oss_config import OSSConfig
+from fastapi_classification.models.mongodb_models import ImageType
+from fastapi_classification.services.database_service import DatabaseService
+from fastapi_classification.services.oss_service import OSSService
+
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 40, 40)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_upload(data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), size=len(data), filename="scan.png", headers=Headers({"content-type": "image/png"}))
+
+
+@pytest.fixture
+def services(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_BLOB_DELETE_WAIT_INTERVAL", 0.01)
+    db_service = DatabaseService(None, mongomock_motor.AsyncMongoMockClient()["test"])
+    oss_service = OSSService(OSSConfig(backend="local", local_root=str(tmp_path)))
+    yield db_service, oss_service
+    oss_service.close()
+
+
+def stored_keys(image) -> list:
+    return [image.file_path] + [derivative.file_path for derivative in image.derivatives.values()]
+
+
+def exists(oss_service: OSSService, key: str) -> bool:
+    return os.path.isfile(oss_service.bucket.backend.path(key))
+
+
+async def upload(db_service: DatabaseService, oss_service: OSSService, data: bytes):
+    return await oss_service.upload_file(make_upload(data), db_service, user_id=1, image_type=ImageType.MEDICAL_IMAGE)
+
+
+def test_failed_upload_keeps_objects_of_concurrent_upload(services, monkeypatch):
+    """A 已上传、尚未写入记录时，相同内容的 B 上传失败，不删除 A 的对象"""
+    db_service, oss_service = services
+    data = png_bytes()
+
+    async def scenario():
+        first = await upload(db_service, oss_service, data)
+
+        async def fail(*args):
+            raise RuntimeError("storage unavailable")
+
+        monkeypatch.setattr(oss_service, "_put_derivatives", fail)
+        with pytest.raises(HTTPException):
+            await upload(db_service, oss_service, data)
+
+        assert all(exists(oss_service, key) for key in stored_keys(first))
+        await db_service.create_image(first)
+        assert (await db_service.mongodb_db.blobs.find_one({"_id": first.content_hash}))["refs"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_first_upload_removes_its_objects(services, monkeypatch):
+    db_service, oss_service = services
+
+    async def scenario():
+        async def fail(*args):
+            raise RuntimeError("storage unavailable")
+
+        monkeypatch.setattr(oss_service, "_put_derivatives", fail)
+        with pytest.raises(HTTPException):
+            await upload(db_service, oss_service, png_bytes())
+
+        assert await db_service.mongodb_db.blobs.count_documents({}) == 0
+        assert not any(files for _, _, files in os.walk(oss_service.config.local_root))
+
+    asyncio.run(scenario())
+
+
+def test_reuse_before_delete_keeps_file(services):
+    """新上传先加引用，随后删除最后一条已有记录时不删除文件"""
+    db_service, oss_service = services
+    data = png_bytes()
+
+    async def scenario():
+        existing = await db_service.create_image(await upload(db_service, oss_service, data))
+        assert await db_service.acquire_blob(existing.content_hash) is False
+
+        await db_service.delete_image(existing.id)
+        assert await db_service.release_blob(existing.content_hash, lambda: oss_service.delete_file(existing)) is False
+        assert all(exists(oss_service, key) for key in stored_keys(existing))
+
+    asyncio.run(scenario())
+
+
+def test_upload_during_delete_waits_and_uploads_again(services):
+    """删除已认领时到达的上传等待删除完成，再作为首个引用重新上传"""
+    db_service, oss_service = services
+    data = png_bytes()
+
+    async def scenario():
+        existing = await db_service.create_image(await upload(db_service, oss_service, data))
+        await db_service.delete_image(existing.id)
+
+        deleting = asyncio.Event()
+        resume = asyncio.Event()
+
+        async def delete_files():
+            deleting.set()
+            await resume.wait()
+            await oss_service.delete_file(existing)
+
+        release = asyncio.create_task(db_service.release_blob(existing.content_hash, delete_files))
+        await deleting.wait()
+        reupload = asyncio.create_task(upload(db_service, oss_service, data))
+        await asyncio.sleep(0.05)
+        assert not reupload.done()
+
+        resume.set()
+        assert await release is True
+        image = await reupload
+        assert all(exists(oss_service, key) for key in stored_keys(image))
+        assert (await db_service.mongodb_db.blobs.find_one({"_id": image.content_hash}))["refs"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_references_seeded_from_existing_records(services):
+    """引入引用计数前写入的记录在首次使用时补建计数"""
+    db_service, oss_service = services
+    data = png_bytes()
+
+    async def scenario():
+        existing = await db_service.create_image(await upload(db_service, oss_service, data))
+        await db_service.mongodb_db.blobs.delete_many({})
+
+        duplicate = await db_service.create_image(await upload(db_service, oss_service, data))
+        await db_service.delete_image(existing.id)
+        assert await db_service.release_blob(existing.content_hash, lambda: oss_service.delete_file(existing)) is False
+        assert all(exists(oss_service, key) for key in stored_keys(duplicate))
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from fastapi_classification.services.image_derivatives import MODEL_DERIVATIVE, generate_derivatives
+from fastapi_classification.services.preprocessing import default_preprocessor
+
+
+# JPEG draft 按 224 解码时缩小到 1/8，按 256 解码时只能缩小到 1/4，两种目标尺寸得到的像素不同
+def make_image(fmt: str, size=(2000, 1800)) -> bytes:
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def test_model_derivative_matches_preprocessing_of_original():
+    for fmt in ("JPEG", "PNG"):
+        data = make_image(fmt)
+        derivatives = generate_derivatives(data, thumbnail_sizes=[256])
+
+        model = derivatives.derivatives[MODEL_DERIVATIVE]
+        np.testing.assert_array_equal(default_preprocessor.decode(model.data), default_preprocessor.decode(data))
+
+
+def test_thumbnails_keep_aspect_ratio():
+    derivatives = generate_derivatives(make_image("JPEG"), thumbnail_sizes=[128, 256])
+
+    assert (derivatives.width, derivatives.height, derivatives.format) == (2000, 1800, "JPEG")
+    assert (derivatives.derivatives["thumbnail_256"].width, derivatives.derivatives["thumbnail_256"].height) == (256, 230)
+    assert derivatives.derivatives["thumbnail_128"].width == 128
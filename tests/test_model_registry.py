@@ -0,0 +1,135 @@
+import asyncio
+import os
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from fastapi import HTTPException
+
+from fastapi_classification.core.config import settings
+from fastapi_classification.services import model_registry as registry_module
+from fastapi_classification.services.model_registry import ModelRegistry
+
+
+class FakeModelService:
+    """只记录加载过的权重文件，不加载真实模型"""
+
+    def __init__(self, model_path: str, class_labels: list, onnx_path: str, version: str):
+        self.model_path = model_path
+        self.model_version = version
+        self.is_ready = False
+        self.batch_queue = self
+
+    async def drain(self):
+        pass
+
+    async def ensure_loaded(self):
+        self.is_ready = True
+
+    async def warmup_async(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def status(self) -> dict:
+        return {}
+
+
+@pytest.fixture
+def shared_redis(monkeypatch, tmp_path):
+    (tmp_path / "v2.pth").write_bytes(b"weights")
+    monkeypatch.setattr(settings, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "MODEL_WARMUP_BATCH_SIZES", [])
+    monkeypatch.setattr(registry_module, "ModelService", FakeModelService)
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(registry_module.redis_manager, "redis", redis)
+    return tmp_path
+
+
+def make_registry() -> ModelRegistry:
+    """模拟一个进程：默认版本由配置注册，各进程各自持有"""
+    registry = ModelRegistry()
+    default = FakeModelService("best.pth", [], "best.onnx", "v1")
+    default.is_ready = True
+    registry.register("v1", default, activate=True)
+    return registry
+
+
+async def wait_loaded(registry: ModelRegistry):
+    while registry._loading:
+        await asyncio.sleep(0)
+
+
+def test_version_loaded_in_one_process_is_loaded_on_demand_in_another(shared_redis):
+    async def scenario():
+        api, worker = make_registry(), make_registry()
+        api.load_in_background("v2", str(shared_redis / "v2.pth"))
+        await wait_loaded(api)
+
+        assert await worker.exists("v2")
+        service = await worker.get_or_load("v2")
+        assert service.model_path == os.path.realpath(shared_redis / "v2.pth")
+        assert worker.active_version == "v1"
+
+        with pytest.raises(HTTPException) as error:
+            await worker.get_or_load("v3")
+        assert error.value.status_code == 404
+        assert not await worker.exists("v3")
+
+    asyncio.run(scenario())
+
+
+def test_activation_and_unload_follow_on_sync(shared_redis):
+    async def scenario():
+        api, worker = make_registry(), make_registry()
+        api.load_in_background("v2", str(shared_redis / "v2.pth"), activate=True)
+        await wait_loaded(api)
+        assert api.active_version == "v2"
+
+        await worker.sync()
+        await wait_loaded(worker)
+        assert worker.active_version == "v2"
+
+        await api.activate("v1")
+        await api.unload("v2")
+        await worker.sync()
+        assert worker.active_version == "v1"
+        assert "v2" not in worker._models
+
+    asyncio.run(scenario())
+
+
+def test_unload_in_another_process_drops_locally_published_version(shared_redis):
+    async def scenario():
+        api, worker = make_registry(), make_registry()
+        api.load_in_background("v2", str(shared_redis / "v2.pth"))
+        await wait_loaded(api)
+        await worker.sync()
+        await wait_loaded(worker)
+
+        await worker.unload("v2")
+        await api.sync()
+        assert "v2" not in api._models
+        with pytest.raises(HTTPException):
+            await api.get_or_load("v2")
+
+    asyncio.run(scenario())
+
+
+def test_registry_is_process_local_without_redis(shared_redis, monkeypatch):
+    monkeypatch.setattr(registry_module.redis_manager, "redis", None)
+
+    async def scenario():
+        api, worker = make_registry(), make_registry()
+        api.load_in_background("v2", str(shared_redis / "v2.pth"))
+        await wait_loaded(api)
+        await api.activate("v2")
+
+        assert api.active_version == "v2"
+        assert not await worker.exists("v2")
+        await worker.sync()
+        assert worker.active_version == "v1"
+
+    asyncio.run(scenario())
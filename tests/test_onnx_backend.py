@@ -0,0 +1,88 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在独立进程中加载 ONNX 后端，避免其他测试或插件已导入的 torch 影响判断
+LOAD_SCRIPT = """
+import io
+import sys
+
+import numpy as np
+from PIL import Image
+
+from fastapi_classification.services.model_service import ModelService
+
+service = ModelService(
+    model_path=sys.argv[1],
+    onnx_path=sys.argv[1],
+    class_labels=["a", "b", "c", "d"],
+    backend="onnx",
+    version="test",
+)
+service.load()
+assert service.backend.name == "onnx", service.backend.name
+results = service.predict_batch(np.ones((2, 3, 8, 8), dtype=np.float32))
+image = io.BytesIO()
+Image.new("RGB", (16, 16), (128, 128, 128)).save(image, format="PNG")
+label, scores = service.predict_tta(io.BytesIO(image.getvalue()), 2)[:2]
+print(results[0][0], label, "torch" in sys.modules)
+"""
+
+
+def write_tiny_model(path: str):
+    """GlobalAveragePool -> Flatten -> Gemm 的 4 分类模型，按通道均值线性打分"""
+    from onnx import TensorProto, helper, numpy_helper
+
+    weights = np.array([[1, 0, 0, 0], [0, 2, 0, 0], [0, 0, 3, 0]], dtype=np.float32)
+    graph = helper.make_graph(
+        [
+            helper.make_node("GlobalAveragePool", ["input"], ["pooled"]),
+            helper.make_node("Flatten", ["pooled"], ["flat"]),
+            helper.make_node("Gemm", ["flat", "weights"], ["logits"]),
+        ],
+        "tiny",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["batch", 3, "height", "width"])],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", 4])],
+        initializer=[numpy_helper.from_array(weights, "weights")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+def test_onnx_backend_does_not_import_torch(tmp_path):
+    model_path = str(tmp_path / "tiny.onnx")
+    write_tiny_model(model_path)
+
+    result = subprocess.run(
+        [sys.executable, "-c", LOAD_SCRIPT, model_path],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+    assert result.returncode == 0, result.stderr
+    batch_label, tta_label, torch_loaded = result.stdout.split()
+    assert batch_label == "c"
+    assert tta_label == "c"
+    assert torch_loaded == "False"
+
+
+def test_softmax_matches_reference():
+    from fastapi_classification.services.model_service import softmax
+
+    logits = np.array([[1.0, 2.0, 3.0], [1000.0, 1000.0, 1000.0]], dtype=np.float32)
+    probabilities = softmax(logits)
+
+    expected = np.exp([1.0, 2.0, 3.0]) / np.exp([1.0, 2.0, 3.0]).sum()
+    np.testing.assert_allclose(probabilities[0], expected, rtol=1e-6)
+    np.testing.assert_allclose(probabilities[1], [1 / 3] * 3, rtol=1e-6)
@@ -0,0 +1,88 @@
+import io
+import json
+import zipfile
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_classification.api.routes import predict as predict_module
+from fastapi_classification.core.config import settings
+from fastapi_classification.services.inference_executor import InferenceExecutor
+
+MB = 1024 * 1024
+
+
+def make_zip(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+class FakeModelService:
+    """按图像内容的长度给出标签，不做推理"""
+
+    model_version = "test"
+
+    def __init__(self):
+        self.executor = InferenceExecutor(max_workers=1, torch_threads=0, max_queue_size=8)
+
+    async def ensure_loaded(self):
+        pass
+
+    def predict_many(self, images: list) -> list:
+        return [(f"len{len(bytes(image))}", [1.0]) for image in images]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    model_service = FakeModelService()
+
+    async def get_or_load(version=None):
+        return model_service
+
+    monkeypatch.setattr(predict_module.model_registry, "get_or_load", get_or_load)
+    monkeypatch.setattr(settings, "PREDICT_BATCH_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "PREDICT_MAX_UPLOAD_BYTES", MB)
+    monkeypatch.setattr(settings, "PREDICTION_JOB_ZIP_MAX_MEMBERS", 3)
+    app = FastAPI()
+    app.include_router(predict_module.router)
+    yield TestClient(app)
+    model_service.executor.shutdown()
+
+
+def rows(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_streams_rows_for_images_and_zip(client):
+    archive = make_zip({
+        "a.png": b"a",
+        "bomb.png": bytes(2 * MB),
+        "b.png": b"bb",
+        "c.png": b"ccc",
+        "d.png": b"dddd",
+    })
+    response = client.post("/batch/", files=[
+        ("files", ("x.png", b"xxxxx", "image/png")),
+        ("files", ("scans.zip", archive, "application/zip")),
+        ("files", ("notes.txt", b"text", "text/plain")),
+    ])
+
+    assert response.status_code == 200
+    result = rows(response)
+    assert [row["filename"] for row in result] == ["x.png", "a.png", "bomb.png", "b.png", "scans.zip", "notes.txt"]
+    assert [row.get("predicted_label") for row in result] == ["len5", "len1", None, "len2", None, None]
+    # 超过单个成员大小和成员数上限的部分返回错误行，不解压
+    assert "error" in result[2] and "error" in result[4] and "error" in result[5]
+
+
+def test_batch_rejects_oversized_upload(client, monkeypatch):
+    monkeypatch.setattr(settings, "PREDICT_BATCH_MAX_BYTES", 8)
+    response = client.post("/batch/", files=[
+        ("files", ("x.png", b"xxxxx", "image/png")),
+        ("files", ("y.png", b"yyyyy", "image/png")),
+    ])
+    assert response.status_code == 413
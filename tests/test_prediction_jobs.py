@@ -0,0 +1,101 @@
+import asyncio
+import io
+import zipfile
+
+from fastapi_classification.core.config import settings
+from fastapi_classification.services.inference_executor import InferenceExecutor
+from fastapi_classification.services.prediction_jobs import iter_job_sources, run_prediction_job
+
+MB = 1024 * 1024
+
+
+def make_zip(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+class FakeModelService:
+    """只记录每次 predict_many 收到的图像，不做推理"""
+
+    model_version = "test"
+
+    def __init__(self):
+        self.executor = InferenceExecutor(max_workers=1, torch_threads=0, max_queue_size=8)
+        self.batches = []
+
+    def predict_many(self, images: list) -> list:
+        self.batches.append([len(image) for image in images])
+        return [("正常", [1.0]) for _ in images]
+
+
+def test_oversized_member_is_rejected_without_decompressing(monkeypatch):
+    # 2 MB 的全零数据压缩后只有几 KB
+    archive = make_zip({"a.png": b"a" * 10, "bomb.png": bytes(2 * MB), "b.png": b"b" * 10})
+    read = []
+    original_read = zipfile.ZipFile.read
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda self, name: read.append(name.filename) or original_read(self, name))
+
+    sources = list(iter_job_sources(
+        [{"filename": "x.zip", "kind": "zip", "data": archive}],
+        max_members=100,
+        max_member_bytes=MB,
+        max_total_bytes=10 * MB,
+    ))
+
+    assert [name for name, _ in sources] == ["a.png", "bomb.png", "b.png"]
+    assert isinstance(sources[1][1], ValueError)
+    assert read == ["a.png", "b.png"]
+
+
+def test_members_are_decompressed_lazily(monkeypatch):
+    archive = make_zip({f"{index}.png": bytes([index]) * 100 for index in range(5)})
+    read = []
+    original_read = zipfile.ZipFile.read
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda self, name: read.append(name.filename) or original_read(self, name))
+
+    sources = iter_job_sources(
+        [{"filename": "x.zip", "kind": "zip", "data": archive}],
+        max_members=100,
+        max_member_bytes=MB,
+        max_total_bytes=10 * MB,
+    )
+    next(sources)
+    next(sources)
+
+    assert read == ["0.png", "1.png"]
+
+
+def test_member_count_and_total_size_are_capped():
+    files = [{"filename": "x.zip", "kind": "zip", "data": make_zip({f"{index}.png": bytes(100) for index in range(5)})}]
+
+    by_count = list(iter_job_sources(files, max_members=3, max_member_bytes=MB, max_total_bytes=MB))
+    assert [name for name, _ in by_count] == ["0.png", "1.png", "2.png", "x.zip"]
+    assert isinstance(by_count[-1][1], ValueError)
+
+    by_size = list(iter_job_sources(files, max_members=100, max_member_bytes=MB, max_total_bytes=250))
+    assert [name for name, _ in by_size] == ["0.png", "1.png", "x.zip"]
+    assert isinstance(by_size[-1][1], ValueError)
+
+
+def test_run_prediction_job_expands_zip_per_chunk(monkeypatch):
+    monkeypatch.setattr(settings, "PREDICT_BATCH_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "PREDICT_MAX_UPLOAD_BYTES", MB)
+    model_service = FakeModelService()
+    files = [
+        {"filename": "x.zip", "kind": "zip", "data": make_zip({"a.png": b"a", "bomb.png": bytes(2 * MB), "b.png": b"bb"})},
+        {"filename": "c.png", "kind": "image", "data": b"ccc"},
+        {"filename": "d.txt", "kind": "unsupported", "data": None},
+    ]
+
+    rows = asyncio.run(run_prediction_job(model_service, files, None))
+    model_service.executor.shutdown()
+
+    assert [row["filename"] for row in rows] == ["a.png", "bomb.png", "b.png", "c.png", "d.txt"]
+    assert "error" in rows[1] and "error" in rows[4]
+    assert rows[0]["predicted_label"] == "正常"
+    # 每批最多 2 个成员，解压失败或不支持的文件不进入前向传播
+    assert [batch for batch in model_service.batches if batch] == [[1], [2, 3]]
+
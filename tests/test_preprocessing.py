@@ -0,0 +1,33 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from fastapi_classification.services.prediction_cache import PredictionCache
+from fastapi_classification.services.preprocessing import ImagePreprocessor, default_preprocessor
+
+
+def jpeg_bytes() -> bytes:
+    rng = np.random.default_rng(0)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.integers(0, 256, (900, 1000, 3), dtype=np.uint8)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_default_decode_matches_full_jpeg_decode():
+    data = jpeg_bytes()
+    expected = np.asarray(Image.open(io.BytesIO(data)).convert("RGB").resize((224, 224), Image.BILINEAR))
+
+    np.testing.assert_array_equal(default_preprocessor.decode(data), expected)
+    # draft 解码在 DCT 域降采样，像素不同
+    assert not np.array_equal(ImagePreprocessor(jpeg_draft=True).decode(data), expected)
+
+
+def test_cache_key_depends_on_preprocessing():
+    cache = PredictionCache(max_entries=4, expire=60)
+    full = ImagePreprocessor(decoder="pil", jpeg_draft=False)
+    draft = ImagePreprocessor(decoder="pil", jpeg_draft=True)
+
+    assert full.signature != draft.signature
+    assert cache.make_key(b"x", "v1", full.signature) != cache.make_key(b"x", "v1", draft.signature)
+    assert ImagePreprocessor(decoder="opencv", jpeg_draft=True).signature.startswith("opencv-224")
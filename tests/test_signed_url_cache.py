@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from fastapi_classification.services import signed_url_cache as cache_module
+from fastapi_classification.services.signed_url_cache import SignedUrlCache
+
+
+class CountingRedis(fakeredis.FakeAsyncRedis):
+    """记录提交到 Redis 的管道次数"""
+
+    pipelines = 0
+
+    def pipeline(self, *args, **kwargs):
+        CountingRedis.pipelines += 1
+        return super().pipeline(*args, **kwargs)
+
+
+@pytest.fixture
+def shared_redis(monkeypatch):
+    CountingRedis.pipelines = 0
+    redis = CountingRedis(decode_responses=True)
+    monkeypatch.setattr(cache_module.redis_manager, "redis", redis)
+    return redis
+
+
+def test_invalidate_applies_to_every_process(shared_redis):
+    async def scenario():
+        now = int(time.time())
+        worker_a = SignedUrlCache(max_entries=16, window=300)
+        worker_b = SignedUrlCache(max_entries=16, window=300)
+        entry = {"url": "https://oss/a.png", "expires_at": 0, "privacy_level": "public"}
+
+        key, until = await worker_a.make_key("img-1", None, 3600, now)
+        await worker_a.set(key, entry, until)
+        key_b, until_b = await worker_b.make_key("img-1", None, 3600, now)
+        assert key_b == key
+        assert await worker_b.get(key_b, until_b) == entry  # 从 Redis 取回，并进入 worker_b 的进程内缓存
+
+        await worker_a.invalidate("img-1")
+
+        for worker in (worker_a, worker_b):
+            key, until = await worker.make_key("img-1", None, 3600, now)
+            assert await worker.get(key, until) is None
+        # 失效只写代数，不扫描、不删除已有条目
+        assert await shared_redis.get("signed_url:generation:img-1") == "1"
+
+    asyncio.run(scenario())
+
+
+def test_set_many_writes_in_one_pipeline(shared_redis):
+    async def scenario():
+        now = int(time.time())
+        cache = SignedUrlCache(max_entries=16, window=300)
+        keys = await cache.make_keys(["img-1", "img-2", "img-3"], "thumbnail_256", 3600, now)
+        await cache.set_many([(key, {"url": key}, until) for key, until in keys])
+
+        assert CountingRedis.pipelines == 1
+        for key, until in keys:
+            assert 0 < await shared_redis.ttl(key) <= until - now + 1
+        fresh = SignedUrlCache(max_entries=16, window=300)
+        entries = await fresh.get_many([key for key, _ in keys], [until for _, until in keys])
+        assert [entry["url"] for entry in entries] == [key for key, _ in keys]
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_without_redis(monkeypatch):
+    monkeypatch.setattr(cache_module.redis_manager, "redis", None)
+
+    async def scenario():
+        now = int(time.time())
+        cache = SignedUrlCache(max_entries=16, window=300)
+        key, until = await cache.make_key("img-1", None, 3600, now)
+        await cache.set(key, {"url": "u"}, until)
+        await cache.invalidate("img-1")
+        key, until = await cache.make_key("img-1", None, 3600, now)
+        assert await cache.get(key, until) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,18 @@
+import pytest
+
+from fastapi_classification.services.storage_backends import LocalBackend, StorageBackend
+
+
+def test_incomplete_driver_fails_at_construction():
+    class PutOnly(StorageBackend):
+        def put_object(self, key: str, data):
+            pass
+
+    with pytest.raises(TypeError):
+        PutOnly()
+
+
+def test_bundled_drivers_implement_the_interface(tmp_path):
+    backend = LocalBackend(str(tmp_path), "/files", "secret")
+    backend.put_object("a/b.png", b"data")
+    assert backend.get_object_bytes("a/b.png") == b"data"
@@ -0,0 +1,65 @@
+import hashlib
+import importlib
+
+from fastapi import APIRouter, FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from starlette.formparsers import MultiPartParser
+
+from fastapi_classification.services.upload_reader import (
+    InMemoryMultiPartParser,
+    InMemoryUploadRoute,
+    read_upload,
+)
+
+PAYLOAD = bytes(range(256)) * 8 * 1024  # 2 MB，超过默认的 1 MB 内存阈值
+
+
+def make_app() -> FastAPI:
+    router = APIRouter()
+
+    async def in_memory(file: UploadFile = File(...)):
+        rolled = file.file._rolled
+        data = await read_upload(file, len(PAYLOAD), InMemoryMultiPartParser.max_file_size)
+        return {"rolled": rolled, "sha256": hashlib.sha256(data).hexdigest()}
+
+    async def default(file: UploadFile = File(...)):
+        rolled = file.file._rolled
+        data = await read_upload(file, len(PAYLOAD))
+        return {"rolled": rolled, "sha256": hashlib.sha256(data).hexdigest()}
+
+    router.add_api_route("/in-memory", in_memory, methods=["POST"], route_class_override=InMemoryUploadRoute)
+    router.add_api_route("/default", default, methods=["POST"])
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+def test_in_memory_parsing_is_scoped_to_its_route():
+    importlib.import_module("fastapi_classification.main")  # 应用启动不应修改全局解析器
+
+    assert MultiPartParser.max_file_size == 1024 * 1024
+    client = TestClient(make_app())
+    expected = hashlib.sha256(PAYLOAD).hexdigest()
+
+    response = client.post("/in-memory", files={"file": ("x.png", PAYLOAD, "image/png")})
+    assert response.json() == {"rolled": False, "sha256": expected}
+
+    response = client.post("/default", files={"file": ("x.png", PAYLOAD, "image/png")})
+    assert response.json() == {"rolled": True, "sha256": expected}
+
+
+def test_in_memory_route_accepts_a_single_file():
+    client = TestClient(make_app())
+
+    response = client.post(
+        "/in-memory",
+        files=[("file", ("a.png", b"a", "image/png")), ("file", ("b.png", b"b", "image/png"))],
+    )
+    assert response.status_code == 400
+
+
+def test_read_upload_rejects_oversized_file():
+    client = TestClient(make_app())
+
+    response = client.post("/default", files={"file": ("x.png", PAYLOAD + b"x", "image/png")})
+    assert response.status_code == 413